@@ -0,0 +1,205 @@
+-- ============================================================
+-- ADD: Set-based bulk mutasi (moving many perangkat to new locations)
+--
+-- Problem:
+-- - mutasi_perangkat_process() moves one perangkat per call: every call checks the
+--   caller's permission, looks up the perangkat and the new lokasi, updates one row
+--   and inserts one history row
+-- - Relocating a whole ward is hundreds of RPC round trips and statements
+--
+-- Solution:
+-- - mutasi_perangkat_bulk(p_items) takes a chunk of moves as a JSON array and does
+--   ONE permission check, ONE UPDATE of perangkat and ONE INSERT into
+--   mutasi_perangkat for the whole chunk
+-- - Same rules as mutasi_perangkat_process(): Administrator or Koordinator IT Support
+--   only, id_perangkat never changes, nama_perangkat becomes LOKASI_BARU-URUTAN
+-- - Returns one outcome row per item instead of failing the chunk, so the caller
+--   can report every row (used by mutasi_perangkat_bulk.py)
+--
+-- Item format (one object per move, perangkat identified by id_perangkat or serial_number):
+--   {"id_perangkat": "001.2025.12.0001", "lokasi_baru_kode": "IT", "keterangan": "..."}
+--   {"serial_number": "SN123", "lokasi_baru_kode": "IT"}
+--
+-- Outcome status: moved | not_found | lokasi_not_found | same_lokasi | duplicate | no_urutan
+-- (with p_dry_run, 'moved' means the row would be moved; nothing is written)
+--
+-- Run AFTER add_mutasi_perangkat_feature_safe.sql and FIX_MUTASI_RESTRICT_ADMIN_KOORDINATOR.sql.
+-- Run in Supabase SQL editor.
+-- ============================================================
+
+BEGIN;
+
+CREATE OR REPLACE FUNCTION public.mutasi_perangkat_bulk(
+  p_items JSONB,
+  p_keterangan TEXT DEFAULT NULL,
+  p_created_by UUID DEFAULT NULL,
+  p_dry_run BOOLEAN DEFAULT false
+)
+RETURNS TABLE (
+  item_index INT,
+  perangkat_id UUID,
+  id_perangkat TEXT,
+  status TEXT,
+  message TEXT,
+  nama_perangkat_lama TEXT,
+  nama_perangkat_baru TEXT,
+  lokasi_lama_kode TEXT
+) AS $$
+#variable_conflict use_column
+DECLARE
+  v_current_user UUID;
+  v_can_mutasi BOOLEAN;
+BEGIN
+  -- A logged-in caller always acts as themselves; p_created_by is only used without a
+  -- session (service role key), and must name an Administrator / Koordinator IT Support
+  v_current_user := COALESCE(auth.uid(), p_created_by);
+
+  -- Permission: checked once for the whole chunk (same rule as mutasi_perangkat_process)
+  SELECT EXISTS (
+    SELECT 1 FROM profiles p
+    WHERE p.id = v_current_user
+      AND (
+        p.role = 'administrator'
+        OR EXISTS (
+          SELECT 1
+          FROM user_categories uc
+          WHERE uc.id = p.user_category_id
+            AND uc.name = 'Koordinator IT Support'
+            AND uc.is_active = true
+        )
+      )
+  ) INTO v_can_mutasi;
+
+  IF NOT v_can_mutasi THEN
+    RAISE EXCEPTION 'Anda tidak memiliki permission untuk melakukan mutasi perangkat. Hanya Administrator dan Koordinator IT Support yang diizinkan.'
+      USING ERRCODE = '42501';
+  END IF;
+
+  IF jsonb_typeof(p_items) IS DISTINCT FROM 'array' THEN
+    RAISE EXCEPTION 'p_items must be a JSON array' USING ERRCODE = '22023';
+  END IF;
+
+  RETURN QUERY
+  WITH items AS (
+    SELECT
+      t.ord::INT AS item_index,
+      NULLIF(TRIM(t.item->>'id_perangkat'), '') AS id_perangkat,
+      NULLIF(TRIM(t.item->>'serial_number'), '') AS serial_number,
+      NULLIF(TRIM(t.item->>'lokasi_baru_kode'), '') AS lokasi_baru_kode,
+      COALESCE(NULLIF(t.item->>'keterangan', ''), p_keterangan) AS keterangan
+    FROM jsonb_array_elements(p_items) WITH ORDINALITY AS t(item, ord)
+  ),
+  -- Each lookup is an index probe (UNIQUE id_perangkat / serial_number), not a scan
+  resolved AS (
+    SELECT
+      i.item_index,
+      COALESCE(pi.id, ps.id) AS perangkat_id,
+      COALESCE(pi.id_perangkat, ps.id_perangkat, i.id_perangkat) AS id_perangkat,
+      COALESCE(pi.nama_perangkat, ps.nama_perangkat) AS nama_perangkat_lama,
+      COALESCE(pi.lokasi_kode, ps.lokasi_kode) AS lokasi_lama_kode,
+      i.lokasi_baru_kode,
+      lb.nama AS lokasi_baru_nama,
+      i.keterangan
+    FROM items i
+    LEFT JOIN perangkat pi ON pi.id_perangkat = i.id_perangkat
+    LEFT JOIN perangkat ps ON i.id_perangkat IS NULL AND ps.serial_number = i.serial_number
+    LEFT JOIN ms_lokasi lb ON lb.kode = i.lokasi_baru_kode
+  ),
+  checked AS (
+    SELECT
+      r.*,
+      ll.nama AS lokasi_lama_nama,
+      r.lokasi_baru_kode || '-' || (string_to_array(r.id_perangkat, '.'))[4] AS nama_perangkat_baru,
+      CASE
+        WHEN r.perangkat_id IS NULL OR ll.kode IS NULL THEN 'not_found'
+        WHEN r.lokasi_baru_nama IS NULL THEN 'lokasi_not_found'
+        WHEN r.lokasi_lama_kode = r.lokasi_baru_kode THEN 'same_lokasi'
+        -- Two moves of the same perangkat in one chunk: the first one wins
+        WHEN ROW_NUMBER() OVER (PARTITION BY r.perangkat_id ORDER BY r.item_index) > 1 THEN 'duplicate'
+        WHEN (string_to_array(r.id_perangkat, '.'))[4] IS NULL THEN 'no_urutan'
+        ELSE 'moved'
+      END AS status
+    FROM resolved r
+    LEFT JOIN ms_lokasi ll ON ll.kode = r.lokasi_lama_kode
+  ),
+  -- IMPORTANT: id_perangkat is IMMUTABLE - only nama_perangkat and lokasi_kode change
+  updated AS (
+    UPDATE perangkat p
+    SET
+      nama_perangkat = c.nama_perangkat_baru,
+      lokasi_kode = c.lokasi_baru_kode,
+      updated_at = NOW()
+    FROM checked c
+    WHERE c.status = 'moved'
+      AND NOT p_dry_run
+      AND p.id = c.perangkat_id
+    RETURNING p.id
+  ),
+  history AS (
+    INSERT INTO mutasi_perangkat (
+      perangkat_id,
+      lokasi_lama_kode,
+      lokasi_lama_nama,
+      lokasi_baru_kode,
+      lokasi_baru_nama,
+      nama_perangkat_lama,
+      nama_perangkat_baru,
+      keterangan,
+      created_by
+    )
+    SELECT
+      c.perangkat_id,
+      c.lokasi_lama_kode,
+      c.lokasi_lama_nama,
+      c.lokasi_baru_kode,
+      c.lokasi_baru_nama,
+      c.nama_perangkat_lama,
+      c.nama_perangkat_baru,
+      c.keterangan,
+      v_current_user
+    FROM checked c
+    JOIN updated u ON u.id = c.perangkat_id
+  )
+  SELECT
+    c.item_index,
+    c.perangkat_id,
+    c.id_perangkat,
+    c.status,
+    CASE c.status
+      WHEN 'moved' THEN 'Mutasi perangkat berhasil'
+      WHEN 'not_found' THEN 'Perangkat tidak ditemukan'
+      WHEN 'lokasi_not_found' THEN 'Lokasi dengan kode ' || COALESCE(c.lokasi_baru_kode, '(kosong)') || ' tidak ditemukan'
+      WHEN 'same_lokasi' THEN 'Lokasi baru sama dengan lokasi lama!'
+      WHEN 'duplicate' THEN 'Perangkat sudah dimutasi oleh baris lain di chunk ini'
+      ELSE 'id_perangkat tidak memiliki urutan (format KODE.TAHUN.BULAN.URUTAN)'
+    END,
+    c.nama_perangkat_lama,
+    CASE WHEN c.status = 'moved' THEN c.nama_perangkat_baru END,
+    c.lokasi_lama_kode
+  FROM checked c
+  ORDER BY c.item_index;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+REVOKE ALL ON FUNCTION public.mutasi_perangkat_bulk(JSONB, TEXT, UUID, BOOLEAN) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION public.mutasi_perangkat_bulk(JSONB, TEXT, UUID, BOOLEAN) TO authenticated, service_role;
+
+DO $$
+BEGIN
+  RAISE NOTICE '✅ mutasi_perangkat_bulk() added';
+END $$;
+
+COMMIT;
+
+-- ============================================================
+-- VERIFICATION QUERIES (Run separately to verify)
+-- ============================================================
+-- 1. Dry run of two moves (nothing is written):
+-- SELECT * FROM mutasi_perangkat_bulk(
+--   '[{"id_perangkat": "001.2025.12.0001", "lokasi_baru_kode": "IT"},
+--     {"serial_number": "SN123", "lokasi_baru_kode": "FARMASI158"}]'::jsonb,
+--   p_dry_run => true
+-- );
+--
+-- 2. Latest history rows:
+-- SELECT * FROM mutasi_perangkat ORDER BY created_at DESC LIMIT 10;
@@ -0,0 +1,57 @@
+-- ============================================================
+-- ADD: Indexed case-insensitive lookup of perangkat by serial_number
+--
+-- Problem:
+-- - Stok opname scans (stok_opname_reconcile.py) may differ from the registered serial
+--   only in case (scanners and manual entry differ)
+-- - serial_number ILIKE ... cannot use the unique index on serial_number, so every
+--   chunk of scans outside the counted locations was a sequential scan of perangkat
+--
+-- Solution:
+-- - An expression index on lower(serial_number)
+-- - find_perangkat_by_serial(p_serials) returns the perangkat whose lower(serial_number)
+--   is one of lower(p_serials), read from that index. The caller still prefers an exact
+--   match: serial_number stays case-sensitive unique, so 'abc1' and 'ABC1' can both exist
+--
+-- Run AFTER ADD_SERIAL_NUMBER_UNIQUE_SAFE.sql.
+-- Run in Supabase SQL editor.
+-- ============================================================
+
+BEGIN;
+
+-- ============================================================
+-- STEP 1: Expression index
+-- ============================================================
+CREATE INDEX IF NOT EXISTS idx_perangkat_serial_number_lower
+ON perangkat (lower(serial_number));
+
+-- ============================================================
+-- STEP 2: Lookup function
+-- ============================================================
+-- = ANY(ARRAY(...)) keeps the lowered serials one array, so the planner reads them as
+-- one index scan. SECURITY INVOKER: the RLS policies of perangkat still apply.
+CREATE OR REPLACE FUNCTION public.find_perangkat_by_serial(p_serials TEXT[])
+RETURNS SETOF perangkat AS $$
+  SELECT *
+  FROM perangkat
+  WHERE lower(serial_number) = ANY (ARRAY(SELECT lower(s) FROM unnest(p_serials) AS s));
+$$ LANGUAGE sql STABLE SET search_path = public;
+
+GRANT EXECUTE ON FUNCTION public.find_perangkat_by_serial(TEXT[]) TO authenticated, service_role;
+
+DO $$
+BEGIN
+  RAISE NOTICE '✅ find_perangkat_by_serial() added with idx_perangkat_serial_number_lower';
+END $$;
+
+COMMIT;
+
+-- ============================================================
+-- VERIFICATION QUERIES (Run separately to verify)
+-- ============================================================
+-- 1. Case-insensitive lookup:
+-- SELECT id_perangkat, serial_number FROM find_perangkat_by_serial(ARRAY['sn123', 'SN456']);
+--
+-- 2. The lookup uses the index (Index Scan / Bitmap Index Scan on idx_perangkat_serial_number_lower):
+-- EXPLAIN SELECT * FROM perangkat
+-- WHERE lower(serial_number) = ANY (ARRAY(SELECT lower(s) FROM unnest(ARRAY['sn123']) AS s));
@@ -0,0 +1,167 @@
+-- ============================================================
+-- ADD: Block reservation of id_perangkat sequence numbers (urutan)
+--
+-- Problem:
+-- - Bulk imports without id_perangkat make the perangkat trigger generate one ID per row
+-- - Every generation takes the global advisory lock and scans MAX(RIGHT(id_perangkat, 4))
+--   over the whole table: thousands of rows = thousands of locked scans, getting slower
+--   as the table grows
+--
+-- Solution:
+-- - reserve_id_perangkat_block(p_jumlah) takes the lock ONCE and hands out a contiguous
+--   block of global sequence numbers; the importer builds KODE.YYYY.M.NNNN locally
+-- - Reserved blocks are recorded in perangkat_id_reservations, and ID generation
+--   (trigger + generate_id_perangkat) continues after the highest reserved number, so
+--   numbers handed to an import are never given to another perangkat
+-- - The trigger only takes the lock when it actually generates an ID
+--
+-- Run AFTER ADD_SERIAL_NUMBER_UNIQUE_SAFE.sql and FIX_DUPLICATE_URUTAN_GLOBAL_PERANGKAT.sql.
+-- Run in Supabase SQL editor.
+-- ============================================================
+
+BEGIN;
+
+-- ============================================================
+-- STEP 1: Reservation log
+-- ============================================================
+CREATE TABLE IF NOT EXISTS perangkat_id_reservations (
+  id BIGSERIAL PRIMARY KEY,
+  first_urutan INT NOT NULL,
+  last_urutan INT NOT NULL,
+  reserved_by UUID DEFAULT auth.uid(),
+  reserved_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  CHECK (first_urutan <= last_urutan)
+);
+
+-- Only reachable through reserve_id_perangkat_block() (SECURITY DEFINER)
+ALTER TABLE perangkat_id_reservations ENABLE ROW LEVEL SECURITY;
+
+-- ============================================================
+-- STEP 2: Highest urutan in use (perangkat or reserved)
+-- ============================================================
+-- MAX(RIGHT(id_perangkat, 4)) on text matches the expression and predicate of
+-- perangkat_urutan4_global_unique, so it is read from the end of that index instead
+-- of scanning the table (4 zero-padded digits sort the same as numbers).
+CREATE OR REPLACE FUNCTION public.perangkat_max_urutan()
+RETURNS INT AS $$
+  SELECT GREATEST(
+    COALESCE((
+      SELECT MAX(RIGHT(id_perangkat, 4))
+      FROM perangkat
+      WHERE id_perangkat ~ '^[0-9]{3}\.[0-9]{4}\.[0-9]{1,2}\.[0-9]{4}$'
+    )::INT, 0),
+    COALESCE((SELECT MAX(last_urutan) FROM perangkat_id_reservations), 0)
+  );
+$$ LANGUAGE sql STABLE SECURITY DEFINER SET search_path = public;
+
+-- ============================================================
+-- STEP 3: Reserve a block
+-- ============================================================
+CREATE OR REPLACE FUNCTION public.reserve_id_perangkat_block(p_jumlah INT)
+RETURNS TABLE (first_urutan INT, last_urutan INT, tahun TEXT, bulan TEXT) AS $$
+DECLARE
+  v_first INT;
+BEGIN
+  IF p_jumlah IS NULL OR p_jumlah < 1 THEN
+    RAISE EXCEPTION 'p_jumlah must be at least 1' USING ERRCODE = '22023';
+  END IF;
+
+  -- Same lock as the trigger, held once for the whole block
+  PERFORM pg_advisory_xact_lock(hashtext('perangkat_global_sequence'));
+
+  v_first := public.perangkat_max_urutan() + 1;
+  IF v_first + p_jumlah - 1 > 9999 THEN
+    RAISE EXCEPTION 'Cannot reserve % id_perangkat numbers: urutan has 4 digits and % are left',
+      p_jumlah, GREATEST(9999 - v_first + 1, 0)
+      USING ERRCODE = '22003';
+  END IF;
+
+  INSERT INTO perangkat_id_reservations (first_urutan, last_urutan)
+  VALUES (v_first, v_first + p_jumlah - 1);
+
+  -- Year and month as the trigger would use them (server time)
+  RETURN QUERY SELECT v_first, v_first + p_jumlah - 1, TO_CHAR(NOW(), 'YYYY'), TO_CHAR(NOW(), 'FMMM');
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+REVOKE ALL ON FUNCTION public.reserve_id_perangkat_block(INT) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION public.reserve_id_perangkat_block(INT) TO authenticated, service_role;
+
+-- ============================================================
+-- STEP 4: ID generation continues after reserved blocks
+-- ============================================================
+CREATE OR REPLACE FUNCTION generate_id_perangkat(p_kode TEXT)
+RETURNS TEXT AS $$
+DECLARE
+  v_tahun TEXT;
+  v_bulan_single TEXT;
+  v_urutan INT;
+BEGIN
+  v_tahun := TO_CHAR(NOW(), 'YYYY');
+  v_bulan_single := TO_CHAR(NOW(), 'FMMM');
+
+  PERFORM pg_advisory_xact_lock(hashtext('perangkat_global_sequence'));
+  v_urutan := public.perangkat_max_urutan() + 1;
+
+  RETURN p_kode || '.' || v_tahun || '.' || v_bulan_single || '.' || LPAD(v_urutan::TEXT, 4, '0');
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION public.perangkat_before_insert_generate_ids()
+RETURNS TRIGGER AS $$
+DECLARE
+  v_existing_count INT;
+BEGIN
+  -- Validate serial_number is not empty or "-"
+  IF NEW.serial_number IS NULL OR NEW.serial_number = '' OR TRIM(NEW.serial_number) = '-' THEN
+    RAISE EXCEPTION
+      'serial_number cannot be NULL, empty, or "-". Please provide a valid serial number.'
+      USING ERRCODE = '23514';
+  END IF;
+
+  -- Check for duplicate serial_number FIRST (before generating ID)
+  SELECT COUNT(*) INTO v_existing_count
+  FROM perangkat
+  WHERE serial_number = NEW.serial_number;
+
+  IF v_existing_count > 0 THEN
+    RAISE EXCEPTION
+      'Duplicate serial number detected: "%" already exists in database. Cannot create perangkat with duplicate serial number.',
+      NEW.serial_number
+      USING ERRCODE = '23505'; -- unique_violation
+  END IF;
+
+  -- Generate id_perangkat only when not provided (rows from a reserved block already have one)
+  IF NEW.id_perangkat IS NULL OR NEW.id_perangkat = '' THEN
+    NEW.id_perangkat := generate_id_perangkat(NEW.jenis_perangkat_kode);
+  END IF;
+
+  -- If nama_perangkat not provided, build it from lokasi_kode + last4
+  IF (NEW.nama_perangkat IS NULL OR NEW.nama_perangkat = '')
+     AND NEW.lokasi_kode IS NOT NULL
+     AND NEW.lokasi_kode <> '' THEN
+    NEW.nama_perangkat := NEW.lokasi_kode || '-' || RIGHT(NEW.id_perangkat, 4);
+  END IF;
+
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+BEGIN
+  RAISE NOTICE '✅ reserve_id_perangkat_block() added; ID generation skips reserved numbers';
+END $$;
+
+COMMIT;
+
+-- ============================================================
+-- VERIFICATION QUERIES (Run separately to verify)
+-- ============================================================
+-- 1. Reserve 3 numbers (consumes them - only on a test database):
+-- SELECT * FROM reserve_id_perangkat_block(3);
+--
+-- 2. Reservations so far:
+-- SELECT * FROM perangkat_id_reservations ORDER BY id DESC LIMIT 10;
+--
+-- 3. Next generated ID continues after the last reservation:
+-- SELECT generate_id_perangkat('001');
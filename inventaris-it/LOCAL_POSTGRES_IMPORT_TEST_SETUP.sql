@@ -0,0 +1,45 @@
+-- ============================================================
+-- LOCAL POSTGRES SETUP FOR IMPORT TESTING
+--
+-- Minimal stand-ins for the Supabase objects the schema files
+-- depend on (roles, auth.users, auth.uid()), so the schema can
+-- be loaded into a plain local PostgreSQL to test
+-- `import_perangkat_bulk.py --engine copy`.
+--
+-- DO NOT run this on Supabase.
+--
+-- Load order (psql -v ON_ERROR_STOP=1 -d <db> -f <file>):
+--   1. LOCAL_POSTGRES_IMPORT_TEST_SETUP.sql
+--   2. database_schema_complete.sql
+--   3. database_schema_jenis_barang_update.sql
+--   4. database_storage_refactor.sql
+--   5. update_status_to_layak.sql
+--   6. ADD_SERIAL_NUMBER_UNIQUE_SAFE.sql (optional, same trigger as production)
+--   7. FIX_DUPLICATE_URUTAN_GLOBAL_PERANGKAT.sql + ADD_RESERVE_ID_PERANGKAT_BLOCK.sql
+--      (optional, for imports without id_perangkat)
+-- ============================================================
+
+DO $$
+BEGIN
+  IF NOT EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'authenticated') THEN
+    CREATE ROLE authenticated;
+  END IF;
+  IF NOT EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'anon') THEN
+    CREATE ROLE anon;
+  END IF;
+  IF NOT EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'service_role') THEN
+    CREATE ROLE service_role;
+  END IF;
+END $$;
+
+CREATE SCHEMA IF NOT EXISTS auth;
+
+CREATE TABLE IF NOT EXISTS auth.users (
+  id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+  email TEXT,
+  raw_user_meta_data JSONB
+);
+
+-- No session locally: RLS policies see an anonymous caller
+CREATE OR REPLACE FUNCTION auth.uid() RETURNS UUID
+LANGUAGE sql STABLE AS $$ SELECT NULL::uuid $$;
@@ -0,0 +1,643 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the Perangkat Bulk Import Script
+Runs import_perangkat_bulk.py against synthetic data and a local fake PostgREST server,
+so importer speedups and regressions can be measured without touching production
+"""
+
+import argparse
+import contextlib
+import csv
+import io
+import json
+import multiprocessing
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Callable, List, Dict, Optional, Tuple
+from urllib.parse import urlparse, parse_qsl
+from urllib.request import Request, urlopen
+
+# Fix Windows console encoding for emojis
+if sys.platform == 'win32':
+    import codecs
+    sys.stdout = codecs.getwriter('utf-8')(sys.stdout.buffer, 'strict')
+    sys.stderr = codecs.getwriter('utf-8')(sys.stderr.buffer, 'strict')
+
+# Same header as DATABASE_PERANGKAT_EXPORT.csv
+CSV_COLUMNS = [
+    'petugas_id', 'jenis_perangkat_kode', 'id_perangkat', 'serial_number', 'lokasi_kode',
+    'nama_perangkat', 'jenis_barang', 'merk', 'id_remoteaccess', 'spesifikasi_processor',
+    'kapasitas_ram', 'Kapasitas SSD', 'Kapasitas HDD', 'mac_ethernet', 'mac_wireless',
+    'ip_ethernet', 'ip_wireless', 'serial_number_monitor', 'tanggal_entry'
+]
+JENIS_PERANGKAT = ['001', '002', '003', '004', '005', '006']
+LOKASI = ['YANMED', 'KEUANGAN', 'IGD', 'RANAP', 'RAJAL', 'FARMASI', 'LAB', 'RADIOLOGI', 'TU', 'IT']
+MERK = ['DELL Optiplex 3050', 'HP ProDesk 400', 'Lenovo ThinkCentre M70', 'ASUS VivoBook', 'Acer Aspire']
+PROCESSOR = ['i3-10', 'i5-7', 'i5-10', 'i7-8', 'Ryzen 5']
+STORAGE = ['128 GB', '256 GB', '512 GB', '1 TB']
+MASTER_TABLES = {'profiles': 'id', 'ms_jenis_barang': 'id', 'ms_jenis_perangkat': 'kode', 'ms_lokasi': 'kode'}
+UNIQUE_COLUMNS = {'perangkat': ['id_perangkat', 'serial_number']}
+EMBEDDED_FOREIGN_KEYS = {('perangkat', 'perangkat_storage'): 'perangkat_id'}
+INDEXED_COLUMNS = {'perangkat': ['id', 'id_perangkat', 'serial_number'], 'perangkat_storage': ['perangkat_id']}
+ID_PERANGKAT_PATTERN = re.compile(r'^[0-9]{3}\.[0-9]{4}\.[0-9]{1,2}\.[0-9]{4}$')
+
+def generated_id_perangkat(jenis: str, i: int) -> str:
+    """id_perangkat of generated row i (from 1), KODE.YYYY.M.NNNN as the trigger builds it
+    
+    NNNN has 4 digits, so every 9999 rows go one month further back from 2025.12;
+    1M rows span about eight years and every id stays valid and unique.
+    """
+    period, urutan = divmod(i - 1, 9999)
+    year, month = divmod(2025 * 12 + 11 - period, 12)
+    return f'{jenis}.{year}.{month + 1}.{urutan + 1:04d}'
+
+def generate_csv(path: str, rows: int, seed: int = 42, placeholder_rate: float = 0.05,
+                 duplicate_rate: float = 0.005) -> Dict[str, List[str]]:
+    """Write a synthetic export with the DATABASE_PERANGKAT_EXPORT.csv layout
+    
+    Semicolon separated, '-' for empty values, optional SSD/HDD capacities and the mix of
+    date formats real exports contain (mostly DD/MM/YYYY HH:MM, some MM/DD/YYYY and ISO).
+    placeholder_rate of the rows get '-' as serial number and duplicate_rate reuse an
+    earlier serial. Returns the master data the rows reference.
+    """
+    rng = random.Random(seed)
+    master = {
+        'profiles': [str(uuid.UUID(int=rng.getrandbits(128), version=4)) for _ in range(8)],
+        'ms_jenis_barang': [str(uuid.UUID(int=rng.getrandbits(128), version=4)) for _ in range(5)],
+        'ms_jenis_perangkat': JENIS_PERANGKAT,
+        'ms_lokasi': LOKASI,
+    }
+    start = datetime(2025, 12, 1, 7, 0)
+    
+    def placeholder(value: str, rate: float = 0.3) -> str:
+        return '-' if rng.random() < rate else value
+    
+    def mac() -> str:
+        return '-'.join(f'{rng.randrange(256):02x}' for _ in range(6))
+    
+    def entry_date() -> str:
+        # Exports are entered in sessions: many rows share a timestamp
+        dt = start + timedelta(minutes=rng.randrange(60 * 24 * 90) // 7 * 7)
+        style = rng.random()
+        if style < 0.80:
+            return dt.strftime('%d/%m/%Y %H:%M')
+        if style < 0.90:
+            return dt.strftime('%d/%m/%Y')
+        if style < 0.97 and dt.day > 12:
+            return dt.strftime('%m/%d/%Y %H:%M')
+        return dt.strftime('%Y-%m-%d %H:%M:%S')
+    
+    serials = []
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f, delimiter=';', lineterminator='\n')
+        writer.writerow(CSV_COLUMNS)
+        for i in range(1, rows + 1):
+            jenis = rng.choice(JENIS_PERANGKAT)
+            lokasi = rng.choice(LOKASI)
+            if rng.random() < placeholder_rate:
+                serial = '-'
+            elif serials and rng.random() < duplicate_rate:
+                serial = rng.choice(serials)
+            else:
+                serial = f'SN{rng.getrandbits(40):010X}'
+                serials.append(serial)
+            ssd = rng.choice(STORAGE) if rng.random() < 0.7 else '-'
+            hdd = rng.choice(STORAGE) if ssd == '-' or rng.random() < 0.1 else '-'
+            writer.writerow([
+                rng.choice(master['profiles']), jenis, generated_id_perangkat(jenis, i), serial, lokasi,
+                f'{lokasi}-{i % 10000:04d}', rng.choice(master['ms_jenis_barang']),
+                placeholder(rng.choice(MERK), 0.1), placeholder(str(rng.randrange(10**9, 10**10))),
+                placeholder(rng.choice(PROCESSOR), 0.1), placeholder(str(rng.choice([4, 8, 16])), 0.1),
+                ssd, hdd, placeholder(mac()), placeholder(mac()),
+                placeholder(f'192.168.{rng.randrange(256)}.{rng.randrange(1, 255)}', 0.6), '-',
+                placeholder(f'MON{rng.getrandbits(24):06X}', 0.5), entry_date(),
+            ])
+    return master
+
+def master_data_of(csv_file: str) -> Dict[str, List[str]]:
+    """Master data referenced by an existing export, to seed the fake server with"""
+    values = {table: set() for table in MASTER_TABLES}
+    with open(csv_file, encoding='utf-8') as f:
+        first_line = f.readline()
+        f.seek(0)
+        for row in csv.DictReader(f, delimiter=';' if ';' in first_line else ','):
+            values['profiles'].add(row['petugas_id'].strip())
+            values['ms_jenis_barang'].add(row['jenis_barang'].strip())
+            values['ms_jenis_perangkat'].add(row['jenis_perangkat_kode'].strip())
+            values['ms_lokasi'].add(row['lokasi_kode'].strip())
+    return {table: sorted(v) for table, v in values.items()}
+
+class FakePostgrest:
+    """In-memory stand-in for the parts of PostgREST the importer uses
+    
+    Supports select/in/eq/ilike/or filters with offset/limit, inserts (return=representation
+    or minimal, upsert via on_conflict + Prefer: resolution=merge-duplicates) with the UNIQUE
+    constraints of perangkat, PATCH, DELETE and the reserve_id_perangkat_block and
+    find_perangkat_by_serial RPCs. Write requests wait latency seconds (+/- jitter) and fail
+    with 503 at error_rate. Every request's service time is recorded.
+    """
+    
+    def __init__(self, master: Dict[str, List[str]], latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, seed: int = 42):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.tables = {table: [{column: value} for value in master[table]]
+                       for table, column in MASTER_TABLES.items()}
+        self.tables.update(perangkat=[], perangkat_storage=[])
+        self.indexes = {table: {column: {} for column in columns} for table, columns in INDEXED_COLUMNS.items()}
+        self.reserved_urutan = 0
+        self.reset_stats()
+    
+    def reset_stats(self):
+        with self.lock:
+            self.requests = {}
+            self.durations = []
+    
+    def clear(self):
+        """Empty perangkat and perangkat_storage, so another import stage starts from the same state"""
+        with self.lock:
+            self.tables.update(perangkat=[], perangkat_storage=[])
+            self.indexes = {table: {column: {} for column in columns} for table, columns in INDEXED_COLUMNS.items()}
+    
+    def stats(self) -> Dict:
+        with self.lock:
+            return {'requests': dict(self.requests), 'durations': list(self.durations)}
+    
+    def record(self, route: str, seconds: float):
+        with self.lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+            self.durations.append(seconds)
+    
+    def delay(self) -> bool:
+        """Sleep the injected latency; returns False when this request should fail"""
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter)))
+        return self.rng.random() >= self.error_rate
+    
+    def _index_add(self, table: str, row: Dict):
+        for column, index in self.indexes.get(table, {}).items():
+            if row.get(column) is not None:
+                index.setdefault(row[column], []).append(row)
+    
+    def _index_remove(self, table: str, row: Dict):
+        for column, index in self.indexes.get(table, {}).items():
+            bucket = index.get(row.get(column), [])
+            if row in bucket:
+                bucket.remove(row)
+    
+    def select(self, table: str, params: List[Tuple[str, str]]) -> List[Dict]:
+        filters = [(k, v) for k, v in params
+                   if k not in ('select', 'limit', 'offset', 'order', 'on_conflict', 'columns')]
+        rows = None
+        for column, value in filters:
+            op, _, arg = value.partition('.')
+            index = self.indexes.get(table, {}).get(column)
+            if index is not None and op in ('in', 'eq'):
+                values = parse_in_list(arg) if op == 'in' else [arg]
+                rows = [row for v in dict.fromkeys(values) for row in index.get(v, [])]
+                filters.remove((column, value))
+                break
+        if rows is None:
+            rows = self.tables.setdefault(table, [])
+        for column, value in filters:
+            if column == 'or':
+                conditions = parse_or_list(value)
+                rows = [row for row in rows if any(matches(row.get(c), v) for c, v in conditions)]
+            else:
+                rows = [row for row in rows if matches(row.get(column), value)]
+        options = dict(params)
+        if 'order' in options:
+            column, _, direction = options['order'].partition('.')
+            rows = sorted(rows, key=lambda r: (r.get(column) is None, str(r.get(column))),
+                          reverse=direction.startswith('desc'))
+        offset = int(options.get('offset', 0))
+        limit = options.get('limit')
+        rows = rows[offset:offset + int(limit) if limit else None]
+        return [self.project(table, row, options.get('select')) for row in rows]
+    
+    def project(self, table: str, row: Dict, select: Optional[str]) -> Dict:
+        """Apply a select list, including embedded tables such as perangkat_storage(kapasitas)"""
+        if not select or select == '*':
+            return row
+        result = {}
+        for column in re.findall(r'\w+\([^)]*\)|[^,]+', select):
+            column = column.strip()
+            embed = re.fullmatch(r'(\w+)\(([^)]*)\)', column)
+            if embed:
+                child, child_select = embed.groups()
+                foreign_key = EMBEDDED_FOREIGN_KEYS[(table, child)]
+                children = self.indexes[child][foreign_key].get(row.get('id'), [])
+                result[child] = [self.project(child, c, child_select) for c in children]
+            elif column == '*':
+                result.update(row)
+            else:
+                result[column] = row.get(column)
+        return result
+    
+    def insert(self, table: str, items: List[Dict], on_conflict: Optional[str]) -> Tuple[int, object]:
+        with self.lock:
+            rows = self.tables.setdefault(table, [])
+            unique = UNIQUE_COLUMNS.get(table, [])
+            pending = {column: {} for column in unique}
+            for item in items:
+                for column in unique:
+                    value = item.get(column)
+                    if value is None:
+                        continue
+                    owner = [r for r in self.indexes[table][column].get(value, [])] + \
+                            ([pending[column][value]] if value in pending[column] else [])
+                    for row in owner:
+                        if not on_conflict or row.get(on_conflict) != item.get(on_conflict):
+                            return 409, {'code': '23505', 'details': None, 'hint': None,
+                                         'message': f'duplicate key value violates unique constraint '
+                                                    f'"{table}_{column}_key"'}
+                    pending[column][value] = item
+    
+            result = []
+            for item in items:
+                existing = self.indexes.get(table, {}).get(on_conflict, {}).get(item.get(on_conflict)) \
+                    if on_conflict else None
+                if existing:
+                    row = existing[0]
+                    self._index_remove(table, row)
+                    row.update(item)
+                else:
+                    row = dict(item)
+                    row.setdefault('id', str(uuid.uuid4()))
+                    rows.append(row)
+                self._index_add(table, row)
+                result.append(row)
+            return 201, result
+    
+    def update(self, table: str, params: List[Tuple[str, str]], changes: Dict) -> List[Dict]:
+        with self.lock:
+            rows = self.select(table, [(k, v) for k, v in params if k != 'select'])
+            for row in rows:
+                self._index_remove(table, row)
+                row.update(changes)
+                self._index_add(table, row)
+            return rows
+    
+    def delete(self, table: str, params: List[Tuple[str, str]]) -> List[Dict]:
+        with self.lock:
+            doomed = self.select(table, [(k, v) for k, v in params if k != 'select'])
+            ids = {id(row) for row in doomed}
+            for row in doomed:
+                self._index_remove(table, row)
+            self.tables[table] = [row for row in self.tables[table] if id(row) not in ids]
+            return doomed
+    
+    def rpc(self, name: str, args: Dict) -> Tuple[int, object]:
+        if name == 'find_perangkat_by_serial':
+            wanted = {serial.lower() for serial in args['p_serials']}
+            with self.lock:
+                return 200, [row for row in self.tables['perangkat']
+                             if (row.get('serial_number') or '').lower() in wanted]
+        if name != 'reserve_id_perangkat_block':
+            return 404, {'code': 'PGRST202', 'message': f'Could not find the function public.{name}',
+                         'details': None, 'hint': None}
+        with self.lock:
+            used = [int(r['id_perangkat'][-4:]) for r in self.tables['perangkat']
+                    if ID_PERANGKAT_PATTERN.match(r.get('id_perangkat') or '')]
+            first = max(used + [self.reserved_urutan]) + 1
+            self.reserved_urutan = first + args['p_jumlah'] - 1
+            now = datetime.now()
+            return 200, [{'first_urutan': first, 'last_urutan': self.reserved_urutan,
+                          'tahun': str(now.year), 'bulan': str(now.month)}]
+
+def parse_in_list(arg: str) -> List[str]:
+    """Values of a PostgREST in.(a,"b,c") filter"""
+    return [v.strip('"') for v in re.findall(r'"[^"]*"|[^,]+', arg[1:-1])]
+
+def parse_or_list(arg: str) -> List[Tuple[str, str]]:
+    """(column, condition) pairs of a PostgREST or=(a.eq.1,b.ilike."x,y") filter"""
+    conditions = re.findall(r'(?:[^,"]|"(?:\\.|[^"\\])*")+', arg[1:-1])
+    return [tuple(c.partition('.')[::2]) for c in conditions]
+
+def like_regex(pattern: str) -> re.Pattern:
+    """A (quoted) LIKE pattern as a case-insensitive regex; * is % as in PostgREST, \\ escapes"""
+    if pattern.startswith('"'):
+        pattern = re.sub(r'\\(.)', r'\1', pattern[1:-1])
+    regex = ''
+    for part in re.findall(r'\\.|[%*_]|[^\\%*_]+', pattern):
+        if part in ('%', '*', '_'):
+            regex += '.' if part == '_' else '.*'
+        else:
+            regex += re.escape(part[1:] if part.startswith('\\') else part)
+    return re.compile(regex + r'\Z', re.IGNORECASE | re.DOTALL)
+
+def matches(value, condition: str) -> bool:
+    op, _, arg = condition.partition('.')
+    if op == 'ilike':
+        return value is not None and like_regex(arg).match(str(value)) is not None
+    if op == 'in':
+        return value is not None and str(value) in parse_in_list(arg)
+    if op == 'eq':
+        return value is not None and str(value) == arg
+    if op in ('gt', 'gte', 'lt', 'lte'):
+        if value is None:
+            return False
+        value = str(value)
+        return {'gt': value > arg, 'gte': value >= arg, 'lt': value < arg, 'lte': value <= arg}[op]
+    if op == 'is':
+        return value is None if arg == 'null' else True
+    return True
+
+def make_handler(db: FakePostgrest):
+    """HTTP handler for db; /__stats, /__reset and /__clear are the benchmark's own endpoints"""
+    
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True  # Headers and body are separate writes; avoid the delayed-ACK stall
+    
+        def log_message(self, *args):
+            pass
+    
+        def send_json(self, status: int, body):
+            data = json.dumps(body).encode() if body is not None else b''
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+    
+        def read_json(self):
+            return json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'null')
+    
+        def handle_request(self, work: Callable[[str, List[Tuple[str, str]]], Tuple[int, object]],
+                           write: bool = False):
+            started = time.perf_counter()
+            url = urlparse(self.path)
+            table = url.path.rsplit('/', 1)[-1]
+            params = parse_qsl(url.query, keep_blank_values=True)
+            if url.path == '/__stats':
+                return self.send_json(200, db.stats())
+            if url.path == '/__reset':
+                db.reset_stats()
+                return self.send_json(200, {})
+            if url.path == '/__clear':
+                db.clear()
+                return self.send_json(200, {})
+    
+            if write and not db.delay():
+                self.read_json()
+                status, body = 503, {'code': '503', 'message': 'Service Unavailable (injected)',
+                                     'details': None, 'hint': None}
+            else:
+                status, body = work(table, params)
+            if status < 300 and 'return=minimal' in self.headers.get('Prefer', ''):
+                body = None
+            self.send_json(status, body)
+            db.record(f'{self.command} {table}', time.perf_counter() - started)
+    
+        def do_GET(self):
+            self.handle_request(lambda table, params: (200, db.select(table, params)))
+    
+        def do_POST(self):
+            if '/rpc/' in self.path:
+                return self.handle_request(lambda name, params: db.rpc(name, self.read_json()), write=True)
+            
+            def work(table, params):
+                body = self.read_json()
+                upsert = 'merge-duplicates' in self.headers.get('Prefer', '')
+                on_conflict = dict(params).get('on_conflict') if upsert else None
+                return db.insert(table, body if isinstance(body, list) else [body], on_conflict)
+            self.handle_request(work, write=True)
+    
+        def do_PATCH(self):
+            self.handle_request(lambda table, params: (200, db.update(table, params, self.read_json())), write=True)
+    
+        def do_DELETE(self):
+            self.handle_request(lambda table, params: (200, db.delete(table, params)), write=True)
+    
+    return Handler
+
+def serve(port: int, master: Dict[str, List[str]], latency: float, jitter: float, error_rate: float,
+          ready=None):
+    """Run the fake PostgREST server until the process is terminated"""
+    db = FakePostgrest(master, latency=latency, jitter=jitter, error_rate=error_rate)
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(db))
+    server.daemon_threads = True
+    if ready is not None:
+        ready.put(server.server_address[1])
+    server.serve_forever()
+
+def fetch_server_stats(url: str, reset: bool = False) -> Dict:
+    with urlopen(Request(f'{url}/{"__reset" if reset else "__stats"}')) as response:
+        return json.loads(response.read())
+
+def clear_server(url: str):
+    with urlopen(Request(f'{url}/__clear')):
+        pass
+
+class PeakRss:
+    """Sample the resident set size in the background and keep the peak (Linux: /proc)"""
+    
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak = self.start = 0
+        self._stop = threading.Event()
+        self._thread = None
+    
+    @staticmethod
+    def current() -> int:
+        try:
+            with open('/proc/self/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            pass
+        try:
+            import resource
+            # Lifetime peak: not per stage, but the best available outside Linux
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return peak if sys.platform == 'darwin' else peak * 1024
+        except ImportError:
+            return 0
+    
+    def __enter__(self):
+        self.peak = self.start = self.current()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+    
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.current())
+    
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self.current())
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+def run_stage(name: str, rows: int, url: str, work: Callable[[], object], verbose: bool = False) -> Dict:
+    """Run one importer stage with its output captured; returns its measurements"""
+    fetch_server_stats(url, reset=True)
+    output = io.StringIO()
+    with PeakRss() as rss:
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(sys.stdout if verbose else output):
+            work()
+        seconds = time.perf_counter() - started
+    server = fetch_server_stats(url)
+    return {
+        'stage': name,
+        'rows': rows,
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(rows / seconds, 1) if seconds else None,
+        'requests': sum(server['requests'].values()),
+        'requests_by_route': server['requests'],
+        'p50_ms': round(percentile(server['durations'], 50) * 1000, 2),
+        'p99_ms': round(percentile(server['durations'], 99) * 1000, 2),
+        'peak_rss_mb': round(rss.peak / 2**20, 1),
+        'rss_growth_mb': round((rss.peak - rss.start) / 2**20, 1),  # What the stage itself allocated
+    }
+
+def print_report(results: List[Dict]):
+    headers = ['Stage', 'Rows', 'Seconds', 'Rows/s', 'Requests', 'p50 ms', 'p99 ms', 'Peak RSS MB', 'RSS +MB']
+    keys = ['stage', 'rows', 'seconds', 'rows_per_second', 'requests', 'p50_ms', 'p99_ms', 'peak_rss_mb',
+            'rss_growth_mb']
+    table = [[str(r[k]) for k in keys] for r in results]
+    widths = [max(len(h), *(len(row[i]) for row in table)) for i, h in enumerate(headers)]
+    print("\n" + "="*60)
+    print("📊 BENCHMARK RESULTS")
+    print("="*60)
+    print(" | ".join(h.ljust(w) for h, w in zip(headers, widths)))
+    print("-+-".join('-' * w for w in widths))
+    for row in table:
+        print(" | ".join(v.ljust(w) for v, w in zip(row, widths)))
+    print("="*60)
+
+def import_async(importer, url: str, csv_file: str, supabase, reference, workdir: str, options: Dict):
+    """The import stage on --engine async (one AsyncPostgrest client, closed afterwards)"""
+    client = importer.AsyncPostgrest(url, 'benchmark',
+                                     connections=options.get('workers', importer.DEFAULT_WORKERS))
+    try:
+        return importer.import_perangkat_from_csv(
+            csv_file, supabase, reference=reference, rejects_file=os.path.join(workdir, 'rejects_async.csv'),
+            journal_file=os.path.join(workdir, 'journal_async.jsonl'),
+            conflicts=importer.preflight_conflicts(supabase, csv_file), client=client, **options)
+    finally:
+        client.close()
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Benchmark import_perangkat_bulk.py against a local fake PostgREST')
+    parser.add_argument('--rows', type=int, default=10_000, help='Synthetic rows to generate (default: 10000)')
+    parser.add_argument('--csv', metavar='FILE', help='Benchmark this CSV instead of generating one')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed for the generated data (default: 42)')
+    parser.add_argument('--latency', type=float, default=20.0, help='Latency of write requests in ms (default: 20)')
+    parser.add_argument('--jitter', type=float, default=5.0, help='+/- random latency in ms (default: 5)')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='Fraction of write requests answered with 503 (default: 0)')
+    parser.add_argument('--workers', type=int, default=None, help='Importer --workers (default: importer default)')
+    parser.add_argument('--batch-size', type=int, default=None, help='Importer --batch-size (default: importer default)')
+    parser.add_argument('--stages', default='lint,parse,validate,preflight,import',
+                        help='Comma separated stages to run (default: lint,parse,validate,preflight,import; '
+                             'also load and import_async)')
+    parser.add_argument('--json', metavar='FILE', help='Also write the results as JSON (for comparing runs)')
+    parser.add_argument('--serve', type=int, metavar='PORT',
+                        help="Only run the fake server on PORT (seeded from the generated data) until Ctrl+C")
+    parser.add_argument('--verbose', action='store_true', help='Show the importer output')
+    args = parser.parse_args()
+    
+    workdir = tempfile.mkdtemp(prefix='perangkat_benchmark_')
+    csv_file = args.csv or os.path.join(workdir, 'perangkat_benchmark.csv')
+    
+    started = time.perf_counter()
+    if args.csv:
+        master = master_data_of(args.csv)
+    else:
+        master = generate_csv(csv_file, args.rows, seed=args.seed)
+    with open(csv_file, 'rb') as f:
+        rows = sum(1 for _ in f) - 1
+    print(f"📄 {'Using' if args.csv else 'Generated'} {rows} rows in {csv_file} "
+          f"({time.perf_counter() - started:.2f}s)")
+    
+    latency, jitter = args.latency / 1000, args.jitter / 1000
+    if args.serve:
+        print(f"🚀 Fake PostgREST on http://127.0.0.1:{args.serve} (Ctrl+C to stop)")
+        print(f"   SUPABASE_URL=http://127.0.0.1:{args.serve} SUPABASE_KEY=benchmark")
+        try:
+            serve(args.serve, master, latency, jitter, args.error_rate)
+        except KeyboardInterrupt:
+            pass
+        return
+    
+    # The server runs in its own process so it does not compete with the importer for the GIL
+    ready = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(0, master, latency, jitter, args.error_rate, ready),
+                                     daemon=True)
+    server.start()
+    url = f'http://127.0.0.1:{ready.get(timeout=30)}'
+    
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import import_perangkat_bulk as importer
+    from supabase import create_client
+    
+    supabase = create_client(url, 'benchmark')
+    reference = importer.ReferenceCache(supabase, path=os.path.join(workdir, 'reference_cache.json'))
+    options = {}
+    if args.workers:
+        options['workers'] = args.workers
+    if args.batch_size:
+        options['batch_size'] = args.batch_size
+    
+    stages = {
+        'lint': lambda: importer.lint_csv(csv_file),
+        'parse': lambda: importer.import_perangkat_from_csv(csv_file, supabase, dry_run=True),
+        # Every row held in memory at once, as a worker of a multi-file import does: shows memory per row
+        'load': lambda: importer.parse_file(csv_file),
+        'validate': lambda: importer.validate_uuids(supabase, csv_file, reference),
+        'preflight': lambda: importer.preflight_conflicts(supabase, csv_file),
+        'import': lambda: importer.import_perangkat_from_csv(
+            csv_file, supabase, reference=reference, rejects_file=os.path.join(workdir, 'rejects.csv'),
+            journal_file=os.path.join(workdir, 'journal.jsonl'),
+            conflicts=importer.preflight_conflicts(supabase, csv_file), **options),
+        'import_async': lambda: import_async(importer, url, csv_file, supabase, reference, workdir, options),
+    }
+    
+    print(f"🌐 Fake PostgREST at {url} (latency {args.latency:g}±{args.jitter:g} ms, "
+          f"error rate {args.error_rate:g})")
+    results = []
+    try:
+        for name in args.stages.split(','):
+            name = name.strip()
+            if name not in stages:
+                print(f"❌ ERROR: Unknown stage '{name}' (choose from {', '.join(stages)})")
+                sys.exit(1)
+            print(f"⏱️  {name}...")
+            if name.startswith('import'):
+                clear_server(url)  # Each import stage inserts the same rows into empty tables
+            results.append(run_stage(name, rows, url, stages[name], verbose=args.verbose))
+    finally:
+        server.terminate()
+    
+    print_report(results)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'rows': rows, 'latency_ms': args.latency, 'error_rate': args.error_rate,
+                       'options': options, 'stages': results}, f, indent=2)
+        print(f"📝 Results written to {args.json}")
+
+if __name__ == '__main__':
+    main()
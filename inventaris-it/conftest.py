@@ -0,0 +1,32 @@
+"""
+Shared fixtures for the tests of the Python import/export scripts
+Run from this directory with: python -m pytest -q
+"""
+
+import queue
+import threading
+
+import pytest
+
+from benchmark_import_perangkat import clear_server, generate_csv, serve
+
+@pytest.fixture(scope='session')
+def master_csv(tmp_path_factory):
+    """A small synthetic export (no placeholder or duplicate serials) and the master data it references"""
+    path = str(tmp_path_factory.mktemp('data') / 'perangkat.csv')
+    master = generate_csv(path, 40, placeholder_rate=0, duplicate_rate=0)
+    return path, master
+
+@pytest.fixture(scope='session')
+def fake_url(master_csv):
+    """URL of a fake PostgREST (see benchmark_import_perangkat.py) seeded with the master data"""
+    ready = queue.Queue()
+    threading.Thread(target=serve, args=(0, master_csv[1], 0.0, 0.0, 0.0, ready), daemon=True).start()
+    return f'http://127.0.0.1:{ready.get(timeout=10)}'
+
+@pytest.fixture
+def supabase(fake_url):
+    """Supabase client on the fake PostgREST, with empty perangkat tables"""
+    supabase_py = pytest.importorskip('supabase')
+    clear_server(fake_url)
+    return supabase_py.create_client(fake_url, 'test')
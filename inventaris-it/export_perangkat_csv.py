@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Export Script for Perangkat Data
+Writes perangkat + perangkat_storage in the DATABASE_PERANGKAT_EXPORT.csv layout,
+so the file can be loaded again with import_perangkat_bulk.py
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional
+
+from import_perangkat_bulk import FETCH_PAGE_SIZE, execute_with_retry, init_supabase, log, write_atomic
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+# Column order of DATABASE_PERANGKAT_EXPORT.csv (what import_perangkat_from_csv() reads)
+EXPORT_COLUMNS = [
+    'petugas_id', 'jenis_perangkat_kode', 'id_perangkat', 'serial_number', 'lokasi_kode',
+    'nama_perangkat', 'jenis_barang', 'merk', 'id_remoteaccess', 'spesifikasi_processor',
+    'kapasitas_ram', 'Kapasitas SSD', 'Kapasitas HDD', 'mac_ethernet', 'mac_wireless',
+    'ip_ethernet', 'ip_wireless', 'serial_number_monitor', 'tanggal_entry'
+]
+# CSV column -> perangkat column, where they differ
+SOURCE_COLUMNS = {'jenis_barang': 'jenis_barang_id'}
+SELECT = ', '.join([SOURCE_COLUMNS.get(c, c) for c in EXPORT_COLUMNS if not c.startswith('Kapasitas ')]
+                   + ['perangkat_storage(jenis_storage, kapasitas)'])
+PREFETCH_PAGES = 2  # Pages fetched ahead of the writer
+
+def format_date(value: Optional[str]) -> str:
+    """timestamptz from PostgREST -> DD/MM/YYYY HH:MM:SS[.ffffff] (UTC, as the importer sends naive dates)
+    
+    The full timestamp is kept, so a re-import (or --sync) of the file reads back the same value.
+    """
+    if not value:
+        return '-'
+    dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if dt.tzinfo:
+        dt = dt.astimezone(timezone.utc)
+    return dt.strftime('%d/%m/%Y %H:%M:%S.%f' if dt.microsecond else '%d/%m/%Y %H:%M:%S')
+
+def export_row(record: Dict, stats: Dict) -> List[str]:
+    """Flatten a perangkat record (with embedded storage) into an export row; NULL becomes '-'"""
+    storage = {}
+    for entry in record.get('perangkat_storage') or []:
+        if entry['jenis_storage'] in storage:
+            stats['storage_skipped'] += 1  # The CSV has one SSD and one HDD column
+            continue
+        storage[entry['jenis_storage']] = entry['kapasitas']
+    
+    row = []
+    for column in EXPORT_COLUMNS:
+        if column == 'Kapasitas SSD':
+            value = storage.get('SSD')
+        elif column == 'Kapasitas HDD':
+            value = storage.get('HDD')
+        elif column == 'tanggal_entry':
+            value = format_date(record.get('tanggal_entry'))
+        else:
+            value = record.get(SOURCE_COLUMNS.get(column, column))
+        row.append('-' if value is None or value == '' else str(value))
+    return row
+
+def iter_pages(supabase: Client, since: Optional[str] = None,
+               page_size: int = FETCH_PAGE_SIZE) -> Iterator[List[Dict]]:
+    """Page through perangkat ordered by id_perangkat, continuing after the last key seen
+    
+    Keyset pagination: each request is an index range scan starting at the previous
+    page's last id_perangkat, so page N costs the same as page 1 (OFFSET would rescan).
+    Stops at the first empty page: a short page may just be the server's max-rows limit.
+    """
+    last_key = None
+    while True:
+        def request():
+            query = supabase.table('perangkat').select(SELECT)
+            if since:
+                query = query.gte('tanggal_entry', since)
+            if last_key is not None:
+                query = query.gt('id_perangkat', last_key)
+            return query.order('id_perangkat').limit(page_size).execute()
+    
+        page = execute_with_retry(request).data
+        if not page:
+            return
+        yield page
+        last_key = page[-1]['id_perangkat']
+
+def prefetch(pages: Iterator[List[Dict]], depth: int = PREFETCH_PAGES) -> Iterator[List[Dict]]:
+    """Fetch pages in a background thread while the caller writes the previous ones"""
+    buffer = queue.Queue(maxsize=depth)
+    done = object()
+    
+    def produce():
+        try:
+            for page in pages:
+                buffer.put(page)
+        except Exception as e:
+            buffer.put(e)
+        buffer.put(done)
+    
+    threading.Thread(target=produce, daemon=True, name='perangkat-export-fetch').start()
+    while True:
+        item = buffer.get()
+        if item is done:
+            return
+        if isinstance(item, Exception):
+            raise item
+        yield item
+
+def export_perangkat_csv(supabase: Client, output: str, since: Optional[str] = None,
+                         page_size: int = FETCH_PAGE_SIZE, stdout=None) -> Dict:
+    """Stream perangkat into output ('-' for stdout); returns counts and the newest tanggal_entry
+    
+    Only PREFETCH_PAGES + 1 pages are held in memory at a time. A file is written next to
+    output and renamed when complete, so an interrupted export never replaces the last one.
+    """
+    stats = {'rows': 0, 'storage': 0, 'storage_skipped': 0, 'max_tanggal_entry': None}
+    to_stdout = output == '-'
+    tmp_path = None if to_stdout else output + '.tmp'
+    f = (stdout or sys.stdout) if to_stdout else open(tmp_path, 'w', encoding='utf-8', newline='')
+    started = time.perf_counter()
+    last_progress = started
+    
+    try:
+        writer = csv.writer(f, delimiter=';', lineterminator='\n')
+        writer.writerow(EXPORT_COLUMNS)
+        for page in prefetch(iter_pages(supabase, since, page_size)):
+            for record in page:
+                writer.writerow(export_row(record, stats))
+                stats['storage'] += len(record.get('perangkat_storage') or [])
+                entry = record.get('tanggal_entry')
+                if entry and (stats['max_tanggal_entry'] is None or entry > stats['max_tanggal_entry']):
+                    stats['max_tanggal_entry'] = entry
+            stats['rows'] += len(page)
+            if time.perf_counter() - last_progress >= 5:
+                last_progress = time.perf_counter()
+                rate = stats['rows'] / (last_progress - started)
+                log('info', f"   ⏱️  {stats['rows']} rows exported | {rate:.0f} rows/s")
+    except BaseException:
+        if not to_stdout:
+            f.close()
+            os.remove(tmp_path)
+        raise
+    
+    if not to_stdout:
+        f.close()
+        os.replace(tmp_path, output)
+    stats['seconds'] = time.perf_counter() - started
+    return stats
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Export perangkat data in the bulk import CSV layout')
+    parser.add_argument('output', help="CSV file to write ('-' for stdout)")
+    parser.add_argument('--since', metavar='TIMESTAMP',
+                        help='Only export rows with tanggal_entry >= TIMESTAMP (ISO 8601, e.g. 2025-12-01)')
+    parser.add_argument('--watermark-file', metavar='FILE',
+                        help='Read --since from FILE when not given, and store the newest tanggal_entry '
+                             'exported there afterwards (for incremental nightly exports)')
+    parser.add_argument('--page-size', type=int, default=FETCH_PAGE_SIZE,
+                        help=f'Rows per request (default: {FETCH_PAGE_SIZE}, the PostgREST max-rows default)')
+    args = parser.parse_args()
+    
+    since = args.since
+    if since is None and args.watermark_file and os.path.exists(args.watermark_file):
+        with open(args.watermark_file, encoding='utf-8') as f:
+            since = f.read().strip() or None
+    
+    # Messages go to stderr when the CSV itself goes to stdout
+    csv_stdout = sys.stdout
+    if args.output == '-':
+        sys.stdout = sys.stderr
+    
+    print("="*60)
+    print("📦 EXPORT SCRIPT FOR PERANGKAT DATA")
+    print("="*60)
+    print(f"Output: {args.output}")
+    print(f"Since: {since or 'all rows'}")
+    print("="*60 + "\n")
+    
+    supabase = init_supabase()
+    stats = export_perangkat_csv(supabase, args.output, since=since, page_size=args.page_size, stdout=csv_stdout)
+    
+    rate = stats['rows'] / stats['seconds'] if stats['seconds'] else 0
+    print(f"\n✅ Exported {stats['rows']} perangkat records with {stats['storage']} storage entries "
+          f"in {stats['seconds']:.2f}s ({rate:.0f} rows/s)")
+    if stats['storage_skipped']:
+        print(f"⚠️  {stats['storage_skipped']} extra storage entries not exported "
+              f"(the CSV holds one SSD and one HDD per perangkat)")
+    if stats['rows'] == 0 and not since:
+        print("⚠️  No rows returned - with an anon key, RLS may hide perangkat (use the service role key)")
+    
+    if args.watermark_file and stats['max_tanggal_entry']:
+        # >= on the next run: rows sharing the newest timestamp are exported again rather than missed
+        write_atomic(args.watermark_file, stats['max_tanggal_entry'] + '\n')
+        print(f"📝 Watermark {stats['max_tanggal_entry']} written to {args.watermark_file}")
+
+if __name__ == '__main__':
+    main()
@@ -4,12 +4,34 @@ Bulk Import Script for Perangkat Data
 Handles 793+ records with automatic transformations and storage handling
 """
 
+from __future__ import annotations
+
+import argparse
+import atexit
+import bisect
+import contextlib
 import csv
+import glob
+import hashlib
+import io
+import json
 import os
+import random
+import re
+import shutil
 import sys
-from datetime import datetime
-from typing import List, Dict, Optional
-from supabase import create_client, Client
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
+from itertools import islice
+from operator import itemgetter
+from typing import TYPE_CHECKING, Callable, List, Dict, Optional, Iterable, Iterator, NamedTuple, Tuple, Union
+
+if TYPE_CHECKING:
+    from supabase import Client  # Imported in init_supabase(): --lint never loads the client
 
 # Fix Windows console encoding for emojis
 if sys.platform == 'win32':
@@ -28,7 +50,206 @@ except ImportError:
 SUPABASE_URL = os.environ.get("SUPABASE_URL") or os.environ.get("VITE_SUPABASE_URL", "")
 # Prefer service role key (bypasses RLS) for bulk imports, fallback to anon key
 SUPABASE_KEY = os.environ.get("SUPABASE_SERVICE_ROLE_KEY") or os.environ.get("SUPABASE_KEY") or os.environ.get("VITE_SUPABASE_ANON_KEY", "")
-BATCH_SIZE = 100  # Insert in batches for better performance
+# Direct Postgres connection for --engine copy (Supabase: Settings > Database > Connection string)
+DATABASE_URL = os.environ.get("DATABASE_URL") or os.environ.get("SUPABASE_DB_URL", "")
+BATCH_SIZE = 100  # Initial batch size, adapted to observed latency while importing
+MIN_BATCH_SIZE = 10
+MAX_BATCH_SIZE = 1000
+TARGET_BATCH_SECONDS = 2.0  # Grow batches while faster than this, shrink when slower
+MAX_PAYLOAD_BYTES = 1_000_000  # Keep request bodies well below the gateway limit
+DEFAULT_WORKERS = 4  # Batches in flight at the same time
+SEND_QUEUE_DEPTH = 2  # Parsed batches buffered ahead of the network senders
+LOOKUP_CHUNK_SIZE = 50  # Max values per .in_() filter (keeps URLs short)
+FETCH_PAGE_SIZE = 1000  # PostgREST default max-rows per response
+REFERENCE_CACHE_FILE = '.import_reference_cache.json'
+REFERENCE_CACHE_TTL = 6 * 3600  # Seconds before cached master data is pulled again
+MAX_RETRIES = 5  # Retries for rate limits (429), 5xx and network errors
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 30.0
+# SQLSTATEs worth retrying: serialization/deadlock, too many connections, statement timeout
+TRANSIENT_SQLSTATES = {'40001', '40P01', '53300', '57014'}
+RETRY_HTTP_STATUSES = {429, 502, 503, 504}  # Rate limit and gateway errors, whatever the body says
+
+LOG_LEVELS = {'debug': 10, 'info': 20, 'warning': 30, 'error': 40}
+LOG_LEVEL = 'info'  # Set from --log-level / --quiet; per-row and per-batch lines are 'debug'
+PROGRESS_INTERVAL = 5.0  # Seconds between progress lines at 'info'
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # Request latency histogram (s)
+
+def log(level: str, message: str):
+    """print() message if level is at or above LOG_LEVEL"""
+    if LOG_LEVELS[level] >= LOG_LEVELS[LOG_LEVEL]:
+        print(message)
+
+class ImportMetrics:
+    """Per-stage timings, row counts and HTTP request statistics for one import run
+    
+    Stages are entered per thread with `with METRICS.stage('parse'):`; HTTP requests made
+    by the Supabase client (see instrument()) are attributed to the current thread's stage.
+    Stage seconds are summed over threads, so parallel stages can exceed wall time.
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.stages = {}
+        self.started_at = time.time()
+    
+    def _stage(self, name: str) -> Dict:
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages.setdefault(name, {
+                'seconds': 0.0, 'first_start': None, 'last_end': None, 'rows': 0, 'requests': 0,
+                'request_errors': 0, 'retries': 0, 'bytes_sent': 0, 'latency_sum': 0.0,
+                'latency_buckets': [0] * (len(LATENCY_BUCKETS) + 1),
+            })
+        return stage
+    
+    @property
+    def current(self) -> str:
+        return getattr(self.local, 'stage', None) or 'other'
+    
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        previous = getattr(self.local, 'stage', None)
+        self.local.stage = name
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.local.stage = previous
+            self.add_time(name, end - start, start, end)
+    
+    def add_time(self, name: str, seconds: float, start: Optional[float] = None, end: Optional[float] = None):
+        with self.lock:
+            stage = self._stage(name)
+            stage['seconds'] += seconds
+            if start is not None:
+                stage['first_start'] = min(stage['first_start'] or start, start)
+                stage['last_end'] = max(stage['last_end'] or end, end)
+    
+    def add_rows(self, name: str, rows: int, bytes_sent: int = 0):
+        with self.lock:
+            stage = self._stage(name)
+            stage['rows'] += rows
+            stage['bytes_sent'] += bytes_sent
+    
+    def count_retry(self, stage: Optional[str] = None):
+        with self.lock:
+            self._stage(stage or self.current)['retries'] += 1
+    
+    def observe_request(self, seconds: float, bytes_sent: int, ok: bool, stage: Optional[str] = None):
+        with self.lock:
+            stage = self._stage(stage or self.current)
+            stage['requests'] += 1
+            stage['request_errors'] += 0 if ok else 1
+            stage['bytes_sent'] += bytes_sent
+            stage['latency_sum'] += seconds
+            stage['latency_buckets'][bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+    
+    def instrument(self, supabase: Client):
+        """Record every PostgREST request of this client through httpx event hooks"""
+        session = getattr(getattr(supabase, 'postgrest', None), 'session', None)
+        if session is None or not hasattr(session, 'event_hooks'):
+            return
+        started = {}
+        
+        def on_request(request):
+            started[id(request)] = time.perf_counter()
+        
+        def on_response(response):
+            request = response.request
+            start = started.pop(id(request), None)
+            if start is not None:
+                self.observe_request(time.perf_counter() - start, len(request.content or b''),
+                                     response.status_code < 400)
+        
+        session.event_hooks['request'].append(on_request)
+        session.event_hooks['response'].append(on_response)
+    
+    def report(self) -> Dict:
+        """Snapshot of all stages, ready for json.dump()"""
+        with self.lock:
+            stages = {}
+            for name, s in self.stages.items():
+                wall = (s['last_end'] - s['first_start']) if s['first_start'] is not None else s['seconds']
+                stages[name] = {
+                    'seconds': round(s['seconds'], 4),
+                    'wall_seconds': round(wall, 4),
+                    'rows': s['rows'],
+                    'rows_per_second': round(s['rows'] / wall, 1) if wall > 0 else None,
+                    'requests': s['requests'],
+                    'request_errors': s['request_errors'],
+                    'retries': s['retries'],
+                    'bytes_sent': s['bytes_sent'],
+                    'latency_mean_seconds': round(s['latency_sum'] / s['requests'], 4) if s['requests'] else None,
+                    'latency_buckets': dict(zip([str(b) for b in LATENCY_BUCKETS] + ['+Inf'], s['latency_buckets'])),
+                }
+            return {'started_at': datetime.fromtimestamp(self.started_at).isoformat(),
+                    'duration_seconds': round(time.time() - self.started_at, 3), 'stages': stages}
+    
+    def print_summary(self):
+        log('info', "\n⏱️  Time per stage:")
+        for name, s in self.report()['stages'].items():
+            requests = f", {s['requests']} requests" if s['requests'] else ''
+            rate = f", {s['rows_per_second']:.0f} rows/s" if s['rows_per_second'] else ''
+            log('info', f"   {name:<17} {s['wall_seconds']:>8.2f}s  {s['rows']} rows{rate}{requests}")
+    
+    def write_json(self, path: str, totals: Dict):
+        report = self.report()
+        report['totals'] = totals
+        write_atomic(path, json.dumps(report, indent=2))
+    
+    def write_prometheus(self, path: str, totals: Dict):
+        """Write a node_exporter textfile collector file (replaced atomically)"""
+        report = self.report()
+        lines = []
+        
+        def metric(name: str, kind: str, help_text: str, samples: List[Tuple[str, float]]):
+            lines.append(f"# HELP perangkat_import_{name} {help_text}")
+            lines.append(f"# TYPE perangkat_import_{name} {kind}")
+            lines.extend(f"perangkat_import_{name}{labels} {value}" for labels, value in samples)
+        
+        stages = report['stages']
+        for key, help_text in (('seconds', 'Time spent in the stage, summed over workers'),
+                               ('wall_seconds', 'Wall time from first entry to last exit of the stage'),
+                               ('rows', 'Rows processed by the stage'),
+                               ('requests', 'HTTP requests sent by the stage'),
+                               ('request_errors', 'HTTP requests answered with an error status'),
+                               ('retries', 'Requests retried after a transient error'),
+                               ('bytes_sent', 'Request body bytes sent by the stage')):
+            metric(f"stage_{key}", 'gauge', help_text,
+                   [(f'{{stage="{name}"}}', s[key]) for name, s in stages.items()])
+        
+        lines.append("# HELP perangkat_import_request_duration_seconds PostgREST request latency")
+        lines.append("# TYPE perangkat_import_request_duration_seconds histogram")
+        with self.lock:
+            for name, s in self.stages.items():
+                if not s['requests']:
+                    continue
+                cumulative = 0
+                for bound, count in zip([str(b) for b in LATENCY_BUCKETS] + ['+Inf'], s['latency_buckets']):
+                    cumulative += count
+                    lines.append(f'perangkat_import_request_duration_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'perangkat_import_request_duration_seconds_sum{{stage="{name}"}} {s["latency_sum"]:.6f}')
+                lines.append(f'perangkat_import_request_duration_seconds_count{{stage="{name}"}} {s["requests"]}')
+        
+        metric('rows', 'gauge', 'Rows by outcome in the last run',
+               [(f'{{outcome="{k}"}}', totals.get(k, 0)) for k in ('parsed', 'inserted', 'failed', 'rejected')])
+        metric('duration_seconds', 'gauge', 'Duration of the last run', [('', report['duration_seconds'])])
+        metric('last_run_timestamp_seconds', 'gauge', 'When the last run finished', [('', round(time.time()))])
+        metric('last_run_success', 'gauge', '1 if the last run imported without failed rows',
+               [('', 0 if totals.get('failed') else 1)])
+        write_atomic(path, '\n'.join(lines) + '\n')
+
+def write_atomic(path: str, content: str):
+    """Write content to path via a temporary file, so readers never see a partial file"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+METRICS = ImportMetrics()
 
 def init_supabase() -> Client:
     """Initialize Supabase client"""
@@ -64,6 +285,13 @@ def init_supabase() -> Client:
         print("   URL should start with https://")
         sys.exit(1)
     
+    try:
+        from supabase import create_client
+    except ImportError:
+        print("❌ ERROR: supabase package not installed")
+        print("   Install with: pip install supabase")
+        sys.exit(1)
+    
     try:
         return create_client(SUPABASE_URL, SUPABASE_KEY)
     except Exception as e:
@@ -72,40 +300,133 @@ def init_supabase() -> Client:
         print(f"   Key: {SUPABASE_KEY[:20]}...")
         sys.exit(1)
 
-def convert_date(date_str: str) -> Optional[str]:
-    """Parse date from various formats (DD/MM/YYYY HH:MM, MM/DD/YYYY HH:MM, etc.) to ISO format"""
-    if not date_str or date_str.strip() == '-' or not date_str.strip():
-        return None
+# Date layouts seen in exports: D/M/Y or M/D/Y (decided per file) and ISO, optionally with a time
+# Optional time down to microseconds (export_perangkat_csv.py writes the full timestamp)
+SLASH_DATE = re.compile(r'(\d{1,2})/(\d{1,2})/(\d{4})(?:[ T](\d{1,2}):(\d{2})(?::(\d{2})(?:\.(\d{1,6}))?)?)?')
+ISO_DATE = re.compile(r'(\d{4})-(\d{1,2})-(\d{1,2})(?:[ T](\d{1,2}):(\d{2})(?::(\d{2})(?:\.(\d{1,6}))?)?)?')
+DATE_SAMPLE_ROWS = 1000  # Rows read to infer whether a file writes DD/MM or MM/DD
+DATE_CACHE_SIZE = 100_000  # Distinct values memoized per file
+
+class DateParser:
+    """Parse a file's dates to ISO format with one day/month order for the whole file
     
-    date_str = date_str.strip()
+    The order is inferred from a sample of the column (a first field above 12 can only be
+    a day, a second field above 12 only a day in MM/DD); undecided files keep DD/MM.
+    Parsed values are memoized, since exports repeat the same tanggal_entry a lot.
+    Problems are counted instead of printed per row; see summary().
+    """
     
-    # Try multiple date formats
-    formats = [
-        '%d/%m/%Y %H:%M',      # DD/MM/YYYY HH:MM
-        '%m/%d/%Y %H:%M',      # MM/DD/YYYY HH:MM
-        '%d/%m/%Y',            # DD/MM/YYYY
-        '%m/%d/%Y',            # MM/DD/YYYY
-        '%Y-%m-%d %H:%M:%S',   # ISO with time
-        '%Y-%m-%d',            # ISO date only
-    ]
+    def __init__(self, day_first: bool = True, inferred_from: int = 0, ambiguous: bool = False):
+        self.day_first = day_first
+        self.inferred_from = inferred_from  # Values the order was inferred from (0: default)
+        self.ambiguous = ambiguous  # Sample contained both DD/MM and MM/DD evidence
+        self.cache = {}
+        self.parsed = 0
+        self.swapped = []  # Values only valid in the other day/month order
+        self.unparseable = []
+        self._dateutil = None
+    
+    @classmethod
+    def infer(cls, values: Iterable[str]) -> 'DateParser':
+        """Pick the day/month order that fits the sample values"""
+        day_first_votes = month_first_votes = seen = 0
+        for value in values:
+            match = SLASH_DATE.fullmatch(value.strip()) if value else None
+            if not match:
+                continue
+            seen += 1
+            first, second = int(match.group(1)), int(match.group(2))
+            if first > 12 >= second:
+                day_first_votes += 1
+            elif second > 12 >= first:
+                month_first_votes += 1
+        ambiguous = bool(day_first_votes and month_first_votes)
+        return cls(day_first=day_first_votes >= month_first_votes, inferred_from=seen, ambiguous=ambiguous)
     
-    for fmt in formats:
+    @property
+    def format_name(self) -> str:
+        return 'DD/MM/YYYY' if self.day_first else 'MM/DD/YYYY'
+    
+    def parse(self, date_str: str) -> Optional[str]:
+        if not date_str:
+            return None
         try:
-            dt = datetime.strptime(date_str, fmt)
-            return dt.isoformat()
-        except ValueError:
-            continue
+            return self.cache[date_str]
+        except KeyError:
+            pass
+        
+        value = date_str.strip()
+        result = self._parse(value) if value and value != '-' else None
+        if len(self.cache) < DATE_CACHE_SIZE:
+            self.cache[date_str] = result
+        return result
     
-    # If all formats fail, try to parse with dateutil (more flexible)
-    try:
-        from dateutil import parser
-        dt = parser.parse(date_str)
-        return dt.isoformat()
-    except (ImportError, ValueError):
-        pass
+    __call__ = parse
+    
+    def _parse(self, value: str) -> Optional[str]:
+        self.parsed += 1
+        match = SLASH_DATE.fullmatch(value)
+        if match:
+            first, second, year, *time_of_day = match.groups()
+            day, month = (first, second) if self.day_first else (second, first)
+            result = self._build(year, month, day, *time_of_day)
+            if result is None:
+                result = self._build(year, day, month, *time_of_day)
+                if result is not None and len(self.swapped) < 100:
+                    self.swapped.append(value)
+            if result is not None:
+                return result
+        else:
+            match = ISO_DATE.fullmatch(value)
+            if match:
+                result = self._build(*match.groups())
+                if result is not None:
+                    return result
+        
+        # Anything else goes to dateutil (more flexible), if installed
+        if self._dateutil is None:
+            try:
+                from dateutil import parser
+                self._dateutil = parser
+            except ImportError:
+                self._dateutil = False
+        if self._dateutil:
+            try:
+                # dayfirst only for slashed dates: dateutil also applies it to ISO strings
+                return self._dateutil.parse(value, dayfirst=self.day_first and '/' in value).isoformat()
+            except (ValueError, OverflowError):
+                pass
+        
+        self.unparseable.append(value)
+        return None
+    
+    @staticmethod
+    def _build(year, month, day, hour, minute, second, fraction=None) -> Optional[str]:
+        try:
+            return datetime(int(year), int(month), int(day), int(hour or 0), int(minute or 0), int(second or 0),
+                            int(fraction.ljust(6, '0')) if fraction else 0).isoformat()
+        except ValueError:
+            return None
     
-    print(f"⚠️  Warning: Could not parse date '{date_str}' - using None")
-    return None
+    def summary(self) -> List[str]:
+        """Aggregate report of how dates were read, for the import summary"""
+        source = f"inferred from {self.inferred_from} values" if self.inferred_from else "default"
+        lines = [f"📅 Dates read as {self.format_name} ({source}), {self.parsed} distinct values"]
+        if self.ambiguous:
+            lines.append(f"⚠️  The sample mixes DD/MM and MM/DD dates; using {self.format_name}")
+        if self.swapped:
+            lines.append(f"⚠️  {len(self.swapped)} distinct dates only valid with day and month swapped "
+                         f"(e.g. {', '.join(self.swapped[:3])})")
+        if self.unparseable:
+            lines.append(f"⚠️  Could not parse {len(self.unparseable)} distinct dates - using None "
+                         f"(e.g. {', '.join(self.unparseable[:3])})")
+        return lines
+
+_default_date_parser = DateParser()
+
+def convert_date(date_str: str) -> Optional[str]:
+    """Parse date from various formats (DD/MM/YYYY HH:MM, MM/DD/YYYY HH:MM, etc.) to ISO format"""
+    return _default_date_parser.parse(date_str)
 
 def clean_value(value: str) -> Optional[str]:
     """Clean value: trim spaces, convert '-' to None"""
@@ -116,302 +437,1880 @@ def clean_value(value: str) -> Optional[str]:
         return None
     return value
 
-def validate_uuids(supabase: Client, csv_file: str) -> Dict[str, bool]:
+def detect_delimiter(first_line: str) -> str:
+    """Detect CSV delimiter from the header line (semicolon, tab or comma)"""
+    tab_count = first_line.count('\t')
+    comma_count = first_line.count(',')
+    semicolon_count = first_line.count(';')
+    
+    if semicolon_count > 0 and semicolon_count >= max(tab_count, comma_count):
+        return ';'
+    elif tab_count > comma_count:
+        return '\t'
+    return ','
+
+DELIMITER_NAMES = {';': 'SEMICOLON', '\t': 'TAB', ',': 'COMMA'}
+
+def open_csv_reader(f, verbose: bool = False) -> csv.DictReader:
+    """Sniff the delimiter from the header of an open file and return a DictReader on the same handle"""
+    first_line = f.readline()
+    delimiter = detect_delimiter(first_line)
+    if verbose:
+        print(f"📄 Detected delimiter: {DELIMITER_NAMES[delimiter]} ({first_line.count(delimiter)} found)")
+    f.seek(0)
+    return csv.DictReader(f, delimiter=delimiter)
+
+class OffsetLines:
+    """Decode the lines of a binary file while tracking how many bytes have been consumed"""
+    
+    def __init__(self, f, offset: int):
+        self.f = f
+        self.offset = offset
+    
+    def __iter__(self) -> Iterator[str]:
+        for line in self.f:
+            self.offset += len(line)
+            yield line.decode('utf-8')
+
+def open_csv_stream(f, start_offset: Optional[int] = None,
+                    verbose: bool = False) -> Tuple[csv.DictReader, OffsetLines, bytes]:
+    """Open a binary CSV handle for streaming with byte offsets
+    
+    Sniffs the delimiter from the header, then positions the reader at start_offset
+    (default: just after the header). Returns the reader, its line source (whose
+    offset is the end of the last row read) and the raw header line.
+    """
+    f.seek(0)
+    header = f.readline()
+    header_line = header.decode('utf-8')
+    delimiter = detect_delimiter(header_line)
+    if verbose:
+        print(f"📄 Detected delimiter: {DELIMITER_NAMES[delimiter]} ({header_line.count(delimiter)} found)")
+    fieldnames = next(csv.reader([header_line], delimiter=delimiter))
+    
+    start = f.tell() if start_offset is None else start_offset
+    f.seek(start)
+    lines = OffsetLines(f, start)
+    return csv.DictReader(lines, fieldnames=fieldnames, delimiter=delimiter), lines, header
+
+# Foreign keys of a perangkat record: record field -> (table, column)
+REFERENCE_CHECKS = {
+    'petugas_id': ('profiles', 'id'),
+    'jenis_barang_id': ('ms_jenis_barang', 'id'),
+    'jenis_perangkat_kode': ('ms_jenis_perangkat', 'kode'),
+    'lokasi_kode': ('ms_lokasi', 'kode'),
+}
+
+def select_in_chunks(supabase: Client, table: str, column: str, values: Iterable[str],
+                     select: Optional[str] = None) -> List[Dict]:
+    """Run a .in_() lookup in LOOKUP_CHUNK_SIZE chunks so the URL never grows unbounded"""
+    values = list(values)
+    rows = []
+    for i in range(0, len(values), LOOKUP_CHUNK_SIZE):
+        chunk = values[i:i+LOOKUP_CHUNK_SIZE]
+        result = supabase.table(table).select(select or column).in_(column, chunk).execute()
+        rows.extend(result.data)
+    return rows
+
+class ReferenceCache:
+    """Master data keys cached on disk, so repeated imports validate without round trips
+    
+    Each referenced table is pulled whole (paginated) the first time it is needed and
+    reused until the cache is older than ttl seconds. Values missing from the cache are
+    looked up once in chunks (refresh-on-miss) and remembered for the rest of the run.
+    With an AsyncPostgrest client, tables and lookup chunks are fetched concurrently.
+    """
+    
+    def __init__(self, supabase: Client, path: str = REFERENCE_CACHE_FILE, ttl: float = REFERENCE_CACHE_TTL,
+                 refresh: bool = False, client: Optional[AsyncPostgrest] = None):
+        self.supabase = supabase
+        self.client = client
+        self.path = path
+        self.ttl = ttl
+        self.tables = {}  # table -> {'fetched_at': epoch seconds, 'keys': set}
+        self.known_missing = {}  # table -> values confirmed absent during this run
+        if not refresh:
+            self._load()
+    
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get('url') != SUPABASE_URL:
+            return  # Cache belongs to another project
+        now = time.time()
+        for table, entry in data.get('tables', {}).items():
+            if now - entry['fetched_at'] < self.ttl:
+                self.tables[table] = {'fetched_at': entry['fetched_at'], 'keys': set(entry['keys'])}
+    
+    def _save(self):
+        data = {
+            'url': SUPABASE_URL,
+            'tables': {table: {'fetched_at': entry['fetched_at'], 'keys': sorted(entry['keys'])}
+                       for table, entry in self.tables.items()},
+        }
+        try:
+            write_atomic(self.path, json.dumps(data))
+        except OSError as e:
+            print(f"   ⚠️  Could not write reference cache {self.path}: {e}")
+    
+    def _fetch_table(self, table: str, column: str) -> set:
+        if self.client:
+            return self.client.run(self.client.select_column(table, column, 'validate'))
+        keys = set()
+        start = 0
+        while True:
+            result = self.supabase.table(table).select(column).range(start, start + FETCH_PAGE_SIZE - 1).execute()
+            keys.update(str(r[column]) for r in result.data)
+            if len(result.data) < FETCH_PAGE_SIZE:
+                return keys
+            start += FETCH_PAGE_SIZE
+    
+    def keys(self, table: str, column: str) -> set:
+        """All known keys of table, pulling the table if it is not cached"""
+        if table not in self.tables:
+            self.tables[table] = {'fetched_at': time.time(), 'keys': self._fetch_table(table, column)}
+            self._save()
+        return self.tables[table]['keys']
+    
+    def prefetch(self, tables: Iterable[Tuple[str, str]]):
+        """Pull every uncached (table, column) at once on the async client; a no-op without one"""
+        pending = [(table, column) for table, column in tables if table not in self.tables]
+        if not self.client or not pending:
+            return
+        
+        async def fetch_all():
+            import asyncio
+            
+            return await asyncio.gather(*(self.client.select_column(table, column, 'validate')
+                                          for table, column in pending), return_exceptions=True)
+        
+        fetched_at = time.time()
+        for (table, _), keys in zip(pending, self.client.run(fetch_all())):
+            if not isinstance(keys, Exception):  # Failed tables are fetched (and reported) by keys()
+                self.tables[table] = {'fetched_at': fetched_at, 'keys': keys}
+        self._save()
+    
+    def missing(self, table: str, column: str, values: Iterable[str]) -> set:
+        """Return the values that do not exist in table, checked in memory against the cache"""
+        values = set(values)
+        known = self.keys(table, column)
+        known_missing = self.known_missing.setdefault(table, set())
+        unknown = values - known - known_missing
+        if unknown:
+            # Refresh on miss: rows added since the cache was filled
+            if self.client:
+                rows = self.client.run(self.client.select_in(table, column, unknown, stage='validate'))
+            else:
+                rows = select_in_chunks(self.supabase, table, column, unknown)
+            found = {str(r[column]) for r in rows}
+            if found:
+                known.update(found)
+                self._save()
+            known_missing.update(unknown - found)
+        return values - known
+
+def validate_uuids(supabase: Client, csv_file: str, reference: Optional[ReferenceCache] = None) -> Dict[str, bool]:
     """Pre-validate that all UUIDs exist in database"""
     print("🔍 Validating UUIDs...")
     
-    petugas_ids = set()
-    jenis_barang_ids = set()
-    jenis_perangkat_codes = set()
-    lokasi_codes = set()
-    
-    # Detect delimiter first
-    with open(csv_file, 'r', encoding='utf-8') as f:
-        first_line = f.readline()
-        tab_count = first_line.count('\t')
-        comma_count = first_line.count(',')
-        semicolon_count = first_line.count(';')
-        
-        if semicolon_count > 0 and semicolon_count >= max(tab_count, comma_count):
-            delimiter = ';'
-        elif tab_count > comma_count:
-            delimiter = '\t'
-        else:
-            delimiter = ','
-        f.seek(0)
+    reference = reference or ReferenceCache(supabase)
+    csv_columns = {
+        'petugas_id': 'petugas_id',
+        'jenis_barang_id': 'jenis_barang',  # Column name is jenis_barang but maps to jenis_barang_id
+        'jenis_perangkat_kode': 'jenis_perangkat_kode',
+        'lokasi_kode': 'lokasi_kode',
+    }
+    labels = {
+        'petugas_id': 'petugas_id UUIDs',
+        'jenis_barang_id': 'jenis_barang UUIDs',
+        'jenis_perangkat_kode': 'jenis_perangkat_kode values',
+        'lokasi_kode': 'lokasi_kode values',
+    }
+    values = {field: set() for field in REFERENCE_CHECKS}
     
+    rows = 0
     with open(csv_file, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f, delimiter=delimiter)
+        reader = open_csv_reader(f)
         for row in reader:
-            if row.get('petugas_id'):
-                # Clean UUID: strip whitespace
-                petugas_ids.add(row['petugas_id'].strip())
-            if row.get('jenis_barang'):
-                jenis_barang_ids.add(row['jenis_barang'].strip())
-            if row.get('jenis_perangkat_kode'):
-                jenis_perangkat_codes.add(row['jenis_perangkat_kode'].strip())
-            if row.get('lokasi_kode'):
-                lokasi_codes.add(row['lokasi_kode'].strip())
-    
-    # Check petugas_ids
-    if petugas_ids:
-        # Convert to list and ensure proper UUID format
-        petugas_list = list(petugas_ids)
-        print(f"🔍 Checking {len(petugas_list)} petugas_id UUIDs...")
-        print(f"   Sample UUIDs from CSV: {list(petugas_list)[:2]}")
-        
-        # Test if we can query profiles at all
-        try:
-            test_result = supabase.table('profiles').select('id').limit(1).execute()
-            print(f"   ✅ Can query profiles table (test query returned {len(test_result.data)} row)")
-        except Exception as e:
-            print(f"   ⚠️ WARNING: Cannot query profiles table - RLS might be blocking: {e}")
-            print(f"   💡 Tip: If UUIDs exist but query fails, use --skip-validation flag")
-            return {'valid': False, 'reason': 'Cannot query profiles table - RLS blocking?'}
+            rows += 1
+            for field, column in csv_columns.items():
+                if row.get(column):
+                    # Clean UUID/code: strip whitespace
+                    values[field].add(row[column].strip())
+    METRICS.add_rows('validate', rows)
+    
+    reference.prefetch(REFERENCE_CHECKS[field] for field in REFERENCE_CHECKS if values[field])
+    for field, (table, column) in REFERENCE_CHECKS.items():
+        if not values[field]:
+            continue
+        print(f"🔍 Checking {len(values[field])} {labels[field]}...")
         
-        # Try querying all at once first
         try:
-            result = supabase.table('profiles').select('id').in_('id', petugas_list).execute()
-            found_petugas = {str(p['id']) for p in result.data}  # Convert to string for comparison
-            print(f"   Query returned {len(result.data)} profiles")
+            missing = reference.missing(table, column, values[field])
         except Exception as e:
-            print(f"   ⚠️ Batch query failed: {e}")
-            print(f"   💡 This might be an RLS policy issue. Try --skip-validation if UUIDs are correct.")
-            # Fallback: query one by one
-            found_petugas = set()
-            for uuid in petugas_list[:3]:  # Test first 3 only
-                try:
-                    result = supabase.table('profiles').select('id').eq('id', uuid).execute()
-                    if result.data:
-                        found_petugas.add(str(uuid))
-                        print(f"   ✅ Found: {uuid[:8]}...")
-                    else:
-                        print(f"   ❌ Not found: {uuid[:8]}...")
-                except Exception as e2:
-                    print(f"   ⚠️ Error checking {uuid[:8]}...: {e2}")
-            
-            if len(found_petugas) == 0:
-                print(f"   ⚠️ WARNING: Could not find any UUIDs. This might be RLS blocking the query.")
-                print(f"   💡 If you're sure the UUIDs exist, use --skip-validation flag")
-                return {'valid': False, 'reason': 'RLS might be blocking profile queries'}
-        
-        # Convert petugas_ids to strings for comparison
-        petugas_ids_str = {str(uuid) for uuid in petugas_ids}
-        missing_petugas = petugas_ids_str - found_petugas
-        
-        if missing_petugas:
-            print(f"❌ ERROR: Missing petugas_id UUIDs ({len(missing_petugas)}): {list(missing_petugas)[:5]}")
-            if len(missing_petugas) > 5:
-                print(f"   ... and {len(missing_petugas) - 5} more")
-            # Show what was found for debugging
-            print(f"✅ Found {len(found_petugas)}/{len(petugas_ids)} petugas_id UUIDs")
-            if found_petugas:
-                print(f"📋 Sample found UUIDs: {list(found_petugas)[:3]}")
-            print(f"💡 If UUIDs exist but query returns 0, this is likely an RLS policy issue.")
-            print(f"   Use --skip-validation to proceed (UUIDs will be validated during insert)")
+            if table == 'profiles':
+                print(f"   ⚠️ WARNING: Cannot query profiles table - RLS might be blocking: {e}")
+                print(f"   💡 Tip: If UUIDs exist but query fails, use --skip-validation flag")
+                return {'valid': False, 'reason': 'Cannot query profiles table - RLS blocking?'}
+            print(f"❌ ERROR: Could not query {table}: {e}")
             return {'valid': False}
-        print(f"✅ Validated {len(found_petugas)} petugas_id UUIDs")
-    
-    # Check jenis_barang_ids
-    if jenis_barang_ids:
-        jenis_barang_list = list(jenis_barang_ids)
-        print(f"🔍 Checking {len(jenis_barang_list)} jenis_barang UUIDs...")
-        
-        found_jenis_barang = set()
-        batch_size = 50
-        for i in range(0, len(jenis_barang_list), batch_size):
-            batch = jenis_barang_list[i:i+batch_size]
-            result = supabase.table('ms_jenis_barang').select('id').in_('id', batch).execute()
-            batch_found = {j['id'] for j in result.data}
-            found_jenis_barang.update(batch_found)
-        
-        missing_jenis_barang = jenis_barang_ids - found_jenis_barang
-        if missing_jenis_barang:
-            print(f"❌ ERROR: Missing jenis_barang UUIDs ({len(missing_jenis_barang)}): {list(missing_jenis_barang)[:5]}")
-            if len(missing_jenis_barang) > 5:
-                print(f"   ... and {len(missing_jenis_barang) - 5} more")
-            return {'valid': False}
-        print(f"✅ Validated {len(found_jenis_barang)} jenis_barang UUIDs")
-    
-    # Check jenis_perangkat_codes
-    if jenis_perangkat_codes:
-        result = supabase.table('ms_jenis_perangkat').select('kode').in_('kode', list(jenis_perangkat_codes)).execute()
-        found_codes = {j['kode'] for j in result.data}
-        missing_codes = jenis_perangkat_codes - found_codes
-        if missing_codes:
-            print(f"❌ ERROR: Missing jenis_perangkat_kode: {missing_codes}")
-            return {'valid': False}
-        print(f"✅ Validated {len(found_codes)} jenis_perangkat_kode values")
-    
-    # Check lokasi_codes
-    if lokasi_codes:
-        result = supabase.table('ms_lokasi').select('kode').in_('kode', list(lokasi_codes)).execute()
-        found_lokasi = {l['kode'] for l in result.data}
-        missing_lokasi = lokasi_codes - found_lokasi
-        if missing_lokasi:
-            print(f"❌ ERROR: Missing lokasi_kode: {missing_lokasi}")
+        
+        if missing:
+            print(f"❌ ERROR: Missing {labels[field]} ({len(missing)}): {list(missing)[:5]}")
+            if len(missing) > 5:
+                print(f"   ... and {len(missing) - 5} more")
+            if table == 'profiles':
+                print(f"✅ Found {len(values[field]) - len(missing)}/{len(values[field])} petugas_id UUIDs")
+                print(f"💡 If UUIDs exist but query returns 0, this is likely an RLS policy issue.")
+                print(f"   Use --skip-validation to proceed (UUIDs will be validated during insert)")
+                if len(missing) == len(values[field]):
+                    return {'valid': False, 'reason': 'RLS might be blocking profile queries'}
             return {'valid': False}
-        print(f"✅ Validated {len(found_lokasi)} lokasi_kode values")
+        print(f"✅ Validated {len(values[field])} {labels[field]}")
     
     print("✅ All UUIDs and codes validated successfully!\n")
     return {'valid': True}
 
-def import_perangkat_from_csv(csv_file: str, supabase: Client, dry_run: bool = False):
-    """Import perangkat data from CSV file"""
+class Conflict(NamedTuple):
+    """A row that would violate a UNIQUE constraint (or the serial_number rule) of perangkat"""
+    row_num: int
+    column: str
+    value: str
+    reason: str
+    code: str = '23505'
     
-    print(f"📂 Reading CSV file: {csv_file}")
+    @property
+    def message(self) -> str:
+        """The error_message of the row in the rejects file"""
+        return f"{self.column} {self.value}: {self.reason}"
+
+def is_serial_placeholder(serial: Optional[str]) -> bool:
+    """Serial numbers excluded from uniqueness (see ADD_SERIAL_NUMBER_UNIQUE_SAFE.sql)"""
+    return not serial or serial == '-'
+
+# SQLSTATE the perangkat trigger raises for an empty or '-' serial_number (check_violation)
+PLACEHOLDER_SERIAL_CODE = '23514'
+
+def placeholder_conflict(row_num: int, serial: Optional[str]) -> Conflict:
+    """The conflict of a row whose serial_number is a placeholder, coded as the trigger would reject it"""
+    return Conflict(row_num, 'serial_number', serial or '(empty)', "placeholder, refused by the perangkat trigger",
+                    PLACEHOLDER_SERIAL_CODE)
+
+# Code of the rows a resumed import finds in perangkat as they are in the file: counted as done, not rejected
+ALREADY_IMPORTED = 'imported'
+
+def preflight_conflicts(supabase: Client, csv_file: str, upsert: bool = False,
+                        resume: bool = False) -> Dict[int, Conflict]:
+    """Find rows that would fail on UNIQUE id_perangkat / serial_number before anything is written
     
-    perangkat_records = []
-    storage_records = []  # Will be processed after perangkat insert
-    errors = []
+    Duplicates within the file are found with a hash index (the first occurrence is kept);
+    the remaining keys are looked up in perangkat in chunks. Placeholder serial numbers
+    are not keys, but the perangkat trigger refuses them, so they are reported too. With upsert, an existing
+    id_perangkat is not a conflict, but a serial_number owned by another device still is.
+    With resume, rows already in perangkat (committed after the journal's last entry) get
+    code ALREADY_IMPORTED instead of a conflict.
+    Returns the first conflict of each conflicting row, keyed by row number.
+    """
+    print("🔍 Pre-flight: checking id_perangkat and serial_number conflicts...")
+    conflicts = {}
+    first_seen = {'id_perangkat': {}, 'serial_number': {}}
+    row_ids = {}  # row_num -> id_perangkat, for rows whose serial is looked up
     
-    # Detect delimiter by reading first line
-    with open(csv_file, 'r', encoding='utf-8') as f:
-        first_line = f.readline()
-        # Count delimiters
-        tab_count = first_line.count('\t')
-        comma_count = first_line.count(',')
-        semicolon_count = first_line.count(';')
-        
-        # Determine delimiter
-        if semicolon_count > 0 and semicolon_count >= max(tab_count, comma_count):
-            delimiter = ';'
-            print(f"📄 Detected delimiter: SEMICOLON ({semicolon_count} found)")
-        elif tab_count > comma_count:
-            delimiter = '\t'
-            print(f"📄 Detected delimiter: TAB ({tab_count} found)")
+    with open(csv_file, 'rb') as f:
+        reader, _, _ = open_csv_stream(f)
+        for row_num, row in enumerate(reader, start=2):
+            id_perangkat = clean_value(row.get('id_perangkat')) or ''  # Missing ids get numbers later
+            serial = (row.get('serial_number') or '').strip()
+            if is_serial_placeholder(serial):
+                conflicts[row_num] = placeholder_conflict(row_num, serial)
+            for column, value in (('id_perangkat', id_perangkat), ('serial_number', serial)):
+                if not value or (column == 'serial_number' and is_serial_placeholder(value)):
+                    continue
+                first = first_seen[column].setdefault(value, row_num)
+                if first != row_num and row_num not in conflicts:
+                    conflicts[row_num] = Conflict(row_num, column, value, f"duplicate of row {first}")
+            row_ids[row_num] = id_perangkat
+    METRICS.add_rows('preflight', len(row_ids))
+    
+    def unconflicted(column: str) -> Dict[str, int]:
+        return {value: row_num for value, row_num in first_seen[column].items() if row_num not in conflicts}
+    
+    try:
+        existing = existing_key_conflicts(supabase, unconflicted('id_perangkat'), unconflicted('serial_number'),
+                                          row_ids, upsert, resume)
+        for row_num, (column, value, reason) in existing.items():
+            conflicts[row_num] = Conflict(row_num, column, value, reason,
+                                          ALREADY_IMPORTED if reason == ALREADY_IMPORTED else '23505')
+    except Exception as e:
+        print(f"   ⚠️ WARNING: Could not look up existing perangkat ({e}); checked the file only")
+    
+    print_conflict_table(conflicts)
+    return conflicts
+
+def existing_key_conflicts(supabase: Client, ids: Dict[str, object], serials: Dict[str, object],
+                           row_ids: Dict[object, str], upsert: bool = False,
+                           resume: bool = False) -> Dict[object, Tuple[str, str, str]]:
+    """Look up id_perangkat / serial_number values in perangkat with chunked .in_() queries
+    
+    ids and serials map each value to the key of the row carrying it; row_ids maps row keys
+    to their id_perangkat (a serial is only a conflict when another device owns it).
+    With resume, a row found with both its id_perangkat and serial_number (or, without
+    id_perangkat, its serial_number) was imported by the interrupted run: its reason is
+    ALREADY_IMPORTED.
+    Returns {row key: (column, value, reason)}.
+    """
+    conflicts = {}
+    if not upsert:
+        for existing in select_in_chunks(supabase, 'perangkat', 'id_perangkat', ids,
+                                         select='id_perangkat, serial_number'):
+            key = ids[existing['id_perangkat']]
+            imported = resume and serials.get(existing['serial_number']) == key
+            conflicts[key] = ('id_perangkat', existing['id_perangkat'],
+                              ALREADY_IMPORTED if imported else "already in database")
+    for existing in select_in_chunks(supabase, 'perangkat', 'serial_number', serials,
+                                     select='id_perangkat, serial_number'):
+        key = serials[existing['serial_number']]
+        if key not in conflicts and existing['id_perangkat'] != row_ids[key]:
+            imported = resume and not row_ids[key]
+            conflicts[key] = ('serial_number', existing['serial_number'],
+                              ALREADY_IMPORTED if imported else f"already in database ({existing['id_perangkat']})")
+    return conflicts
+
+def print_conflict_table(conflicts: Dict[int, Conflict], limit: int = 20):
+    """Print conflicts as a table (first limit rows)"""
+    imported = sum(1 for c in conflicts.values() if c.code == ALREADY_IMPORTED)
+    if imported:
+        print(f"⏩ {imported} rows are already in the database (imported before the interruption)")
+        conflicts = {n: c for n, c in conflicts.items() if c.code != ALREADY_IMPORTED}
+    if not conflicts:
+        print("✅ No id_perangkat / serial_number conflicts\n")
+        return
+    
+    print(f"⚠️  {len(conflicts)} rows conflict and will be written to the rejects file instead of imported:")
+    rows = [(str(c.row_num), c.column, c.value, c.reason) for c in sorted(conflicts.values())[:limit]]
+    headers = ('Row', 'Column', 'Value', 'Conflict')
+    widths = [max(len(h), *(len(r[i]) for r in rows)) for i, h in enumerate(headers)]
+    print("   " + " | ".join(h.ljust(w) for h, w in zip(headers, widths)))
+    print("   " + "-+-".join('-' * w for w in widths))
+    for r in rows:
+        print("   " + " | ".join(v.ljust(w) for v, w in zip(r, widths)))
+    if len(conflicts) > limit:
+        print(f"   ... and {len(conflicts) - limit} more")
+    print()
+
+# Columns of a perangkat record, in build_records() order (REST payloads, staging table and INSERT ... SELECT)
+PERANGKAT_COLUMNS = [
+    'id_perangkat', 'petugas_id', 'jenis_perangkat_kode', 'serial_number', 'lokasi_kode',
+    'nama_perangkat', 'jenis_barang_id', 'merk', 'id_remoteaccess', 'spesifikasi_processor',
+    'kapasitas_ram', 'mac_ethernet', 'mac_wireless', 'ip_ethernet', 'ip_wireless',
+    'serial_number_monitor', 'tanggal_entry', 'status_perangkat'
+]
+STORAGE_COLUMNS = ['perangkat_id', 'jenis_storage', 'kapasitas']
+# CSV columns read by build_records(), in the order it unpacks them
+CSV_COLUMNS = [
+    'id_perangkat', 'petugas_id', 'jenis_perangkat_kode', 'serial_number', 'lokasi_kode',
+    'nama_perangkat', 'jenis_barang', 'merk', 'id_remoteaccess', 'spesifikasi_processor',
+    'kapasitas_ram', 'mac_ethernet', 'mac_wireless', 'ip_ethernet', 'ip_wireless',
+    'serial_number_monitor', 'tanggal_entry', 'Kapasitas SSD', 'Kapasitas HDD'
+]
+# Columns with few distinct values (master data keys, models, capacities): equal cells share one string
+SHARED_CSV_COLUMNS = [
+    'petugas_id', 'jenis_perangkat_kode', 'lokasi_kode', 'jenis_barang', 'merk', 'spesifikasi_processor',
+    'kapasitas_ram', 'Kapasitas SSD', 'Kapasitas HDD'
+]
+SHARED_STRINGS_SIZE = 10_000  # Distinct shared cells kept per file
+
+def encode_json(value) -> bytes:
+    """Compact UTF-8 JSON, as sent in request bodies"""
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+class PerangkatRecord:
+    """A perangkat record with one slot per column, indexable like a dict (record['serial_number'])
+    
+    Slots take a fraction of the memory of an 18-key dict. json() encodes the record once;
+    the bytes are reused by every request that carries it (retries, bisect halves) until a
+    column is changed.
+    """
+    
+    __slots__ = tuple(PERANGKAT_COLUMNS) + ('_json',)
+    
+    def __init__(self, *values):
+        for column, value in zip(PERANGKAT_COLUMNS, values):
+            setattr(self, column, value)
+        self._json = None
+    
+    def __getitem__(self, column: str):
+        return getattr(self, column)
+    
+    def __setitem__(self, column: str, value):
+        setattr(self, column, value)
+        self._json = None
+    
+    def get(self, column: str, default=None):
+        return getattr(self, column, default)
+    
+    def as_dict(self) -> Dict:
+        return {column: getattr(self, column) for column in PERANGKAT_COLUMNS}
+    
+    def json(self) -> bytes:
+        if self._json is None:
+            self._json = encode_json(self.as_dict())
+        return self._json
+
+class StorageEntry(NamedTuple):
+    """A perangkat_storage entry of a CSV row (linked to the perangkat UUID after insert)"""
+    jenis_storage: str
+    kapasitas: str
+
+class CsvLayout:
+    """Where build_records() finds its columns in a file's rows, worked out once from the header
+    
+    Rows are the plain lists of csv.reader, copied by cells(); one itemgetter call picks
+    every column. Columns missing from the header and the cells of short rows read as None,
+    as with csv.DictReader. Cells of SHARED_CSV_COLUMNS are deduplicated per layout (per
+    file, up to SHARED_STRINGS_SIZE values), so thousands of rows hold one copy of each
+    petugas_id or lokasi_kode instead of one each.
+    """
+    
+    def __init__(self, fieldnames: List[str]):
+        position = {name: i for i, name in enumerate(fieldnames)}
+        self.missing_required = [c for c in REQUIRED_COLUMNS if c not in position]
+        # Missing columns point one past the header, a cell every row gets padded with
+        self.width = len(fieldnames) + (1 if any(c not in position for c in CSV_COLUMNS) else 0)
+        self.pick = itemgetter(*(position.get(c, len(fieldnames)) for c in CSV_COLUMNS))
+        self.shared = [position[c] for c in SHARED_CSV_COLUMNS if c in position]
+        self.strings = {}
+    
+    def cells(self, row: List[str]) -> List[Optional[str]]:
+        """A copy of row padded to the layout's width, with shared cells; row is left as read"""
+        cells = row + [None] * (self.width - len(row))
+        strings = self.strings
+        if len(strings) < SHARED_STRINGS_SIZE:
+            for i in self.shared:
+                cells[i] = strings.setdefault(cells[i], cells[i])
         else:
-            delimiter = ','
-            print(f"📄 Detected delimiter: COMMA ({comma_count} found)")
-        
-        # Reset file pointer
-        f.seek(0)
+            for i in self.shared:
+                cells[i] = strings.get(cells[i], cells[i])
+        return cells
     
-    with open(csv_file, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f, delimiter=delimiter)
+    def values(self, cells: List[Optional[str]]) -> Tuple:
+        """The CSV_COLUMNS of a row returned by cells()"""
+        return self.pick(cells)
+
+class ParsedRow(NamedTuple):
+    """A transformed CSV row: the perangkat record plus its storage entries"""
+    row_num: int
+    raw: List[str]  # Original CSV cells, written back out if the row is rejected
+    perangkat: PerangkatRecord
+    storage: Tuple[StorageEntry, ...]
+    end_offset: int  # Byte offset just past this row in the CSV file
+    source: Optional[str] = None  # CSV file the row came from, when importing several files
+
+class BatchSpan(NamedTuple):
+    """CSV rows and byte range covered by one batch, journaled once the batch is committed"""
+    first_row: int
+    last_row: int
+    start_offset: int
+    end_offset: int
+
+class RejectsWriter:
+    """Collect rejected rows into a CSV that can be fixed and fed back to the importer
+    
+    Rows keep their original columns (extra columns are ignored on re-import) plus
+    source_row, error_code and error_message. The file is only created on the first reject.
+    """
+    
+    EXTRA_FIELDS = ['source_row', 'error_code', 'error_message']
+    
+    def __init__(self, path: Optional[str], fieldnames: List[str], delimiter: str, append: bool = False):
+        self.path = path
+        self.append = append  # Resumed runs add to the rejects of the interrupted run
+        self.csv_fieldnames = list(fieldnames or [])
+        self.fieldnames = self.csv_fieldnames + self.EXTRA_FIELDS
+        self.delimiter = delimiter
+        self.count = 0
+        self.samples = []  # First 10 messages, for the summary
+        self.lock = threading.Lock()
+        self._file = None
+        self._writer = None
+    
+    def add(self, row_num: int, raw: Union[Dict[str, str], List[str], None], error_code: str, error_message: str):
+        if isinstance(raw, list):
+            raw = dict(zip(self.csv_fieldnames, raw))
+        with self.lock:
+            self.count += 1
+            if len(self.samples) < 10:
+                self.samples.append(f"Row {row_num}: [{error_code}] {error_message}")
+            if not self.path:
+                return
+            if self._writer is None:
+                write_header = not (self.append and os.path.exists(self.path))
+                self._file = open(self.path, 'a' if self.append else 'w', encoding='utf-8', newline='')
+                self._writer = csv.DictWriter(self._file, fieldnames=self.fieldnames,
+                                              delimiter=self.delimiter, extrasaction='ignore')
+                if write_header:
+                    self._writer.writeheader()
+            self._writer.writerow({**(raw or {}), 'source_row': row_num,
+                                   'error_code': error_code, 'error_message': error_message})
+    
+    def add_row(self, row: ParsedRow, error_code: str, error_message: str):
+        self.add(row.row_num, row.raw, error_code, error_message)
+    
+    def drop_rows(self, redo: Callable[[int], bool]):
+        """Before appending: remove the rejects of an earlier run whose rows are read again
         
-        for row_num, row in enumerate(reader, start=2):  # Start at 2 (header is row 1)
+        A resumed run re-reads every row that is not journaled (rejected rows of batches that
+        were in flight included), so without this their rejects would be written twice.
+        """
+        if not (self.path and self.append and os.path.exists(self.path)):
+            return
+        with open(self.path, 'r', encoding='utf-8', newline='') as f:
+            reader = csv.DictReader(f, delimiter=self.delimiter)
+            fieldnames = reader.fieldnames or self.fieldnames
+            kept = [row for row in reader
+                    if not (str(row.get('source_row') or '').isdigit() and redo(int(row['source_row'])))]
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames, delimiter=self.delimiter, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(kept)
+        os.replace(tmp_path, self.path)
+    
+    def close(self):
+        if self._file:
+            self._file.close()
+
+def build_records(row: List[str], layout: CsvLayout,
+                  parse_date: Callable[[str], Optional[str]] = convert_date) -> Tuple[PerangkatRecord, Tuple[StorageEntry, ...]]:
+    """Transform one CSV row (as returned by layout.cells()) into a perangkat record and its storage entries"""
+    if layout.missing_required:
+        raise KeyError(layout.missing_required[0])
+    (id_perangkat, petugas_id, jenis_perangkat_kode, serial_number, lokasi_kode, nama_perangkat,
+     jenis_barang, merk, id_remoteaccess, spesifikasi_processor, kapasitas_ram, mac_ethernet, mac_wireless,
+     ip_ethernet, ip_wireless, serial_number_monitor, tanggal_entry, ssd_capacity, hdd_capacity) = layout.values(row)
+    
+    perangkat = PerangkatRecord(
+        clean_value(id_perangkat) or '',  # Empty: assigned by IdAssignment
+        petugas_id.strip(),
+        jenis_perangkat_kode.strip(),
+        serial_number.strip(),
+        lokasi_kode.strip(),
+        (nama_perangkat or '').strip(),
+        jenis_barang.strip(),  # Column name is jenis_barang but maps to jenis_barang_id
+        clean_value(merk),
+        clean_value(id_remoteaccess),
+        clean_value(spesifikasi_processor),
+        clean_value(kapasitas_ram),
+        clean_value(mac_ethernet),
+        clean_value(mac_wireless),
+        clean_value(ip_ethernet),
+        clean_value(ip_wireless),
+        clean_value(serial_number_monitor),
+        parse_date(tanggal_entry),
+        'layak'  # status_perangkat is required: constraint only allows 'layak' or 'rusak'
+    )
+    
+    # Storage entries (linked to the perangkat UUID after insert); most rows share the empty tuple
+    storage = tuple(StorageEntry(jenis, capacity) for jenis, capacity in
+                    (('SSD', clean_value(ssd_capacity)), ('HDD', clean_value(hdd_capacity))) if capacity)
+    return perangkat, storage
+
+def iter_parsed_rows(reader: csv.DictReader, lines: OffsetLines, rejects: RejectsWriter,
+                     first_row: int = 2, skip: Optional[Callable[[int], bool]] = None,
+                     parse_date: Callable[[str], Optional[str]] = convert_date) -> Iterator[ParsedRow]:
+    """Lazily transform CSV rows; rows that fail to parse are rejected and skipped
+    
+    first_row is the row number of the first row read (2 when starting after the header);
+    rows for which skip(row_num) is true are read but not transformed.
+    parse_date is usually the file's DateParser (see sample_date_parser()).
+    Rows are read as lists from the reader's underlying csv.reader and picked apart with
+    a CsvLayout compiled once from its fieldnames (no dict per row).
+    Reading and transforming is timed as the 'parse' stage (time spent by the consumer
+    between rows is not counted).
+    """
+    layout = CsvLayout(reader.fieldnames)
+    busy, parsed = 0.0, 0
+    start = time.perf_counter()
+    # Blank lines are skipped without a row number, as csv.DictReader does
+    for row_num, row in enumerate(filter(None, reader.reader), start=first_row):
+        if skip and skip(row_num):
+            continue
+        cells = layout.cells(row)
+        try:
+            perangkat, storage = build_records(cells, layout, parse_date)
+        except Exception as e:
+            rejects.add(row_num, row, 'PARSE', f"{type(e).__name__}: {e}")
+            log('debug', f"⚠️  Row {row_num}: {str(e)}")
+            continue
+        busy += time.perf_counter() - start
+        parsed += 1
+        yield ParsedRow(row_num, cells, perangkat, storage, lines.offset)
+        start = time.perf_counter()
+        if busy > 1.0:
+            METRICS.add_time('parse', busy)
+            METRICS.add_rows('parse', parsed)
+            busy, parsed = 0.0, 0
+    METRICS.add_time('parse', busy + time.perf_counter() - start)
+    METRICS.add_rows('parse', parsed)
+
+def sample_date_parser(f) -> DateParser:
+    """Infer a binary CSV handle's date format from the first DATE_SAMPLE_ROWS rows"""
+    reader, _, _ = open_csv_stream(f)
+    return DateParser.infer(row.get('tanggal_entry') or '' for row in islice(reader, DATE_SAMPLE_ROWS))
+
+class IdBlock(NamedTuple):
+    """Global id_perangkat sequence numbers reserved by reserve_id_perangkat_block()"""
+    first_urutan: int
+    last_urutan: int
+    tahun: str  # Year and month of the reservation (server time), as the trigger uses them
+    bulan: str
+
+class IdAssignment:
+    """id_perangkat (and nama_perangkat) for rows without one, numbered from a reserved block
+    
+    Numbers follow file order, fixed by row number, so every batch can be assigned
+    independently. Built like the perangkat trigger would: KODE.YYYY.M.NNNN and
+    LOKASI-NNNN (see ADD_RESERVE_ID_PERANGKAT_BLOCK.sql).
+    """
+    
+    def __init__(self, block: IdBlock, row_nums: List[int]):
+        self.block = block
+        self.urutan = {row_num: block.first_urutan + i for i, row_num in enumerate(row_nums)}
+    
+    def apply(self, row: ParsedRow):
+        urutan = self.urutan.get(row.row_num)
+        if urutan is None or row.perangkat['id_perangkat']:
+            return
+        perangkat = row.perangkat
+        perangkat['id_perangkat'] = f"{perangkat['jenis_perangkat_kode']}.{self.block.tahun}.{self.block.bulan}.{urutan:04d}"
+        if not clean_value(perangkat['nama_perangkat']) and perangkat['lokasi_kode']:
+            perangkat['nama_perangkat'] = f"{perangkat['lokasi_kode']}-{urutan:04d}"
+
+def reserve_id_block(supabase: Client, count: int) -> IdBlock:
+    """Reserve count consecutive sequence numbers with one locked server call"""
+    result = execute_with_retry(lambda: supabase.rpc('reserve_id_perangkat_block', {'p_jumlah': count}).execute())
+    block = result.data[0] if isinstance(result.data, list) else result.data
+    return IdBlock(block['first_urutan'], block['last_urutan'], block['tahun'], block['bulan'])
+
+class IdReservationError(Exception):
+    """No id_perangkat block could be reserved for some rows (they keep an empty id_perangkat)"""
+    
+    def __init__(self, rows: int, cause: Exception):
+        super().__init__(f"Could not reserve id_perangkat numbers for {rows} rows: {error_message_of(cause)}")
+        self.code = error_code_of(cause)
+
+class IdReserver:
+    """Numbers rows without id_perangkat from blocks reserved with reserve_id_perangkat_block()
+    
+    Every import path hands apply() only rows that passed all of its checks, so rejected
+    rows never use up urutan numbers (4 digits, see ADD_RESERVE_ID_PERANGKAT_BLOCK.sql).
+    Each call takes one block with one locked server call: per batch when streaming a
+    file, per file when importing several. A dry run only counts the rows.
+    """
+    
+    def __init__(self, supabase: Client, dry_run: bool = False):
+        self.supabase = supabase
+        self.dry_run = dry_run
+        self.rows = 0
+        self.blocks = 0
+        self.failed = 0
+    
+    def apply(self, rows: List[ParsedRow]):
+        """Number the rows without id_perangkat; raises IdReservationError if no block could be reserved"""
+        missing = [r for r in rows if not r.perangkat['id_perangkat']]
+        if not missing:
+            return
+        if not self.dry_run:
             try:
-                # Prepare perangkat record
-                perangkat = {
-                    'id_perangkat': row['id_perangkat'].strip(),
-                    'petugas_id': row['petugas_id'].strip(),
-                    'jenis_perangkat_kode': row['jenis_perangkat_kode'].strip(),
-                    'serial_number': row['serial_number'].strip(),
-                    'lokasi_kode': row['lokasi_kode'].strip(),
-                    'nama_perangkat': row['nama_perangkat'].strip(),
-                    'jenis_barang_id': row['jenis_barang'].strip(),  # Column name is jenis_barang but maps to jenis_barang_id
-                    'merk': clean_value(row.get('merk', '')),
-                    'id_remoteaccess': clean_value(row.get('id_remoteaccess', '')),
-                    'spesifikasi_processor': clean_value(row.get('spesifikasi_processor', '')),
-                    'kapasitas_ram': clean_value(row.get('kapasitas_ram', '')),
-                    'mac_ethernet': clean_value(row.get('mac_ethernet', '')),
-                    'mac_wireless': clean_value(row.get('mac_wireless', '')),
-                    'ip_ethernet': clean_value(row.get('ip_ethernet', '')),
-                    'ip_wireless': clean_value(row.get('ip_wireless', '')),
-                    'serial_number_monitor': clean_value(row.get('serial_number_monitor', '')),
-                    'tanggal_entry': convert_date(row.get('tanggal_entry', '')),
-                    'status_perangkat': 'layak'  # Required: constraint only allows 'layak' or 'rusak'
-                }
-                
-                perangkat_records.append(perangkat)
-                
-                # Prepare storage records (will link by id_perangkat later)
-                ssd_capacity = clean_value(row.get('Kapasitas SSD', ''))
-                hdd_capacity = clean_value(row.get('Kapasitas HDD', ''))
-                
-                if ssd_capacity:
-                    storage_records.append({
-                        'id_perangkat': perangkat['id_perangkat'],
-                        'jenis_storage': 'SSD',
-                        'kapasitas': ssd_capacity.strip()
-                    })
-                
-                if hdd_capacity:
-                    storage_records.append({
-                        'id_perangkat': perangkat['id_perangkat'],
-                        'jenis_storage': 'HDD',
-                        'kapasitas': hdd_capacity.strip()
-                    })
-                    
+                block = reserve_id_block(self.supabase, len(missing))
             except Exception as e:
-                error_msg = f"Row {row_num}: {str(e)}"
-                errors.append(error_msg)
-                print(f"⚠️  {error_msg}")
-    
-    if errors:
-        print(f"\n❌ Found {len(errors)} errors during parsing:")
-        for error in errors[:10]:  # Show first 10 errors
-            print(f"   {error}")
-        if len(errors) > 10:
-            print(f"   ... and {len(errors) - 10} more errors")
-        return
+                self.failed += len(missing)
+                raise IdReservationError(len(missing), e) from e
+            self.blocks += 1
+            log('debug', f"🔢 Reserved id_perangkat numbers {block.first_urutan:04d}-{block.last_urutan:04d} "
+                         f"for {len(missing)} rows")
+            assignment = IdAssignment(block, [r.row_num for r in missing])
+            for r in missing:
+                assignment.apply(r)
+        self.rows += len(missing)
     
-    print(f"✅ Parsed {len(perangkat_records)} perangkat records")
-    print(f"✅ Prepared {len(storage_records)} storage records\n")
+    def summary(self) -> List[str]:
+        lines = []
+        if self.rows and self.dry_run:
+            lines.append(f"🔢 {self.rows} rows without id_perangkat would get numbers from reserved blocks")
+        elif self.rows:
+            lines.append(f"🔢 Numbered {self.rows} rows without id_perangkat from {self.blocks} reserved blocks")
+        if self.failed:
+            lines.append(f"❌ {self.failed} rows without id_perangkat could not be numbered and were rejected; run "
+                         f"ADD_RESERVE_ID_PERANGKAT_BLOCK.sql in the Supabase SQL editor, or fill in id_perangkat")
+        return lines
+
+def print_id_block(block: IdBlock):
+    print(f"🔢 Reserved id_perangkat numbers {block.first_urutan:04d}-{block.last_urutan:04d} "
+          f"for {block.last_urutan - block.first_urutan + 1} rows without id_perangkat "
+          f"(e.g. KODE.{block.tahun}.{block.bulan}.{block.first_urutan:04d})\n")
+
+def iter_batches(items: Iterable, size: Union[int, Callable[[], int]]) -> Iterator[List]:
+    """Group an iterable into lists of at most size items (size may be a callable, read per batch)"""
+    current_size = size if callable(size) else (lambda: size)
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= current_size():
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def iter_spanned_batches(rows: Iterable[ParsedRow], size: Union[int, Callable[[], int]], start_offset: int,
+                         first_row: int) -> Iterator[Tuple[BatchSpan, List[ParsedRow]]]:
+    """Batch rows and attach the CSV span each batch covers
     
-    if dry_run:
-        print("🔍 DRY RUN MODE - No data will be inserted")
-        print(f"   Would insert {len(perangkat_records)} perangkat records")
-        print(f"   Would insert {len(storage_records)} storage records")
-        return
+    Spans are contiguous: each one starts where the previous ended, so rows skipped
+    while parsing belong to the batch that follows them.
+    """
+    for batch in iter_batches(rows, size):
+        span = BatchSpan(first_row, batch[-1].row_num, start_offset, batch[-1].end_offset)
+        first_row, start_offset = span.last_row + 1, span.end_offset
+        yield span, batch
+
+class ImportJournal:
+    """Append-only log of committed batches, so --resume can skip work already done
+    
+    One JSON line per committed batch records its row range, byte range and a SHA-256
+    of those bytes; the first line fingerprints the CSV header. On resume, spans whose
+    bytes no longer match the file are ignored and imported again.
+    """
+    
+    def __init__(self, path: str, csv_file: str):
+        self.path = path
+        self.csv_file = csv_file
+        self.lock = threading.Lock()
+        self._file = None
+        self._source = None
+        self.header_matches = False  # Set by load(): only then is the journal appended to
     
-    # Step 1: Bulk insert perangkat (in batches)
-    print(f"📤 Inserting {len(perangkat_records)} perangkat records in batches of {BATCH_SIZE}...")
-    inserted_count = 0
-    failed_count = 0
-    failed_records = []
+    def _hash_range(self, start: int, end: int) -> str:
+        self._source.seek(start)
+        return hashlib.sha256(self._source.read(end - start)).hexdigest()
     
-    for i in range(0, len(perangkat_records), BATCH_SIZE):
-        batch = perangkat_records[i:i+BATCH_SIZE]
-        batch_num = i // BATCH_SIZE + 1
-        total_batches = (len(perangkat_records) + BATCH_SIZE - 1) // BATCH_SIZE
+    def load(self, header: bytes) -> List[BatchSpan]:
+        """Return the journaled spans that still match the CSV file (see header_matches)"""
+        self.header_matches = False
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+        if not entries or entries[0].get('header_sha256') != hashlib.sha256(header).hexdigest():
+            print("⚠️  Journal does not match this CSV header - starting from the beginning")
+            return []
+        self.header_matches = True
         
+        spans = []
+        stale = 0
+        with open(self.csv_file, 'rb') as self._source:
+            for entry in entries[1:]:
+                span = BatchSpan(entry['first_row'], entry['last_row'], entry['start_offset'], entry['end_offset'])
+                if self._hash_range(span.start_offset, span.end_offset) == entry['sha256']:
+                    spans.append(span)
+                else:
+                    stale += 1
+        self._source = None
+        if stale:
+            print(f"⚠️  {stale} journaled batches no longer match the CSV and will be imported again")
+        return spans
+    
+    def open(self, header: bytes, resume: bool):
+        """Start journaling; a fresh run, or a resume whose journal load() rejected, truncates
+        the journal of any previous run"""
+        self._source = open(self.csv_file, 'rb')
+        if resume and self.header_matches:
+            self._file = open(self.path, 'a', encoding='utf-8')
+        else:
+            self._file = open(self.path, 'w', encoding='utf-8')
+            self._file.write(json.dumps({'csv_file': os.path.basename(self.csv_file),
+                                         'header_sha256': hashlib.sha256(header).hexdigest()}) + '\n')
+            self._file.flush()
+    
+    def record(self, span: BatchSpan, inserted: int, rejected: int):
+        with self.lock:
+            entry = {
+                'first_row': span.first_row,
+                'last_row': span.last_row,
+                'start_offset': span.start_offset,
+                'end_offset': span.end_offset,
+                'sha256': self._hash_range(span.start_offset, span.end_offset),
+                'inserted': inserted,
+                'rejected': rejected,
+            }
+            self._file.write(json.dumps(entry) + '\n')
+            self._file.flush()
+    
+    def close(self):
+        for f in (self._file, self._source):
+            if f:
+                f.close()
+
+def plan_resume(spans: List[BatchSpan], header_end: int) -> Tuple[int, int, List[BatchSpan]]:
+    """Work out where a resumed import starts
+    
+    Returns (byte offset to seek to, row number found there, committed spans past that point
+    whose rows must still be skipped). Spans may overlap or arrive out of order.
+    """
+    start_offset, next_row = header_end, 2
+    remaining = []
+    for span in sorted(spans, key=lambda s: s.start_offset):
+        if span.start_offset <= start_offset:
+            if span.end_offset > start_offset:
+                start_offset, next_row = span.end_offset, span.last_row + 1
+        else:
+            remaining.append(span)
+    return start_offset, next_row, [s for s in remaining if s.end_offset > start_offset]
+
+class StreamValidator:
+    """Validate foreign keys batch by batch against the reference cache"""
+    
+    def __init__(self, reference: ReferenceCache):
+        self.reference = reference
+        self.enabled = True
+    
+    def filter_batch(self, batch: List[ParsedRow], rejects: RejectsWriter) -> List[ParsedRow]:
+        """Return the rows of batch whose references exist; reject the others"""
+        if not self.enabled:
+            return batch
+        
+        missing = {}
         try:
-            result = supabase.table('perangkat').insert(batch).execute()
-            if result.data:
-                inserted_count += len(batch)
-                print(f"   ✅ Batch {batch_num}/{total_batches}: Inserted {len(batch)} records ({inserted_count}/{len(perangkat_records)})")
+            with METRICS.stage('validate'):
+                for field, (table, column) in REFERENCE_CHECKS.items():
+                    values = {r.perangkat[field] for r in batch if r.perangkat[field]}
+                    missing[field] = self.reference.missing(table, column, values)
+        except Exception as e:
+            log('warning', f"   ⚠️ WARNING: Reference lookup failed - RLS might be blocking: {e}")
+            log('warning', f"   💡 Continuing without validation (UUIDs will be validated during insert)")
+            self.enabled = False
+            return batch
+        
+        valid = []
+        for r in batch:
+            bad = [f"{field}={r.perangkat[field]}" for field in REFERENCE_CHECKS
+                   if r.perangkat[field] in missing[field]]
+            if bad:
+                rejects.add_row(r, 'MISSING_REFERENCE', f"Missing reference {', '.join(bad)}")
+                log('debug', f"⚠️  Row {r.row_num}: Missing reference {', '.join(bad)}")
             else:
-                # No data returned - might be RLS blocking
-                print(f"   ⚠️  Batch {batch_num}/{total_batches}: Insert returned no data (RLS blocking?)")
-                failed_count += len(batch)
-                failed_records.extend(batch)
+                valid.append(r)
+        METRICS.add_rows('validate', len(batch))
+        return valid
+
+def new_import_stats() -> Dict:
+    """Counters for one import run (or one batch, merged with merge_import_stats)"""
+    return {
+        'parsed': 0,
+        'storage_parsed': 0,
+        'batches': 0,
+        'inserted': 0,
+        'failed': 0,
+        'failed_samples': [],
+        'storage_inserted': 0,
+        'storage_failed': 0,
+        'updated': 0,  # --sync only
+        'unchanged': 0,
+        'already_imported': 0,  # --resume: committed after the journal's last entry
+        'storage_removed': 0,
+    }
+
+def import_totals(stats: Dict, rejected: int) -> Dict:
+    """Counters of a finished run, for the JSON report and Prometheus textfile"""
+    totals = {k: v for k, v in stats.items() if k != 'failed_samples'}
+    totals['rejected'] = rejected
+    return totals
+
+def merge_import_stats(total: Dict, part: Dict):
+    """Add the counters of part into total, keeping at most 5 failed samples"""
+    for key, value in part.items():
+        if key == 'failed_samples':
+            total[key].extend(value[:5 - len(total[key])])
+        else:
+            total[key] += value
+
+def is_transient_error(e: Exception) -> bool:
+    """True for errors worth retrying: rate limits, 5xx responses and network failures"""
+    code = str(getattr(e, 'code', '') or '')
+    if code.isdigit() and len(code) == 3:
+        # postgrest reports the HTTP status as code when the body is not JSON
+        return code == '429' or code.startswith('5')
+    if code in TRANSIENT_SQLSTATES:
+        return True
+    if getattr(e, 'status', None) in RETRY_HTTP_STATUSES:
+        return True
+    # httpx network failures (timeouts, dropped connections) all derive from TransportError
+    return any(cls.__name__ == 'TransportError' for cls in type(e).__mro__)
+
+def backoff_delay(attempt: int, retry_after: Optional[str] = None) -> float:
+    """Jittered exponential backoff before retry number attempt + 1; a Retry-After in seconds
+    from the server is honoured (up to BACKOFF_MAX_SECONDS)"""
+    delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt) * random.uniform(0.5, 1.0)
+    if retry_after and retry_after.strip().isdigit():
+        delay = max(delay, min(float(retry_after), BACKOFF_MAX_SECONDS))
+    return delay
+
+def execute_with_retry(request: Callable, on_retry: Optional[Callable[[Exception], None]] = None):
+    """Run request(), retrying transient failures with jittered exponential backoff"""
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            return request()
         except Exception as e:
-            failed_count += len(batch)
-            error_msg = str(e)
-            print(f"   ❌ Batch {batch_num}/{total_batches}: Failed - {error_msg}")
-            # Show first error details
-            if hasattr(e, 'message'):
-                print(f"      Error details: {e.message}")
-            if hasattr(e, 'code'):
-                print(f"      Error code: {e.code}")
-            
-            # Try inserting one by one to identify problematic records
-            print(f"      Attempting individual inserts for batch {batch_num}...")
-            for record in batch:
+            if attempt >= MAX_RETRIES or not is_transient_error(e):
+                raise
+            METRICS.count_retry()
+            if on_retry:
+                on_retry(e)
+            time.sleep(backoff_delay(attempt))
+
+def error_code_of(e: Exception) -> str:
+    """PostgREST error code (SQLSTATE or HTTP status) or the exception type"""
+    return str(getattr(e, 'code', None) or type(e).__name__)
+
+def error_message_of(e: Exception) -> str:
+    return str(getattr(e, 'message', None) or e)
+
+def post_rows(supabase: Client, table: str, body: bytes, columns: List[str], returning: bool = True) -> List[Dict]:
+    """POST an already encoded JSON array of rows, as .insert() would send it
+    
+    Built from the client's public URL and headers and sent through its PostgREST httpx
+    session (connection pool and the event hooks of METRICS.instrument()), but skips
+    its serialization, so a body is encoded once however often it is sent.
+    Raises postgrest's APIError like .execute(). Returns the inserted rows (or [] without returning).
+    """
+    from postgrest.exceptions import APIError, generate_default_error_message
+    
+    headers = dict(supabase.options.headers)  # apikey and Authorization, kept current by the client
+    headers['Content-Type'] = 'application/json'
+    headers['Prefer'] = 'return=representation' if returning else 'return=minimal'
+    params = {'columns': ','.join(columns)}
+    response = supabase.postgrest.session.post(f"{str(supabase.rest_url).rstrip('/')}/{table}", content=body,
+                                               params=params, headers=headers)
+    if response.is_success:
+        return json.loads(response.content) if returning and response.content else []
+    try:
+        raise APIError(response.json())
+    except ValueError:
+        raise APIError(generate_default_error_message(response))
+
+def insert_with_bisect(supabase: Client, table: str, items: List, payload: Callable[[object], bytes],
+                       columns: List[str], on_retry: Optional[Callable[[Exception], None]] = None,
+                       require_data: bool = True) -> Tuple[List[Dict], List[Tuple[object, str, str]]]:
+    """Insert items in one request; if it fails, split the batch in half and retry each half
+    
+    payload(item) is the item's JSON encoding (see PerangkatRecord.json(), which caches it);
+    the request body is built once per attempt at a batch and reused by its retries.
+    Good rows are committed with O(log n) extra requests per bad row instead of one
+    request per row.
+    Returns (rows returned by the server, [(item, error_code, error_message)]).
+    """
+    body = b'[' + b','.join(payload(i) for i in items) + b']'
+    try:
+        data = execute_with_retry(lambda: post_rows(supabase, table, body, columns, require_data),
+                                  on_retry)
+    except Exception as e:
+        if len(items) == 1:
+            return [], [(items[0], error_code_of(e), error_message_of(e))]
+        mid = len(items) // 2
+        left_data, left_rejects = insert_with_bisect(supabase, table, items[:mid], payload, columns,
+                                                     on_retry, require_data)
+        right_data, right_rejects = insert_with_bisect(supabase, table, items[mid:], payload, columns,
+                                                       on_retry, require_data)
+        return left_data + right_data, left_rejects + right_rejects
+    
+    if require_data and not data:
+        # No data returned - RLS blocks every row alike, so splitting would not help
+        return [], [(item, 'NO_DATA', 'Insert returned no data (RLS blocking?)') for item in items]
+    return data, []
+
+def resolve_perangkat_ids(supabase: Client, id_perangkat_values: Iterable[str]) -> Dict[str, str]:
+    """Look up perangkat UUIDs by id_perangkat with chunked .in_() queries"""
+    rows = select_in_chunks(supabase, 'perangkat', 'id_perangkat', id_perangkat_values, 'id, id_perangkat')
+    return {p['id_perangkat']: p['id'] for p in rows}
+
+def insert_storage_records(supabase: Client, storage_records: List[Tuple[str, StorageEntry]],
+                           perangkat_ids: Dict[str, str], stats: Dict,
+                           on_retry: Optional[Callable[[Exception], None]] = None):
+    """Bulk insert (id_perangkat, storage entry) pairs, linking them with perangkat UUIDs from the insert response"""
+    # Rows inserted without a usable response are resolved in one chunked lookup
+    unresolved = {id_perangkat for id_perangkat, _ in storage_records} - perangkat_ids.keys()
+    if unresolved:
+        try:
+            perangkat_ids.update(resolve_perangkat_ids(supabase, unresolved))
+        except Exception as e:
+            log('warning', f"   ⚠️  Warning: Could not look up perangkat UUIDs: {str(e)}")
+    
+    for chunk in iter_batches(link_storage_entries(storage_records, perangkat_ids, stats), MAX_BATCH_SIZE):
+        _, failed = insert_with_bisect(supabase, 'perangkat_storage', chunk, encode_json, STORAGE_COLUMNS,
+                                       on_retry, require_data=False)
+        count_storage_failures(chunk, failed, stats)
+
+def link_storage_entries(storage_records: List[Tuple[str, StorageEntry]], perangkat_ids: Dict[str, str],
+                         stats: Dict) -> List[Dict]:
+    """perangkat_storage rows for the pairs whose perangkat UUID is known; the others count as failed"""
+    storage_entries = []
+    for id_perangkat, storage in storage_records:
+        perangkat_id = perangkat_ids.get(id_perangkat)
+        if perangkat_id:
+            storage_entries.append({
+                'perangkat_id': perangkat_id,
+                'jenis_storage': storage.jenis_storage,
+                'kapasitas': storage.kapasitas
+            })
+        else:
+            log('debug', f"   ⚠️  Warning: Could not find perangkat with id_perangkat: {id_perangkat}")
+            stats['storage_failed'] += 1
+    return storage_entries
+
+def count_storage_failures(chunk: List[Dict], failed: List[Tuple[Dict, str, str]], stats: Dict):
+    stats['storage_inserted'] += len(chunk) - len(failed)
+    stats['storage_failed'] += len(failed)
+    for entry, code, message in failed:
+        log('debug', f"   ❌ Failed to insert {entry['jenis_storage']} storage for perangkat {entry['perangkat_id']}: "
+              f"[{code}] {message}")
+
+def insert_perangkat_batch(supabase: Client, batch: List[ParsedRow], batch_num: int, stats: Dict,
+                           rejects: RejectsWriter, on_retry: Optional[Callable[[Exception], None]] = None) -> bool:
+    """Insert one batch of perangkat records, then the storage entries of the rows that made it
+    
+    Failing batches are bisected down to the offending rows, which go to the rejects file.
+    Returns True when the whole batch went in without rejects.
+    """
+    stats['batches'] += 1
+    
+    with METRICS.stage('perangkat_insert'):
+        returned, failed = insert_with_bisect(supabase, 'perangkat', batch, lambda r: r.perangkat.json(),
+                                              PERANGKAT_COLUMNS, on_retry)
+    # id_perangkat -> perangkat UUID, taken from the insert responses
+    perangkat_ids = {p['id_perangkat']: p['id'] for p in returned}
+    inserted_rows = count_insert_failures(batch, failed, batch_num, stats, rejects)
+    
+    with METRICS.stage('storage_insert'):
+        storage_records = [(r.perangkat['id_perangkat'], s) for r in inserted_rows for s in r.storage]
+        if storage_records:
+            storage_before = stats['storage_inserted']
+            insert_storage_records(supabase, storage_records, perangkat_ids, stats, on_retry)
+            METRICS.add_rows('storage_insert', stats['storage_inserted'] - storage_before)
+    
+    return not failed
+
+def count_insert_failures(batch: List[ParsedRow], failed: List[Tuple[ParsedRow, str, str]], batch_num: int,
+                          stats: Dict, rejects: RejectsWriter) -> List[ParsedRow]:
+    """Count and reject the rows of batch that failed to insert; returns the rows that went in"""
+    if failed:
+        log('debug', f"   ❌ Batch {batch_num}: {len(failed)} of {len(batch)} rows rejected")
+    for row, code, message in failed:
+        stats['failed'] += 1
+        if len(stats['failed_samples']) < 5:
+            stats['failed_samples'].append(row.perangkat.as_dict())
+        rejects.add_row(row, code, message)
+        log('debug', f"      ❌ Row {row.row_num} ({row.perangkat.get('id_perangkat', 'unknown')}): [{code}] {message}")
+    
+    failed_rows = {row.row_num for row, _, _ in failed}
+    inserted_rows = [r for r in batch if r.row_num not in failed_rows]
+    stats['inserted'] += len(inserted_rows)
+    METRICS.add_rows('perangkat_insert', len(inserted_rows))
+    # Storage of rows whose perangkat failed cannot be linked
+    stats['storage_failed'] += sum(len(row.storage) for row, _, _ in failed)
+    return inserted_rows
+
+# Columns compared by --sync: everything the CSV carries. status_perangkat is left out because
+# the CSV has no status column (build_records() always sends 'layak'); it is maintained in the app.
+SYNC_COLUMNS = [
+    'petugas_id', 'jenis_perangkat_kode', 'serial_number', 'lokasi_kode', 'nama_perangkat',
+    'jenis_barang_id', 'merk', 'id_remoteaccess', 'spesifikasi_processor', 'kapasitas_ram',
+    'mac_ethernet', 'mac_wireless', 'ip_ethernet', 'ip_wireless', 'serial_number_monitor', 'tanggal_entry'
+]
+SYNC_SELECT = ', '.join(['id', 'id_perangkat'] + SYNC_COLUMNS + ['perangkat_storage(id, jenis_storage, kapasitas)'])
+
+class SyncChange(NamedTuple):
+    """An existing perangkat whose CSV row differs: the columns to patch and the storage diff"""
+    row: ParsedRow
+    perangkat_id: str  # perangkat UUID
+    changes: Dict  # Column -> new value, only the columns that differ
+    storage_add: List[Dict]
+    storage_remove: List[str]  # perangkat_storage ids
+
+class SyncPlan(NamedTuple):
+    new: List[ParsedRow]
+    changed: List[SyncChange]
+    unchanged: int
+
+def normalize_sync_value(column: str, value) -> Optional[str]:
+    """Bring a CSV or database value into one comparable form ('' and NULL alike, timestamps in UTC)"""
+    if value is None or value == '':
+        return None
+    value = str(value).strip()
+    if column == 'tanggal_entry':
+        # The importer sends naive timestamps, which the database stores as UTC
+        try:
+            dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return value
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return dt.astimezone(timezone.utc).isoformat()
+    if column in ('petugas_id', 'jenis_barang_id'):
+        return value.lower()
+    return value
+
+def sync_fields(record: Dict) -> Dict[str, Optional[str]]:
+    return {c: normalize_sync_value(c, record.get(c)) for c in SYNC_COLUMNS}
+
+def content_hash(fields: Dict[str, Optional[str]], storage: Iterable[Tuple[str, str]]) -> str:
+    """Hash of a perangkat's normalized columns and its storage entries (order-insensitive)"""
+    payload = json.dumps([[fields[c] for c in SYNC_COLUMNS], sorted(storage)], separators=(',', ':'))
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+def plan_sync_batch(supabase: Client, batch: List[ParsedRow],
+                    on_retry: Optional[Callable[[Exception], None]] = None) -> SyncPlan:
+    """Classify a batch as new, changed or unchanged against the database
+    
+    The existing rows and their storage come back in one embedded select per
+    LOOKUP_CHUNK_SIZE keys (see classify_sync_batch()).
+    """
+    keys = [r.perangkat['id_perangkat'] for r in batch]
+    with METRICS.stage('sync_lookup'):
+        existing = execute_with_retry(lambda: select_in_chunks(supabase, 'perangkat', 'id_perangkat', keys,
+                                                               SYNC_SELECT), on_retry)
+        METRICS.add_rows('sync_lookup', len(batch))
+    return classify_sync_batch(batch, existing)
+
+def classify_sync_batch(batch: List[ParsedRow], existing: List[Dict]) -> SyncPlan:
+    """Compare a batch with its existing rows (selected with SYNC_SELECT)
+    
+    Rows are compared by content hash; only for the rows that differ are the changed
+    columns and the storage entries to add/remove worked out.
+    """
+    existing = {p['id_perangkat']: p for p in existing}
+    
+    new, changed, unchanged = [], [], 0
+    for row in batch:
+        current = existing.get(row.perangkat['id_perangkat'])
+        if current is None:
+            new.append(row)
+            continue
+        
+        wanted, have = sync_fields(row.perangkat), sync_fields(current)
+        wanted_storage = [(s.jenis_storage, normalize_sync_value('kapasitas', s.kapasitas)) for s in row.storage]
+        have_storage = current.get('perangkat_storage') or []
+        if content_hash(wanted, wanted_storage) == content_hash(
+                have, [(s['jenis_storage'], normalize_sync_value('kapasitas', s['kapasitas'])) for s in have_storage]):
+            unchanged += 1
+            continue
+        
+        # Storage is diffed as a multiset: matching entries stay, the rest are removed or added
+        remaining = list(wanted_storage)
+        storage_remove = []
+        for entry in have_storage:
+            key = (entry['jenis_storage'], normalize_sync_value('kapasitas', entry['kapasitas']))
+            if key in remaining:
+                remaining.remove(key)
+            else:
+                storage_remove.append(entry['id'])
+        storage_add = [{'perangkat_id': current['id'], 'jenis_storage': jenis, 'kapasitas': kapasitas}
+                       for jenis, kapasitas in remaining]
+        changes = {c: row.perangkat[c] for c in SYNC_COLUMNS if wanted[c] != have[c]}
+        changed.append(SyncChange(row, current['id'], changes, storage_add, storage_remove))
+    return SyncPlan(new, changed, unchanged)
+
+def group_sync_changes(changed: List[SyncChange]) -> Dict[str, List[ParsedRow]]:
+    """Rows with identical column changes, keyed by the JSON of those changes (one PATCH per group)"""
+    groups = {}
+    for change in changed:
+        if change.changes:
+            groups.setdefault(json.dumps(change.changes, sort_keys=True), []).append(change.row)
+    return groups
+
+def update_perangkat_rows(supabase: Client, rows: List[ParsedRow], changes: Dict,
+                          on_retry: Optional[Callable[[Exception], None]] = None) -> List[Tuple[ParsedRow, str, str]]:
+    """PATCH rows that share the same changes in one request, falling back to one request per row
+    
+    Returns [(row, error_code, error_message)] for the rows that could not be updated.
+    """
+    def request():
+        keys = [r.perangkat['id_perangkat'] for r in rows]
+        return supabase.table('perangkat').update(changes).in_('id_perangkat', keys).execute()
+    
+    try:
+        result = execute_with_retry(request, on_retry)
+    except Exception as e:
+        if len(rows) == 1:
+            return [(rows[0], error_code_of(e), error_message_of(e))]
+        failed = []
+        for row in rows:
+            failed.extend(update_perangkat_rows(supabase, [row], changes, on_retry))
+        return failed
+    return missing_updates(rows, result.data)
+
+def missing_updates(rows: List[ParsedRow], data: Optional[List[Dict]]) -> List[Tuple[ParsedRow, str, str]]:
+    """PATCH answers 200 with the rows it could see; RLS hides the rest without an error"""
+    updated = {p.get('id_perangkat') for p in data or []}
+    return [(r, 'NO_DATA', 'Update returned no data (RLS blocking?)') for r in rows
+            if r.perangkat['id_perangkat'] not in updated]
+
+def count_update_failures(plan: SyncPlan, failed: List[Tuple[ParsedRow, str, str]], stats: Dict,
+                          rejects: RejectsWriter) -> List[SyncChange]:
+    """Count and reject the changed rows that failed to update; returns the changes that went in"""
+    for row, code, message in failed:
+        stats['failed'] += 1
+        if len(stats['failed_samples']) < 5:
+            stats['failed_samples'].append(row.perangkat.as_dict())
+        rejects.add_row(row, code, message)
+        log('debug', f"      ❌ Row {row.row_num} ({row.perangkat['id_perangkat']}): [{code}] {message}")
+    failed_rows = {row.row_num for row, _, _ in failed}
+    updated = [c for c in plan.changed if c.row.row_num not in failed_rows]
+    stats['updated'] += len(updated)
+    METRICS.add_rows('perangkat_update', len(updated))
+    return updated
+
+def sync_perangkat_batch(supabase: Client, batch: List[ParsedRow], batch_num: int, stats: Dict,
+                         rejects: RejectsWriter, on_retry: Optional[Callable[[Exception], None]] = None) -> bool:
+    """Bring the database in line with one batch, sending only what differs
+    
+    New rows are inserted as usual; changed rows get a PATCH of just the differing columns
+    (rows with identical changes share a request) and their storage entries are diffed;
+    unchanged rows cost nothing beyond the lookup. Used by --sync and --upsert: existing
+    rows are never re-inserted, so the perangkat trigger does not see them (it refuses a
+    known serial_number with 23505 before ON CONFLICT is considered).
+    Returns True when nothing was rejected.
+    """
+    plan = plan_sync_batch(supabase, batch, on_retry)
+    stats['unchanged'] += plan.unchanged
+    batch_ok = True
+    if plan.new:
+        batch_ok = insert_perangkat_batch(supabase, plan.new, batch_num, stats, rejects, on_retry)
+    
+    failed = []
+    with METRICS.stage('perangkat_update'):
+        for body, rows in group_sync_changes(plan.changed).items():
+            for chunk in iter_batches(rows, LOOKUP_CHUNK_SIZE):
+                failed.extend(update_perangkat_rows(supabase, chunk, json.loads(body), on_retry))
+    updated = count_update_failures(plan, failed, stats, rejects)
+    
+    # Storage of rows whose update failed is left as it is
+    storage_remove = [i for c in updated for i in c.storage_remove]
+    storage_add = [entry for c in updated for entry in c.storage_add]
+    with METRICS.stage('storage_insert'):
+        for i in range(0, len(storage_remove), LOOKUP_CHUNK_SIZE):
+            chunk = storage_remove[i:i+LOOKUP_CHUNK_SIZE]
+            try:
+                execute_with_retry(lambda: supabase.table('perangkat_storage').delete().in_('id', chunk).execute(),
+                                   on_retry)
+                stats['storage_removed'] += len(chunk)
+            except Exception as e:
+                log('warning', f"   ⚠️  Batch {batch_num}: Could not remove storage records: {error_message_of(e)}")
+        for chunk in iter_batches(storage_add, MAX_BATCH_SIZE):
+            _, storage_failed = insert_with_bisect(supabase, 'perangkat_storage', chunk, encode_json,
+                                                   STORAGE_COLUMNS, on_retry, require_data=False)
+            stats['storage_inserted'] += len(chunk) - len(storage_failed)
+            stats['storage_failed'] += len(storage_failed)
+            METRICS.add_rows('storage_insert', len(chunk) - len(storage_failed))
+    
+    if plan.changed or failed:
+        log('debug', f"   🔄 Batch {batch_num}: {len(plan.new)} new, {len(updated)} updated, "
+                     f"{plan.unchanged} unchanged, {len(failed)} failed")
+    return batch_ok and not failed
+
+class UploadEngine:
+    """Send batches with bounded parallelism, adapting the batch size to observed latency
+    
+    Batch size grows by 25% while batches finish well under TARGET_BATCH_SECONDS and
+    MAX_PAYLOAD_BYTES, and halves when either is exceeded or the server asks us to back off.
+    """
+    
+    def __init__(self, supabase: Client, stats: Dict, rejects: RejectsWriter,
+                 workers: int = DEFAULT_WORKERS, batch_size: int = BATCH_SIZE,
+                 journal: Optional[ImportJournal] = None, upsert: bool = False, sync: bool = False):
+        self.supabase = supabase
+        self.stats = stats
+        self.rejects = rejects
+        self.journal = journal
+        self.upsert = upsert
+        self.sync = sync
+        self.workers = max(1, workers)
+        self.batch_size = min(max(batch_size, MIN_BATCH_SIZE), MAX_BATCH_SIZE)
+        self.lock = threading.Lock()
+        self.started = None
+        self.last_progress = 0.0
+    
+    def current_batch_size(self) -> int:
+        return self.batch_size
+    
+    def _resize(self, factor: float):
+        self.batch_size = int(min(max(self.batch_size * factor, MIN_BATCH_SIZE), MAX_BATCH_SIZE))
+    
+    def _on_retry(self, e: Exception):
+        with self.lock:
+            self._resize(0.5)
+        log('debug', f"   ⏳ Backing off after transient error ({getattr(e, 'code', None) or type(e).__name__}), "
+              f"batch size now {self.batch_size}")
+    
+    def _send(self, span: BatchSpan, batch: List[ParsedRow], batch_num: int):
+        part = new_import_stats()
+        # Encoded here once; the insert sends these same bytes (PerangkatRecord.json())
+        payload_bytes = sum(len(r.perangkat.json()) + 1 for r in batch) + 1
+        start = time.perf_counter()
+        try:
+            # Upserts patch existing rows instead of re-inserting them (see sync_perangkat_batch())
+            send = sync_perangkat_batch if self.sync or self.upsert else insert_perangkat_batch
+            batch_ok = send(self.supabase, batch, batch_num, part, self.rejects, self._on_retry)
+            if self.journal:
+                self.journal.record(span, part['inserted'] + part['updated'], part['failed'])
+        except Exception as e:
+            batch_ok = False
+            self._reject_batch(batch, batch_num, part, e)
+        self._finish(batch, batch_num, part, batch_ok, time.perf_counter() - start, payload_bytes)
+    
+    def _reject_batch(self, batch: List[ParsedRow], batch_num: int, part: Dict, e: Exception):
+        part['failed'] += len(batch)
+        for row in batch:
+            self.rejects.add_row(row, error_code_of(e), error_message_of(e))
+        log('error', f"   ❌ Unexpected error while sending batch {batch_num}: {e}")
+    
+    def _finish(self, batch: List[ParsedRow], batch_num: int, part: Dict, batch_ok: bool, elapsed: float,
+                payload_bytes: int):
+        """Merge a sent batch into the run: stats, batch size adaptation and progress"""
+        with self.lock:
+            merge_import_stats(self.stats, part)
+            if batch_ok:
+                if elapsed > TARGET_BATCH_SECONDS or payload_bytes > MAX_PAYLOAD_BYTES:
+                    self._resize(0.5)
+                elif elapsed < TARGET_BATCH_SECONDS / 2 and payload_bytes < MAX_PAYLOAD_BYTES / 2:
+                    self._resize(1.25)
+            rate = self.stats['inserted'] / max(time.perf_counter() - self.started, 1e-9)
+            status = '✅' if batch_ok else '⚠️ '
+            log('debug', f"   {status} Batch {batch_num}: {part['inserted']}/{len(batch)} rows in {elapsed:.2f}s "
+                         f"({payload_bytes / 1024:.0f} KB) | {self.stats['inserted']} inserted, "
+                         f"{rate:.0f} rows/s | next batch size {self.batch_size}")
+            if time.perf_counter() - self.last_progress >= PROGRESS_INTERVAL:
+                self.last_progress = time.perf_counter()
+                self._progress()
+    
+    def _progress(self):
+        if self.sync or self.upsert:
+            done = self.stats['inserted'] + self.stats['updated'] + self.stats['unchanged']
+            counts = (f"{self.stats['inserted']} inserted, {self.stats['updated']} updated, "
+                      f"{self.stats['unchanged']} unchanged")
+        else:
+            done = self.stats['inserted']
+            counts = f"{self.stats['inserted']} inserted"
+        rate = done / max(time.perf_counter() - self.started, 1e-9)
+        log('info', f"   ⏱️  {counts}, {self.stats['failed']} failed | "
+                    f"{rate:.0f} rows/s | batch size {self.batch_size}")
+    
+    def run(self, batches: Iterable[Tuple[BatchSpan, List[ParsedRow]]]):
+        """Consume batches, keeping at most workers + SEND_QUEUE_DEPTH of them in memory"""
+        self.started = self.last_progress = time.perf_counter()
+        slots = threading.BoundedSemaphore(self.workers + SEND_QUEUE_DEPTH)
+        batch_num = 0
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='perangkat-sender') as pool:
+            for span, batch in batches:
+                if not batch:
+                    # Every row was rejected before sending; the span is still done
+                    if self.journal:
+                        self.journal.record(span, 0, 0)
+                    continue
+                batch_num += 1
+                slots.acquire()
+                future = pool.submit(self._send, span, batch, batch_num)
+                future.add_done_callback(lambda _: slots.release())
+        self._progress()
+
+class PostgrestError(Exception):
+    """Error response of the PostgREST API, with the code / message attributes of postgrest's APIError"""
+    
+    def __init__(self, status: int, body):
+        body = body if isinstance(body, dict) else {}
+        self.status = status
+        self.code = str(body.get('code') or status)  # SQLSTATE, PGRST code or the HTTP status
+        self.message = body.get('message') or f"HTTP {status}"
+        self.details = body.get('details')
+        self.hint = body.get('hint')
+        super().__init__(self.message)
+
+def in_filter(values: Iterable[str]) -> str:
+    """PostgREST in.() filter with every value quoted (commas, dots and parentheses are safe)"""
+    return 'in.(' + ','.join('"' + str(v).replace('\\', '\\\\').replace('"', '\\"') + '"' for v in values) + ')'
+
+class AsyncPostgrest:
+    """Async client for the PostgREST API under SUPABASE_URL, used by --engine async
+    
+    One httpx.AsyncClient keeps a pool of keep-alive connections (sized to the workers)
+    open for the whole run; its coroutines run on an event loop in a background thread,
+    so synchronous code hands work over with run() (waits) or submit() (returns a future).
+    Writes ask for Prefer: return=minimal unless the rows are needed back (perangkat
+    inserts, for the UUIDs their storage links to). Rate limits, gateway errors and network
+    failures are retried with jittered exponential backoff, honouring Retry-After.
+    Every request is recorded in METRICS under the stage it is made for.
+    """
+    
+    def __init__(self, url: str, key: str, connections: int = DEFAULT_WORKERS, timeout: float = 30.0):
+        import asyncio  # Like httpx, only loaded by the async engine: --lint and --help start faster
+        import httpx  # Installed with supabase
+        
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True, name='postgrest-async')
+        self.thread.start()
+        self.client = httpx.AsyncClient(
+            base_url=url.rstrip('/') + '/rest/v1/',
+            headers={'apikey': key, 'Authorization': f"Bearer {key}"},
+            limits=httpx.Limits(max_connections=connections, max_keepalive_connections=connections),
+            timeout=timeout)
+        self.transport_error = httpx.TransportError
+    
+    def run(self, coro):
+        return self.submit(coro).result()
+    
+    def submit(self, coro) -> Future:
+        import asyncio
+        
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+    
+    def close(self):
+        self.run(self.client.aclose())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+    
+    async def request(self, method: str, table: str, params: Optional[Dict] = None, body: Optional[bytes] = None,
+                      prefer: Optional[str] = None, stage: str = 'other',
+                      on_retry: Optional[Callable[[Exception], None]] = None) -> List[Dict]:
+        """Send one request, retrying transient failures; returns the decoded response rows"""
+        import asyncio
+        
+        headers = {}
+        if body is not None:
+            headers['Content-Type'] = 'application/json'
+        if prefer:
+            headers['Prefer'] = prefer
+        for attempt in range(MAX_RETRIES + 1):
+            retry_after = None
+            start = time.perf_counter()
+            try:
+                response = await self.client.request(method, table, params=params, content=body, headers=headers)
+            except self.transport_error as e:
+                METRICS.observe_request(time.perf_counter() - start, len(body or b''), False, stage)
+                error = e
+            else:
+                METRICS.observe_request(time.perf_counter() - start, len(body or b''), response.is_success, stage)
+                if response.is_success:
+                    return json.loads(response.content) if response.content else []
                 try:
-                    result = supabase.table('perangkat').insert(record).execute()
-                    if result.data:
-                        inserted_count += 1
-                        failed_count -= 1
-                        print(f"      ✅ Inserted: {record.get('id_perangkat', 'unknown')}")
-                    else:
-                        failed_records.append(record)
-                        print(f"      ❌ No data returned for: {record.get('id_perangkat', 'unknown')} (RLS blocking?)")
-                except Exception as e2:
-                    failed_records.append(record)
-                    error_detail = str(e2)
-                    if hasattr(e2, 'message'):
-                        error_detail = e2.message
-                    print(f"      ❌ Failed: {record.get('id_perangkat', 'unknown')} - {error_detail}")
-    
-    print(f"\n✅ Inserted {inserted_count} perangkat records")
-    if failed_count > 0:
-        print(f"❌ Failed to insert {failed_count} perangkat records")
-        if failed_records:
+                    error = PostgrestError(response.status_code, response.json())
+                except ValueError:
+                    error = PostgrestError(response.status_code, None)
+                retry_after = response.headers.get('Retry-After')
+            if attempt >= MAX_RETRIES or not is_transient_error(error):
+                raise error
+            METRICS.count_retry(stage)
+            if on_retry:
+                on_retry(error)
+            await asyncio.sleep(backoff_delay(attempt, retry_after))
+    
+    async def select_in(self, table: str, column: str, values: Iterable[str], select: Optional[str] = None,
+                        stage: str = 'other') -> List[Dict]:
+        """select_in_chunks() with all chunks in flight at once"""
+        import asyncio
+        
+        values = list(values)
+        select = re.sub(r'\s+', '', select or column)  # As postgrest-py sends it (embedded selects included)
+        pages = await asyncio.gather(*(
+            self.request('GET', table, {'select': select, column: in_filter(values[i:i+LOOKUP_CHUNK_SIZE])},
+                         stage=stage)
+            for i in range(0, len(values), LOOKUP_CHUNK_SIZE)))
+        return [row for page in pages for row in page]
+    
+    async def select_column(self, table: str, column: str, stage: str = 'other') -> set:
+        """Every value of column, paged like ReferenceCache._fetch_table()"""
+        keys = set()
+        offset = 0
+        while True:
+            page = await self.request('GET', table, {'select': column, 'offset': offset, 'limit': FETCH_PAGE_SIZE},
+                                      stage=stage)
+            keys.update(str(r[column]) for r in page)
+            if len(page) < FETCH_PAGE_SIZE:
+                return keys
+            offset += FETCH_PAGE_SIZE
+    
+    async def insert(self, table: str, body: bytes, columns: List[str], returning: bool = True,
+                     stage: str = 'other', on_retry: Optional[Callable[[Exception], None]] = None) -> List[Dict]:
+        """POST an encoded JSON array (see post_rows())"""
+        return await self.request('POST', table, {'columns': ','.join(columns)}, body,
+                                  'return=representation' if returning else 'return=minimal', stage, on_retry)
+    
+    async def update_in(self, table: str, column: str, values: List[str], body: bytes, stage: str = 'other',
+                        on_retry: Optional[Callable[[Exception], None]] = None) -> List[Dict]:
+        """PATCH the rows whose column is in values with the same encoded changes; returns the updated rows"""
+        return await self.request('PATCH', table, {column: in_filter(values)}, body, 'return=representation',
+                                  stage, on_retry)
+    
+    async def delete_in(self, table: str, column: str, values: List[str], stage: str = 'other',
+                        on_retry: Optional[Callable[[Exception], None]] = None):
+        import asyncio
+        
+        await asyncio.gather(*(
+            self.request('DELETE', table, {column: in_filter(values[i:i+LOOKUP_CHUNK_SIZE])},
+                         prefer='return=minimal', stage=stage, on_retry=on_retry)
+            for i in range(0, len(values), LOOKUP_CHUNK_SIZE)))
+
+async def insert_with_bisect_async(client: AsyncPostgrest, table: str, items: List, payload: Callable[[object], bytes],
+                                   columns: List[str], stage: str,
+                                   on_retry: Optional[Callable[[Exception], None]] = None,
+                                   require_data: bool = True) -> Tuple[List[Dict], List[Tuple[object, str, str]]]:
+    """insert_with_bisect() on the async client; the two halves of a failed batch are retried concurrently"""
+    import asyncio
+    
+    body = b'[' + b','.join(payload(i) for i in items) + b']'
+    try:
+        data = await client.insert(table, body, columns, require_data, stage, on_retry)
+    except Exception as e:
+        if len(items) == 1:
+            return [], [(items[0], error_code_of(e), error_message_of(e))]
+        mid = len(items) // 2
+        (left_data, left_rejects), (right_data, right_rejects) = await asyncio.gather(
+            insert_with_bisect_async(client, table, items[:mid], payload, columns, stage, on_retry, require_data),
+            insert_with_bisect_async(client, table, items[mid:], payload, columns, stage, on_retry, require_data))
+        return left_data + right_data, left_rejects + right_rejects
+    
+    if require_data and not data:
+        # No data returned - RLS blocks every row alike, so splitting would not help
+        return [], [(item, 'NO_DATA', 'Insert returned no data (RLS blocking?)') for item in items]
+    return data, []
+
+async def insert_perangkat_batch_async(client: AsyncPostgrest, batch: List[ParsedRow], batch_num: int, stats: Dict,
+                                       rejects: RejectsWriter,
+                                       on_retry: Optional[Callable[[Exception], None]] = None) -> bool:
+    """insert_perangkat_batch() on the async client; storage goes in with return=minimal"""
+    stats['batches'] += 1
+    
+    start = time.perf_counter()
+    returned, failed = await insert_with_bisect_async(client, 'perangkat', batch, lambda r: r.perangkat.json(),
+                                                      PERANGKAT_COLUMNS, 'perangkat_insert', on_retry)
+    end = time.perf_counter()
+    METRICS.add_time('perangkat_insert', end - start, start, end)
+    perangkat_ids = {p['id_perangkat']: p['id'] for p in returned}
+    inserted_rows = count_insert_failures(batch, failed, batch_num, stats, rejects)
+    
+    start = time.perf_counter()
+    storage_records = [(r.perangkat['id_perangkat'], s) for r in inserted_rows for s in r.storage]
+    unresolved = {id_perangkat for id_perangkat, _ in storage_records} - perangkat_ids.keys()
+    if unresolved:
+        try:
+            found = await client.select_in('perangkat', 'id_perangkat', unresolved, 'id, id_perangkat',
+                                           'storage_insert')
+            perangkat_ids.update({p['id_perangkat']: p['id'] for p in found})
+        except Exception as e:
+            log('warning', f"   ⚠️  Warning: Could not look up perangkat UUIDs: {str(e)}")
+    storage_before = stats['storage_inserted']
+    for chunk in iter_batches(link_storage_entries(storage_records, perangkat_ids, stats), MAX_BATCH_SIZE):
+        _, storage_failed = await insert_with_bisect_async(client, 'perangkat_storage', chunk, encode_json,
+                                                           STORAGE_COLUMNS, 'storage_insert', on_retry,
+                                                           require_data=False)
+        count_storage_failures(chunk, storage_failed, stats)
+    end = time.perf_counter()
+    if storage_records:
+        METRICS.add_time('storage_insert', end - start, start, end)
+        METRICS.add_rows('storage_insert', stats['storage_inserted'] - storage_before)
+    
+    return not failed
+
+async def update_perangkat_rows_async(client: AsyncPostgrest, rows: List[ParsedRow], changes: Dict,
+                                      on_retry: Optional[Callable[[Exception], None]] = None) -> List[Tuple[ParsedRow, str, str]]:
+    """update_perangkat_rows() on the async client; the per-row fallback runs concurrently"""
+    import asyncio
+    
+    try:
+        data = await client.update_in('perangkat', 'id_perangkat', [r.perangkat['id_perangkat'] for r in rows],
+                                      encode_json(changes), 'perangkat_update', on_retry)
+    except Exception as e:
+        if len(rows) == 1:
+            return [(rows[0], error_code_of(e), error_message_of(e))]
+        results = await asyncio.gather(*(update_perangkat_rows_async(client, [row], changes, on_retry)
+                                         for row in rows))
+        return [f for failed in results for f in failed]
+    return missing_updates(rows, data)
+
+async def sync_perangkat_batch_async(client: AsyncPostgrest, batch: List[ParsedRow], batch_num: int, stats: Dict,
+                                     rejects: RejectsWriter,
+                                     on_retry: Optional[Callable[[Exception], None]] = None) -> bool:
+    """sync_perangkat_batch() on the async client (--upsert with --engine async)"""
+    import asyncio
+    
+    start = time.perf_counter()
+    existing = await client.select_in('perangkat', 'id_perangkat', [r.perangkat['id_perangkat'] for r in batch],
+                                      SYNC_SELECT, 'sync_lookup')
+    end = time.perf_counter()
+    METRICS.add_time('sync_lookup', end - start, start, end)
+    METRICS.add_rows('sync_lookup', len(batch))
+    plan = classify_sync_batch(batch, existing)
+    stats['unchanged'] += plan.unchanged
+    batch_ok = True
+    if plan.new:
+        batch_ok = await insert_perangkat_batch_async(client, plan.new, batch_num, stats, rejects, on_retry)
+    
+    start = time.perf_counter()
+    updates = [update_perangkat_rows_async(client, chunk, json.loads(body), on_retry)
+               for body, rows in group_sync_changes(plan.changed).items()
+               for chunk in iter_batches(rows, LOOKUP_CHUNK_SIZE)]
+    failed = [f for result in await asyncio.gather(*updates) for f in result]
+    end = time.perf_counter()
+    if updates:
+        METRICS.add_time('perangkat_update', end - start, start, end)
+    updated = count_update_failures(plan, failed, stats, rejects)
+    
+    # Storage of rows whose update failed is left as it is
+    storage_remove = [i for c in updated for i in c.storage_remove]
+    storage_add = [entry for c in updated for entry in c.storage_add]
+    start = time.perf_counter()
+    if storage_remove:
+        try:
+            await client.delete_in('perangkat_storage', 'id', storage_remove, 'storage_insert', on_retry)
+            stats['storage_removed'] += len(storage_remove)
+        except Exception as e:
+            log('warning', f"   ⚠️  Batch {batch_num}: Could not remove storage records: {error_message_of(e)}")
+    for chunk in iter_batches(storage_add, MAX_BATCH_SIZE):
+        _, storage_failed = await insert_with_bisect_async(client, 'perangkat_storage', chunk, encode_json,
+                                                           STORAGE_COLUMNS, 'storage_insert', on_retry,
+                                                           require_data=False)
+        stats['storage_inserted'] += len(chunk) - len(storage_failed)
+        stats['storage_failed'] += len(storage_failed)
+        METRICS.add_rows('storage_insert', len(chunk) - len(storage_failed))
+    end = time.perf_counter()
+    if storage_remove or storage_add:
+        METRICS.add_time('storage_insert', end - start, start, end)
+    
+    if plan.changed or failed:
+        log('debug', f"   🔄 Batch {batch_num}: {len(plan.new)} new, {len(updated)} updated, "
+                     f"{plan.unchanged} unchanged, {len(failed)} failed")
+    return batch_ok and not failed
+
+class AsyncUploadEngine(UploadEngine):
+    """UploadEngine whose batches are coroutines on an AsyncPostgrest client instead of threads
+    
+    Up to workers batches are in flight at once, sharing the client's connection pool;
+    batch size adaptation, journaling and progress work as in UploadEngine.
+    """
+    
+    def __init__(self, client: AsyncPostgrest, stats: Dict, rejects: RejectsWriter, **kwargs):
+        super().__init__(None, stats, rejects, **kwargs)
+        self.client = client
+    
+    async def _send_async(self, span: BatchSpan, batch: List[ParsedRow], batch_num: int):
+        part = new_import_stats()
+        payload_bytes = sum(len(r.perangkat.json()) + 1 for r in batch) + 1
+        start = time.perf_counter()
+        try:
+            send = sync_perangkat_batch_async if self.upsert else insert_perangkat_batch_async
+            batch_ok = await send(self.client, batch, batch_num, part, self.rejects, self._on_retry)
+            if self.journal:
+                self.journal.record(span, part['inserted'] + part['updated'], part['failed'])
+        except Exception as e:
+            batch_ok = False
+            self._reject_batch(batch, batch_num, part, e)
+        self._finish(batch, batch_num, part, batch_ok, time.perf_counter() - start, payload_bytes)
+    
+    def run(self, batches: Iterable[Tuple[BatchSpan, List[ParsedRow]]]):
+        """Consume batches, keeping at most workers of them in flight"""
+        self.started = self.last_progress = time.perf_counter()
+        slots = threading.BoundedSemaphore(self.workers)
+        futures = []
+        batch_num = 0
+        for span, batch in batches:
+            if not batch:
+                if self.journal:
+                    self.journal.record(span, 0, 0)
+                continue
+            batch_num += 1
+            slots.acquire()
+            future = self.client.submit(self._send_async(span, batch, batch_num))
+            future.add_done_callback(lambda _: slots.release())
+            futures.append(future)
+        for future in futures:
+            future.result()
+        self._progress()
+
+def import_perangkat_from_csv(csv_file: str, supabase: Client, dry_run: bool = False,
+                              inline_validation: bool = False, workers: int = DEFAULT_WORKERS,
+                              batch_size: int = BATCH_SIZE, rejects_file: Optional[str] = None,
+                              resume: bool = False, upsert: bool = False, journal_file: Optional[str] = None,
+                              reference: Optional[ReferenceCache] = None,
+                              conflicts: Optional[Dict[int, Conflict]] = None, sync: bool = False,
+                              client: Optional[AsyncPostgrest] = None):
+    """Import perangkat data from CSV file
+    
+    Rows stream through parse -> validate -> batch -> send, so memory stays bounded by
+    the batches in flight regardless of file size. With inline_validation, foreign keys
+    are checked per batch instead of by a separate validate_uuids() pass over the file.
+    Rows that cannot be imported are written to rejects_file (default: <csv>.rejects.csv).
+    
+    Committed batches are journaled to journal_file (default: <csv>.journal.jsonl); with
+    resume, batches already in the journal are skipped. With upsert, rows whose
+    id_perangkat already exists are updated instead of rejected. With sync, existing
+    rows are compared first and only the differences are sent (see sync_perangkat_batch());
+    a dry run then reports what would change.
+    
+    Rows listed in conflicts (see preflight_conflicts()) are rejected without being sent,
+    so they never force a batch onto the bisect path. Rows without id_perangkat are
+    numbered from a block reserved per batch (see IdReserver). With client, batches
+    are sent by an AsyncUploadEngine instead of worker threads.
+    Returns the run totals (see import_totals()).
+    """
+    
+    print(f"📂 Reading CSV file: {display_name(csv_file)}")
+    
+    base_name = os.path.splitext(csv_file)[0]
+    if rejects_file is None and not dry_run:
+        rejects_file = default_rejects_file(csv_file)
+    journal = None if dry_run else ImportJournal(journal_file or base_name + '.journal.jsonl', csv_file)
+    stats = new_import_stats()
+    validator = StreamValidator(reference or ReferenceCache(supabase)) if inline_validation else None
+    ids = IdReserver(supabase, dry_run)
+    
+    def reject_conflict(r: ParsedRow) -> bool:
+        conflict = conflicts.get(r.row_num)
+        if conflict and conflict.code == ALREADY_IMPORTED:
+            stats['already_imported'] += 1
+        elif conflict:
+            rejects.add_row(r, conflict.code, conflict.message)
+        return conflict is not None
+    
+    def counted(batches: Iterable[Tuple[BatchSpan, List[ParsedRow]]]) -> Iterator[Tuple[BatchSpan, List[ParsedRow]]]:
+        for span, batch in batches:
+            if conflicts:
+                batch = [r for r in batch if not reject_conflict(r)]
+            if validator:
+                batch = validator.filter_batch(batch, rejects)
+            # Numbered last, so only rows that will actually be sent use up sequence numbers
+            try:
+                ids.apply(batch)
+            except IdReservationError as e:
+                for r in batch:
+                    if not r.perangkat['id_perangkat']:
+                        rejects.add_row(r, e.code, str(e))
+                batch = [r for r in batch if r.perangkat['id_perangkat']]
+            stats['parsed'] += len(batch)
+            stats['storage_parsed'] += sum(len(r.storage) for r in batch)
+            yield span, batch
+    
+    with open(csv_file, 'rb') as f:
+        with METRICS.stage('sniff'):
+            date_parser = sample_date_parser(f)
+            reader, lines, header = open_csv_stream(f, verbose=True)
+        start_offset, first_row, skip_spans = lines.offset, 2, []
+        
+        if resume and journal:
+            committed = journal.load(header)
+            start_offset, first_row, skip_spans = plan_resume(committed, lines.offset)
+            if committed:
+                skipped = first_row - 2 + sum(s.last_row - s.first_row + 1 for s in skip_spans)
+                print(f"⏩ Resuming: {len(committed)} batches ({skipped} rows) already committed, "
+                      f"continuing at row {first_row}")
+            reader, lines, header = open_csv_stream(f, start_offset=start_offset)
+        
+        def already_committed(row_num: int) -> bool:
+            return any(s.first_row <= row_num <= s.last_row for s in skip_spans)
+        
+        rejects = RejectsWriter(rejects_file, reader.fieldnames, reader.reader.dialect.delimiter,
+                                append=resume)
+        if resume:
+            rejects.drop_rows(lambda n: n >= first_row and not already_committed(n))
+        if client:
+            engine = AsyncUploadEngine(client, stats, rejects, workers=workers, batch_size=batch_size,
+                                       journal=journal, upsert=upsert)
+        else:
+            engine = UploadEngine(supabase, stats, rejects, workers=workers, batch_size=batch_size,
+                                  journal=journal, upsert=upsert, sync=sync)
+        rows = iter_parsed_rows(reader, lines, rejects, first_row=first_row,
+                                skip=already_committed if skip_spans else None, parse_date=date_parser)
+        batches = counted(iter_spanned_batches(rows, engine.current_batch_size, start_offset, first_row))
+        
+        try:
+            if journal:
+                journal.open(header, resume)
+            run_batches(supabase, engine, batches, dry_run=dry_run)
+        finally:
+            rejects.close()
+            if journal:
+                journal.close()
+    
+    if rejects.count:
+        print(f"\n❌ Rejected {rejects.count} rows:")
+        for sample in rejects.samples:  # Show first 10 errors
+            print(f"   {sample}")
+        if rejects.count > len(rejects.samples):
+            print(f"   ... and {rejects.count - len(rejects.samples)} more errors")
+        if rejects.path:
+            print(f"📝 Rejected rows written to {rejects.path} (fix them and re-run the import on that file)")
+    
+    print(f"\n✅ Parsed {stats['parsed']} perangkat records")
+    print(f"✅ Prepared {stats['storage_parsed']} storage records")
+    for line in ids.summary():
+        print(line)
+    for line in date_parser.summary():
+        print(line)
+    print()
+    
+    print_import_results(stats, rejects.count, dry_run=dry_run, sync=sync, upsert=upsert)
+    return import_totals(stats, rejects.count)
+
+def run_batches(supabase: Client, engine: UploadEngine, batches: Iterable[Tuple[BatchSpan, List[ParsedRow]]],
+                dry_run: bool = False):
+    """Send batches through engine; a dry run only reads them (with sync, classifying them
+    against the database without writing anything)"""
+    stats = engine.stats
+    if dry_run and engine.sync:
+        for _, batch in batches:
+            if batch:
+                plan = plan_sync_batch(supabase, batch)
+                stats['inserted'] += len(plan.new)
+                stats['updated'] += len(plan.changed)
+                stats['unchanged'] += plan.unchanged
+    elif dry_run:
+        for _ in batches:
+            pass
+    else:
+        action = 'Syncing' if engine.sync else 'Upserting' if engine.upsert else 'Inserting'
+        print(f"📤 {action} perangkat records with {engine.workers} workers, "
+              f"starting at {engine.batch_size} rows per batch...")
+        engine.run(batches)
+
+def print_import_results(stats: Dict, rejected: int, dry_run: bool = False, sync: bool = False,
+                         upsert: bool = False):
+    """Print what an import did (or would do, on a dry run) and the final summary
+    
+    Upserts report inserted and updated rows separately, as syncs do.
+    """
+    if dry_run and sync:
+        print("🔍 DRY RUN MODE - No data will be changed")
+        print(f"   Would insert {stats['inserted']} new perangkat records")
+        print(f"   Would update {stats['updated']} changed perangkat records")
+        print(f"   {stats['unchanged']} perangkat records are unchanged")
+        return
+    if dry_run:
+        print("🔍 DRY RUN MODE - No data will be inserted")
+        print(f"   Would insert {stats['parsed']} perangkat records")
+        print(f"   Would insert {stats['storage_parsed']} storage records")
+        return
+    
+    print(f"✅ Inserted {stats['inserted']} perangkat records")
+    if stats['already_imported']:
+        print(f"⏩ {stats['already_imported']} perangkat records were already imported before the interruption")
+    if sync or upsert:
+        print(f"✅ Updated {stats['updated']} changed perangkat records ({stats['unchanged']} unchanged)")
+    if stats['failed'] > 0:
+        print(f"❌ Failed to insert {stats['failed']} perangkat records")
+        if stats['failed_samples']:
             print(f"   Sample failed records (first 5):")
-            for rec in failed_records[:5]:
+            for rec in stats['failed_samples']:
                 print(f"      - {rec.get('id_perangkat', 'unknown')}: petugas_id={rec.get('petugas_id', 'N/A')[:8]}...")
         
         print(f"\n⚠️  NOTE: If inserts are failing due to RLS policies, you may need to:")
@@ -419,100 +2318,890 @@ def import_perangkat_from_csv(csv_file: str, supabase: Client, dry_run: bool = F
         print(f"   2. Check RLS policies on the 'perangkat' table")
         print(f"   3. Ensure the authenticated user has INSERT permissions")
     
-    # Step 2: Insert storage records
-    print(f"\n📤 Inserting {len(storage_records)} storage records...")
-    storage_inserted = 0
-    storage_failed = 0
+    print(f"\n✅ Inserted {stats['storage_inserted']} storage records")
+    if stats['storage_removed']:
+        print(f"✅ Removed {stats['storage_removed']} storage records")
+    if stats['storage_failed'] > 0:
+        print(f"❌ Failed to insert {stats['storage_failed']} storage records")
+    
+    # Final summary
+    print("\n" + "="*60)
+    print("📊 IMPORT SUMMARY")
+    print("="*60)
+    if sync or upsert:
+        print(f"Perangkat records: {stats['inserted']} inserted, {stats['updated']} updated, "
+              f"{stats['unchanged']} unchanged, {stats['failed']} failed")
+        print(f"Storage records:   {stats['storage_inserted']} inserted, {stats['storage_removed']} removed, "
+              f"{stats['storage_failed']} failed")
+    else:
+        print(f"Perangkat records: {stats['inserted']} inserted, {stats['failed']} failed")
+        print(f"Storage records:   {stats['storage_inserted']} inserted, {stats['storage_failed']} failed")
+    if rejected > stats['failed']:
+        print(f"Skipped rows:      {rejected - stats['failed']}")
+    print("="*60)
+
+class CollectedRejects(list):
+    """Rejects gathered in a worker process, written out by the main process"""
+    
+    def add(self, row_num: int, raw: Union[Dict[str, str], List[str], None], error_code: str, error_message: str):
+        self.append((row_num, raw, error_code, error_message))
+
+class ParsedFile(NamedTuple):
+    """A whole CSV file parsed and transformed by parse_file()"""
+    path: str
+    fieldnames: List[str]
+    delimiter: str
+    rows: List[ParsedRow]
+    rejects: List[Tuple[int, List[str], str, str]]
+    date_summary: List[str]
+    seconds: float
+
+def parse_file(path: str) -> ParsedFile:
+    """Parse one CSV file with its own date format (runs in a worker process)"""
+    started = time.perf_counter()
+    rejects = CollectedRejects()
+    with open(path, 'rb') as f:
+        date_parser = sample_date_parser(f)
+        reader, lines, _ = open_csv_stream(f)
+        rows = [r._replace(source=path) for r in iter_parsed_rows(reader, lines, rejects, parse_date=date_parser)]
+    return ParsedFile(path, reader.fieldnames, reader.reader.dialect.delimiter, rows, rejects,
+                      date_parser.summary(), time.perf_counter() - started)
+
+class MultiFileRejects:
+    """One RejectsWriter per source file, so rejected rows go back next to the file they came from"""
+    
+    def __init__(self, rejects_files: Dict[str, Optional[str]]):
+        self.rejects_files = rejects_files
+        self.writers = {}
+    
+    def open(self, parsed: ParsedFile) -> RejectsWriter:
+        writer = RejectsWriter(self.rejects_files.get(parsed.path), parsed.fieldnames, parsed.delimiter)
+        self.writers[parsed.path] = writer
+        return writer
     
-    for storage in storage_records:
+    def add_row(self, row: ParsedRow, error_code: str, error_message: str):
+        self.writers[row.source].add_row(row, error_code, error_message)
+    
+    @property
+    def count(self) -> int:
+        return sum(w.count for w in self.writers.values())
+    
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+
+def expand_inputs(inputs: List[str]) -> List[str]:
+    """CSV files named on the command line: files, directories (their *.csv), glob patterns
+    (for shells that do not expand them) or '-' for CSV data on stdin"""
+    files = []
+    for item in inputs:
+        if item == '-':
+            files.append(spool_stdin())
+        elif os.path.isdir(item):
+            files.extend(f for f in sorted(glob.glob(os.path.join(item, '*.csv'))) if not is_output_file(f))
+        elif glob.has_magic(item):
+            files.extend(f for f in sorted(glob.glob(item)) if not is_output_file(f))
+        else:
+            files.append(item)
+    return list(dict.fromkeys(files))
+
+def is_output_file(path: str) -> bool:
+    """Files the importer writes itself (never picked up from a directory or pattern)"""
+    return path.endswith('.rejects.csv') or path.endswith(STDIN_SPOOL_SUFFIX)
+
+STDIN_SPOOL_SUFFIX = '.stdin.csv'
+
+def spool_stdin() -> str:
+    """Copy CSV data from stdin into a temporary file; the importer reads its input more than once"""
+    fd, path = tempfile.mkstemp(prefix='perangkat_', suffix=STDIN_SPOOL_SUFFIX)
+    with os.fdopen(fd, 'wb') as f:
+        shutil.copyfileobj(sys.stdin.buffer, f)
+    atexit.register(os.remove, path)
+    return path
+
+def default_rejects_file(csv_file: str) -> str:
+    """<csv>.rejects.csv, or stdin.rejects.csv in the current directory for data read from stdin"""
+    if csv_file.endswith(STDIN_SPOOL_SUFFIX):
+        return 'stdin.rejects.csv'
+    return os.path.splitext(csv_file)[0] + '.rejects.csv'
+
+def display_name(csv_file: str) -> str:
+    return '<stdin>' if csv_file.endswith(STDIN_SPOOL_SUFFIX) else csv_file
+
+def import_perangkat_from_files(csv_files: List[str], supabase: Client, dry_run: bool = False,
+                                validate: bool = True, preflight: bool = True, workers: int = DEFAULT_WORKERS,
+                                batch_size: int = BATCH_SIZE, processes: Optional[int] = None,
+                                upsert: bool = False, sync: bool = False,
+                                reference: Optional[ReferenceCache] = None,
+                                client: Optional[AsyncPostgrest] = None) -> Dict:
+    """Import several CSV files (e.g. one export per location) as one job
+    
+    Files are parsed in parallel by a process pool and arrive in command-line order. Each
+    file's rows are then checked in the main process against everything seen so far
+    (id_perangkat / serial_number duplicates across files, existing perangkat, master data
+    from one shared ReferenceCache) and join a single upload queue, so batches mix files
+    and the upload overlaps the parsing of later files. Rejected rows go to each file's
+    own rejects file with their row number in that file. With client, batches are sent
+    by an AsyncUploadEngine. Returns the run totals.
+    """
+    processes = max(1, min(processes or os.cpu_count() or 1, len(csv_files)))
+    print(f"📂 Reading {len(csv_files)} CSV files with {processes} processes")
+    
+    stats = new_import_stats()
+    rejects = MultiFileRejects({f: None if dry_run else default_rejects_file(f) for f in csv_files})
+    validator = StreamValidator(reference or ReferenceCache(supabase)) if validate else None
+    if client:
+        engine = AsyncUploadEngine(client, stats, rejects, workers=workers, batch_size=batch_size, upsert=upsert)
+    else:
+        engine = UploadEngine(supabase, stats, rejects, workers=workers, batch_size=batch_size,
+                              upsert=upsert, sync=sync)
+    first_seen = {'id_perangkat': {}, 'serial_number': {}}  # value -> (file, row) of its first queued row
+    per_file = []
+    ids = IdReserver(supabase, dry_run)
+    
+    def accepted_rows(parsed: ParsedFile) -> List[ParsedRow]:
+        """The rows of one file that pass the checks; the others are rejected"""
+        writer = rejects.open(parsed)
+        for reject in parsed.rejects:
+            writer.add(*reject)
+        METRICS.add_time('parse', parsed.seconds)
+        METRICS.add_rows('parse', len(parsed.rows))
+        
+        rows = []
+        in_file = {column: {} for column in first_seen}  # The first occurrences within this file
+        for r in parsed.rows:
+            serial = r.perangkat['serial_number']
+            if is_serial_placeholder(serial):
+                conflict = placeholder_conflict(r.row_num, serial)
+                writer.add_row(r, conflict.code, conflict.message)
+                continue
+            duplicate = None
+            for column in first_seen:
+                value = r.perangkat[column]
+                first = (first_seen[column].get(value) or in_file[column].get(value)) if value else None
+                if first and not duplicate:
+                    duplicate = f"{column} {value}: duplicate of {display_name(first[0])} row {first[1]}"
+            if duplicate:
+                writer.add_row(r, '23505', duplicate)
+                continue
+            for column, seen in in_file.items():
+                if r.perangkat[column]:
+                    seen[r.perangkat[column]] = (r.source, r.row_num)
+            rows.append(r)
+        
+        if preflight and rows:
+            keys = {(r.source, r.row_num): r for r in rows}
+            try:
+                with METRICS.stage('preflight'):
+                    existing = existing_key_conflicts(
+                        supabase, {r.perangkat['id_perangkat']: k for k, r in keys.items() if r.perangkat['id_perangkat']},
+                        {r.perangkat['serial_number']: k for k, r in keys.items()},
+                        {k: r.perangkat['id_perangkat'] for k, r in keys.items()}, upsert or sync)
+                    METRICS.add_rows('preflight', len(rows))
+            except Exception as e:
+                print(f"   ⚠️ WARNING: Could not look up existing perangkat ({e}); checked the files only")
+                existing = {}
+            for key, (column, value, reason) in existing.items():
+                writer.add_row(keys[key], '23505', f"{column} {value}: {reason}")
+            rows = [r for k, r in keys.items() if k not in existing]
+        if validator and rows:
+            rows = validator.filter_batch(rows, rejects)
+        
         try:
-            # Get perangkat UUID by id_perangkat
-            perangkat_result = supabase.table('perangkat')\
-                .select('id')\
-                .eq('id_perangkat', storage['id_perangkat'])\
-                .single()\
-                .execute()
+            ids.apply(rows)
+        except IdReservationError as e:
+            for r in rows:
+                if not r.perangkat['id_perangkat']:
+                    writer.add_row(r, e.code, str(e))
+            rows = [r for r in rows if r.perangkat['id_perangkat']]
+        # Only queued rows count for later files, so a row rejected above does not make its
+        # duplicates elsewhere rejects too
+        for r in rows:
+            for column, seen in first_seen.items():
+                if r.perangkat[column]:
+                    seen.setdefault(r.perangkat[column], (r.source, r.row_num))
+        
+        stats['parsed'] += len(rows)
+        stats['storage_parsed'] += sum(len(r.storage) for r in rows)
+        per_file.append((parsed, len(rows), writer))
+        print(f"   📄 {display_name(parsed.path)}: {len(parsed.rows)} rows parsed, {len(rows)} queued, "
+              f"{writer.count} rejected ({parsed.seconds:.2f}s)")
+        for line in parsed.date_summary:
+            print(f"      {line}")
+        return rows
+    
+    def queued_rows() -> Iterator[ParsedRow]:
+        # At most 2 parsed files per process wait in memory for the upload
+        pending = deque()
+        remaining = iter(csv_files)
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            for csv_file in islice(remaining, 2 * processes):
+                pending.append(pool.submit(parse_file, csv_file))
+            while pending:
+                parsed = pending.popleft().result()
+                for csv_file in islice(remaining, 1):
+                    pending.append(pool.submit(parse_file, csv_file))
+                yield from accepted_rows(parsed)
+    
+    try:
+        run_batches(supabase, engine, ((None, batch) for batch in iter_batches(queued_rows(), engine.current_batch_size)),
+                    dry_run=dry_run)
+    finally:
+        rejects.close()
+    
+    print("\n📁 Per file:")
+    headers = ('File', 'Rows', 'Queued', 'Rejected', 'Rejects file')
+    table = [(display_name(parsed.path), str(len(parsed.rows) + len(parsed.rejects)), str(queued), str(writer.count),
+              writer.path if writer.count and writer.path else '-') for parsed, queued, writer in per_file]
+    widths = [max(len(h), *(len(r[i]) for r in table)) for i, h in enumerate(headers)]
+    print("   " + " | ".join(h.ljust(w) for h, w in zip(headers, widths)))
+    print("   " + "-+-".join('-' * w for w in widths))
+    for r in table:
+        print("   " + " | ".join(v.ljust(w) for v, w in zip(r, widths)))
+    for parsed, _, writer in per_file:
+        if writer.samples:
+            print(f"\n❌ {display_name(parsed.path)}:")
+            for sample in writer.samples:
+                print(f"   {sample}")
+            if writer.count > len(writer.samples):
+                print(f"   ... and {writer.count - len(writer.samples)} more errors")
+    
+    print(f"\n✅ Parsed {stats['parsed']} perangkat records from {len(csv_files)} files")
+    print(f"✅ Prepared {stats['storage_parsed']} storage records")
+    for line in ids.summary():
+        print(line)
+    print()
+    print_import_results(stats, rejects.count, dry_run=dry_run, sync=sync, upsert=upsert)
+    return import_totals(stats, rejects.count)
+
+PERANGKAT_CASTS = {'petugas_id': '::uuid', 'jenis_barang_id': '::uuid', 'tanggal_entry': '::timestamptz'}
+STAGING_TABLE = 'perangkat_import_staging'
+
+def connect_postgres(dsn: str):
+    """Open a direct PostgreSQL connection (psycopg2 is only needed for --engine copy)"""
+    try:
+        import psycopg2
+    except ImportError:
+        print("❌ ERROR: --engine copy requires psycopg2")
+        print("   Install with: pip install psycopg2-binary")
+        sys.exit(1)
+    
+    if not dsn:
+        print("❌ ERROR: --engine copy needs a database connection string!")
+        print("   Pass --dsn or set DATABASE_URL, e.g.:")
+        print("   DATABASE_URL=postgresql://postgres:<password>@db.<project>.supabase.co:5432/postgres")
+        sys.exit(1)
+    
+    try:
+        conn = psycopg2.connect(dsn)
+        print("✅ Connected to PostgreSQL")
+        return conn
+    except Exception as e:
+        print(f"❌ ERROR: Failed to connect to PostgreSQL: {str(e)}")
+        sys.exit(1)
+
+class CopyRowStream:
+    """File-like object that feeds rows to COPY FROM STDIN as CSV, encoding them on demand
+    
+    None is written as an unquoted empty field, which COPY reads as NULL.
+    """
+    
+    def __init__(self, rows: Iterable[List]):
+        self.rows = iter(rows)
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer, lineterminator='\n')
+        self.pending = ''
+        self.bytes_sent = 0
+    
+    def read(self, size: int = -1) -> str:
+        while size < 0 or len(self.pending) < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            self.writer.writerow(row)
+            self.pending += self.buffer.getvalue()
+            self.buffer.seek(0)
+            self.buffer.truncate()
+        if size < 0:
+            size = len(self.pending)
+        data, self.pending = self.pending[:size], self.pending[size:]
+        self.bytes_sent += len(data.encode('utf-8'))  # As sent to the server, not characters
+        return data
+    
+    readline = read
+
+def staging_row(parsed: ParsedRow) -> List:
+    """Flatten a parsed row into the staging table layout: row_num, perangkat columns, ssd, hdd"""
+    capacity = dict(parsed.storage)
+    return ([parsed.row_num] + [parsed.perangkat[c] for c in PERANGKAT_COLUMNS]
+            + [capacity.get('SSD'), capacity.get('HDD')])
+
+def number_staging_rows(cur) -> Optional[IdBlock]:
+    """Give the staged rows without id_perangkat numbers from one reserved block, in file order
+    
+    Runs after the staging checks, on the rows left to insert. Counted and numbered in
+    the staging table, so the file is read only once. Built as
+    IdAssignment does; the reservation is rolled back with everything else on a dry run
+    or failure.
+    """
+    cur.execute(f"SELECT count(*) FROM {STAGING_TABLE} WHERE id_perangkat IS NULL")
+    missing = cur.fetchone()[0]
+    if not missing:
+        return None
+    cur.execute("SELECT * FROM reserve_id_perangkat_block(%s)", (missing,))
+    block = IdBlock(*cur.fetchone())
+    cur.execute(f"""WITH numbered AS (
+            SELECT row_num, lpad((%s + row_number() OVER (ORDER BY row_num) - 1)::text, 4, '0') AS urutan
+            FROM {STAGING_TABLE}
+            WHERE id_perangkat IS NULL
+        )
+        UPDATE {STAGING_TABLE} s
+        SET id_perangkat = s.jenis_perangkat_kode || '.' || %s || '.' || %s || '.' || n.urutan,
+            nama_perangkat = CASE WHEN btrim(COALESCE(s.nama_perangkat, '')) IN ('', '-') AND s.lokasi_kode IS NOT NULL
+                                  THEN s.lokasi_kode || '-' || n.urutan ELSE s.nama_perangkat END
+        FROM numbered n
+        WHERE s.row_num = n.row_num""", (block.first_urutan, block.tahun, block.bulan))
+    return block
+
+def staging_rejects_sql(upsert: bool) -> str:
+    """Set-based checks on the staging table; returns (row_num, error_code, error_message) rows
+    
+    Covers what would otherwise abort the whole transaction: missing required values,
+    placeholder serial numbers (coded as the perangkat trigger raises them, see
+    ADD_SERIAL_NUMBER_UNIQUE_SAFE.sql), unknown references and id_perangkat / serial_number duplicates (within the file and
+    against existing perangkat). With upsert, an existing id_perangkat is not a conflict.
+    """
+    checks = [
+        # An empty id_perangkat is numbered afterwards (number_staging_rows())
+        f"""SELECT row_num, '23502', 'Missing required value: ' || concat_ws(', ',
+                CASE WHEN jenis_perangkat_kode IS NULL THEN 'jenis_perangkat_kode' END,
+                CASE WHEN lokasi_kode IS NULL THEN 'lokasi_kode' END)
+            FROM {STAGING_TABLE}
+            WHERE jenis_perangkat_kode IS NULL OR lokasi_kode IS NULL""",
+        f"""SELECT row_num, '{PLACEHOLDER_SERIAL_CODE}', 'serial_number ' || COALESCE(serial_number, '(empty)')
+                   || ': placeholder, refused by the perangkat trigger'
+            FROM {STAGING_TABLE}
+            WHERE serial_number IS NULL OR serial_number = '-'""",
+        # Text comparison, so malformed UUIDs are reported instead of failing the cast; Postgres prints
+        # UUIDs in lowercase, and the ::uuid cast on insert accepts either case
+        f"""SELECT s.row_num, 'MISSING_REFERENCE', 'Unknown ' || concat_ws(', ',
+                CASE WHEN s.petugas_id IS NOT NULL AND pr.id IS NULL THEN 'petugas_id=' || s.petugas_id END,
+                CASE WHEN s.jenis_barang_id IS NOT NULL AND jb.id IS NULL THEN 'jenis_barang_id=' || s.jenis_barang_id END,
+                CASE WHEN s.jenis_perangkat_kode IS NOT NULL AND jp.kode IS NULL
+                     THEN 'jenis_perangkat_kode=' || s.jenis_perangkat_kode END,
+                CASE WHEN s.lokasi_kode IS NOT NULL AND l.kode IS NULL THEN 'lokasi_kode=' || s.lokasi_kode END)
+            FROM {STAGING_TABLE} s
+            LEFT JOIN profiles pr ON pr.id::text = lower(s.petugas_id)
+            LEFT JOIN ms_jenis_barang jb ON jb.id::text = lower(s.jenis_barang_id)
+            LEFT JOIN ms_jenis_perangkat jp ON jp.kode = s.jenis_perangkat_kode
+            LEFT JOIN ms_lokasi l ON l.kode = s.lokasi_kode
+            WHERE (s.petugas_id IS NOT NULL AND pr.id IS NULL)
+               OR (s.jenis_barang_id IS NOT NULL AND jb.id IS NULL)
+               OR (s.jenis_perangkat_kode IS NOT NULL AND jp.kode IS NULL)
+               OR (s.lokasi_kode IS NOT NULL AND l.kode IS NULL)""",
+        f"""SELECT row_num, '23505', 'Duplicate id_perangkat in file: ' || id_perangkat
+            FROM (SELECT row_num, id_perangkat,
+                         row_number() OVER (PARTITION BY id_perangkat ORDER BY row_num) AS n
+                  FROM {STAGING_TABLE} WHERE id_perangkat IS NOT NULL) d
+            WHERE n > 1""",
+        f"""SELECT row_num, '23505', 'Duplicate serial_number in file: ' || serial_number
+            FROM (SELECT row_num, serial_number,
+                         row_number() OVER (PARTITION BY serial_number ORDER BY row_num) AS n
+                  FROM {STAGING_TABLE} WHERE serial_number IS NOT NULL AND serial_number <> '-') d
+            WHERE n > 1""",
+        f"""SELECT s.row_num, '23505', 'serial_number already exists: ' || s.serial_number
+                   || ' (' || p.id_perangkat || ')'
+            FROM {STAGING_TABLE} s JOIN perangkat p ON p.serial_number = s.serial_number
+            WHERE p.id_perangkat IS DISTINCT FROM s.id_perangkat""",
+    ]
+    if not upsert:
+        checks.append(
+            f"""SELECT s.row_num, '23505', 'id_perangkat already exists: ' || s.id_perangkat
+                FROM {STAGING_TABLE} s JOIN perangkat p ON p.id_perangkat = s.id_perangkat""")
+    return '\nUNION ALL\n'.join(checks) + '\nORDER BY 1'
+
+def write_perangkat_from_staging(cur, upsert: bool) -> Tuple[int, int]:
+    """Insert staged rows into perangkat; with upsert, update existing id_perangkat first
+    
+    The upsert is an UPDATE followed by an INSERT of the remaining rows rather than
+    ON CONFLICT: the BEFORE INSERT trigger rejects a known serial_number before the
+    conflict is even detected. Returns (inserted, updated).
+    """
+    updated = 0
+    if upsert:
+        updates = ', '.join(f"{c} = s.{c}{PERANGKAT_CASTS.get(c, '')}"
+                            for c in PERANGKAT_COLUMNS if c != 'id_perangkat')
+        cur.execute(f"""UPDATE perangkat p SET {updates}
+            FROM {STAGING_TABLE} s WHERE p.id_perangkat = s.id_perangkat""")
+        updated = cur.rowcount
+    
+    columns = ', '.join(PERANGKAT_COLUMNS)
+    values = ', '.join(c + PERANGKAT_CASTS.get(c, '') for c in PERANGKAT_COLUMNS)
+    cur.execute(f"""INSERT INTO perangkat ({columns})
+        SELECT {values} FROM {STAGING_TABLE} s
+        WHERE NOT EXISTS (SELECT 1 FROM perangkat p WHERE p.id_perangkat = s.id_perangkat)
+        ORDER BY row_num""")
+    return cur.rowcount, updated
+
+def import_perangkat_via_copy(csv_file: str, dsn: str, dry_run: bool = False, upsert: bool = False,
+                              rejects_file: Optional[str] = None):
+    """Import perangkat data with COPY into a staging table and set-based INSERT ... SELECT
+    
+    Rows are transformed exactly as in the REST engine (build_records) and streamed into a
+    temporary table, checked there in a few queries, then copied into perangkat and
+    perangkat_storage (replacing the storage of updated rows when upserting). Everything
+    runs in one transaction: either all valid rows land or none do. Rows that fail the
+    checks are written to rejects_file. Rows without id_perangkat are numbered from a block
+    reserved in the same transaction. Returns the run totals (see import_totals()).
+    """
+    
+    print(f"📂 Reading CSV file: {display_name(csv_file)}")
+    
+    if rejects_file is None and not dry_run:
+        rejects_file = default_rejects_file(csv_file)
+    stats = new_import_stats()
+    rejected = {}
+    updated = 0
+    conn = connect_postgres(dsn)
+    
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"""CREATE TEMP TABLE {STAGING_TABLE} (
+                row_num INTEGER PRIMARY KEY,
+                {', '.join(c + ' TEXT' for c in PERANGKAT_COLUMNS)},
+                ssd TEXT,
+                hdd TEXT
+            ) ON COMMIT DROP""")
             
-            if perangkat_result.data:
-                storage_entry = {
-                    'perangkat_id': perangkat_result.data['id'],
-                    'jenis_storage': storage['jenis_storage'],
-                    'kapasitas': storage['kapasitas']
-                }
-                supabase.table('perangkat_storage').insert(storage_entry).execute()
-                storage_inserted += 1
-            else:
-                print(f"   ⚠️  Warning: Could not find perangkat with id_perangkat: {storage['id_perangkat']}")
-                storage_failed += 1
-        except Exception as e:
-            storage_failed += 1
-            print(f"   ❌ Failed to insert storage for {storage['id_perangkat']}: {str(e)}")
+            with open(csv_file, 'rb') as f:
+                with METRICS.stage('sniff'):
+                    date_parser = sample_date_parser(f)
+                    reader, lines, _ = open_csv_stream(f, verbose=True)
+                rejects = RejectsWriter(rejects_file, reader.fieldnames, reader.reader.dialect.delimiter)
+                
+                def counted(rows: Iterable[ParsedRow]) -> Iterator[List]:
+                    for r in rows:
+                        stats['parsed'] += 1
+                        stats['storage_parsed'] += len(r.storage)
+                        yield staging_row(r)
+                
+                started = time.perf_counter()
+                columns = ', '.join(['row_num'] + PERANGKAT_COLUMNS + ['ssd', 'hdd'])
+                stream = CopyRowStream(counted(iter_parsed_rows(reader, lines, rejects, parse_date=date_parser)))
+                with METRICS.stage('copy'):
+                    cur.copy_expert(f"COPY {STAGING_TABLE} ({columns}) FROM STDIN WITH (FORMAT csv)", stream)
+                METRICS.add_rows('copy', stats['parsed'], stream.bytes_sent)
+                print(f"📥 Copied {stats['parsed']} rows into staging in {time.perf_counter() - started:.2f}s")
+            
+            with METRICS.stage('validate'):
+                cur.execute(f"ANALYZE {STAGING_TABLE}")
+                cur.execute(staging_rejects_sql(upsert))
+                for row_num, code, message in cur.fetchall():
+                    rejected.setdefault(row_num, (code, message))
+                if rejected:
+                    cur.execute(f"DELETE FROM {STAGING_TABLE} WHERE row_num = ANY(%s)", (list(rejected),))
+                # Numbered last, so rejected rows use up no sequence numbers
+                block = number_staging_rows(cur)
+                if block:
+                    print_id_block(block)
+            METRICS.add_rows('validate', stats['parsed'])
+            
+            started = time.perf_counter()
+            with METRICS.stage('perangkat_insert'):
+                stats['inserted'], updated = write_perangkat_from_staging(cur, upsert)
+            METRICS.add_rows('perangkat_insert', stats['inserted'] + updated)
+            with METRICS.stage('storage_insert'):
+                if upsert:
+                    cur.execute(f"""DELETE FROM perangkat_storage ps
+                        USING perangkat p JOIN {STAGING_TABLE} s ON s.id_perangkat = p.id_perangkat
+                        WHERE ps.perangkat_id = p.id""")
+                cur.execute(f"""INSERT INTO perangkat_storage (perangkat_id, jenis_storage, kapasitas)
+                    SELECT p.id, v.jenis_storage, v.kapasitas
+                    FROM {STAGING_TABLE} s
+                    JOIN perangkat p ON p.id_perangkat = s.id_perangkat
+                    CROSS JOIN LATERAL (VALUES ('SSD', s.ssd), ('HDD', s.hdd)) AS v(jenis_storage, kapasitas)
+                    WHERE v.kapasitas IS NOT NULL
+                    ORDER BY s.row_num""")
+                stats['storage_inserted'] = cur.rowcount
+            METRICS.add_rows('storage_insert', stats['storage_inserted'])
+            print(f"📤 {'Upserted' if upsert else 'Inserted'} from staging in {time.perf_counter() - started:.2f}s")
+        
+        if dry_run:
+            conn.rollback()
+        else:
+            conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Import failed, transaction rolled back: {str(e)}")
+        sys.exit(1)
+    finally:
+        conn.close()
+    
+    # Staging rejects only carry row numbers; read their original rows back from the file
+    if rejected:
+        with open(csv_file, 'rb') as f:
+            reader, _, _ = open_csv_stream(f)
+            for row_num, row in enumerate(reader, start=2):
+                if row_num in rejected:
+                    rejects.add(row_num, row, *rejected[row_num])
+    rejects.close()
     
-    print(f"\n✅ Inserted {storage_inserted} storage records")
-    if storage_failed > 0:
-        print(f"❌ Failed to insert {storage_failed} storage records")
+    if rejects.count:
+        print(f"\n❌ Rejected {rejects.count} rows:")
+        for sample in rejects.samples:  # Show first 10 errors
+            print(f"   {sample}")
+        if rejects.count > len(rejects.samples):
+            print(f"   ... and {rejects.count - len(rejects.samples)} more errors")
+        if rejects.path:
+            print(f"📝 Rejected rows written to {rejects.path} (fix them and re-run the import on that file)")
+    
+    print(f"\n✅ Parsed {stats['parsed']} perangkat records")
+    print(f"✅ Prepared {stats['storage_parsed']} storage records")
+    for line in date_parser.summary():
+        print(line)
+    print()
+    
+    if dry_run:
+        print("🔍 DRY RUN MODE - Transaction rolled back, no data was inserted")
+        print(f"   Would insert {stats['inserted']} perangkat records")
+        if upsert:
+            print(f"   Would update {updated} perangkat records")
+        print(f"   Would insert {stats['storage_inserted']} storage records")
+        return import_totals(stats, rejects.count)
     
     # Final summary
     print("\n" + "="*60)
     print("📊 IMPORT SUMMARY")
     print("="*60)
-    print(f"Perangkat records: {inserted_count} inserted, {failed_count} failed")
-    print(f"Storage records:   {storage_inserted} inserted, {storage_failed} failed")
+    print(f"Perangkat records: {stats['inserted']} inserted, {updated} updated, {len(rejected)} rejected")
+    print(f"Storage records:   {stats['storage_inserted']} inserted")
+    if rejects.count > len(rejected):
+        print(f"Skipped rows:      {rejects.count - len(rejected)}")
     print("="*60)
+    return import_totals(stats, rejects.count)
+
+# --lint: the rules of the app's input forms, checked on the values as they would be imported
+# (after clean_value()). See src/components/MACAddressInput.jsx, IPAddressInput.jsx, StorageInput.jsx.
+MAC_PATTERN = re.compile(r'[0-9A-Fa-f]{2}(?:[:-][0-9A-Fa-f]{2}){5}')
+IPV4_PATTERN = re.compile(r'(\d{1,3})\.(\d{1,3})\.(\d{1,3})\.(\d{1,3})')
+# StorageInput takes digits only (GB); exports also carry a unit, e.g. '512 GB' or '1 TB'
+CAPACITY_PATTERN = re.compile(r'\d+(?:[.,]\d+)?\s*(?:GB|TB)?', re.IGNORECASE)
+UUID_PATTERN = re.compile(r'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}')
+# Columns build_records() cannot do without (id_perangkat may be empty, see IdAssignment)
+REQUIRED_COLUMNS = ['petugas_id', 'jenis_perangkat_kode', 'serial_number', 'lokasi_kode', 'jenis_barang']
+
+def is_ipv4(value: str) -> bool:
+    match = IPV4_PATTERN.fullmatch(value)
+    return bool(match) and all(int(octet) <= 255 for octet in match.groups())
+
+# CSV column -> (severity, rule, check). Errors make the import reject the row;
+# warnings are values the app's forms would not accept, imported as they are.
+LINT_RULES = {
+    'petugas_id': ('error', 'not a UUID', UUID_PATTERN.fullmatch),
+    'jenis_barang': ('error', 'not a UUID', UUID_PATTERN.fullmatch),
+    'mac_ethernet': ('warning', 'not a MAC address (XX:XX:XX:XX:XX:XX)', MAC_PATTERN.fullmatch),
+    'mac_wireless': ('warning', 'not a MAC address (XX:XX:XX:XX:XX:XX)', MAC_PATTERN.fullmatch),
+    'ip_ethernet': ('warning', 'not an IPv4 address (0-255 per octet)', is_ipv4),
+    'ip_wireless': ('warning', 'not an IPv4 address (0-255 per octet)', is_ipv4),
+    'Kapasitas SSD': ('warning', 'not a storage capacity (number, optional GB/TB)', CAPACITY_PATTERN.fullmatch),
+    'Kapasitas HDD': ('warning', 'not a storage capacity (number, optional GB/TB)', CAPACITY_PATTERN.fullmatch),
+}
+
+class LintReport:
+    """Lint findings aggregated per (severity, column, rule), with a few sample rows each"""
+    
+    SAMPLES = 5
+    
+    def __init__(self):
+        self.rows = 0
+        self.findings = {}  # (severity, column, rule) -> [count, [(row_num, value)]]
+        self.bad_rows = {'error': set(), 'warning': set()}
+    
+    def add(self, severity: str, column: str, rule: str, row_num: int, value: str):
+        finding = self.findings.setdefault((severity, column, rule), [0, []])
+        finding[0] += 1
+        if len(finding[1]) < self.SAMPLES:
+            finding[1].append((row_num, value))
+        self.bad_rows[severity].add(row_num)
+    
+    def count(self, severity: str) -> int:
+        return sum(n for (s, _, _), (n, _) in self.findings.items() if s == severity)
+    
+    def print(self):
+        for severity, title in (('error', '❌ Errors (the import would reject or lose these values)'),
+                                ('warning', '⚠️  Warnings (values the app\'s forms would not accept)')):
+            findings = sorted((k, v) for k, v in self.findings.items() if k[0] == severity)
+            if not findings:
+                continue
+            print(f"\n{title}: {self.count(severity)} in {len(self.bad_rows[severity])} rows")
+            table = [(column, rule, str(n), ', '.join(f"{row} ({value})" if value else str(row)
+                                                       for row, value in samples) + (' ...' if n > len(samples) else ''))
+                     for (_, column, rule), (n, samples) in findings]
+            headers = ('Column', 'Rule', 'Count', 'Rows')
+            widths = [max(len(h), *(len(r[i]) for r in table)) for i, h in enumerate(headers[:3])]
+            print("   " + " | ".join(h.ljust(w) for h, w in zip(headers, widths + [0])))
+            print("   " + "-+-".join('-' * w for w in widths + [4]))
+            for r in table:
+                print("   " + " | ".join(v.ljust(w) for v, w in zip(r, widths + [0])))
+
+def lint_csv(csv_file: str) -> LintReport:
+    """Check every row of csv_file offline in one pass: required values, UUIDs, dates,
+    duplicates within the file and the format rules of the app's forms"""
+    report = LintReport()
+    with open(csv_file, 'rb') as f:
+        date_parser = sample_date_parser(f)
+        reader, _, _ = open_csv_stream(f)
+        missing_columns = [c for c in REQUIRED_COLUMNS if c not in (reader.fieldnames or [])]
+        for column in missing_columns:
+            report.add('error', column, 'column missing from header', 1, '')
+        if missing_columns:
+            return report
+        
+        rules = [(column, rule) for column, rule in LINT_RULES.items() if column in reader.fieldnames]
+        first_seen = {'id_perangkat': {}, 'serial_number': {}}
+        for row_num, row in enumerate(reader, start=2):
+            report.rows += 1
+            for column in REQUIRED_COLUMNS:
+                if not clean_value(row[column]):
+                    report.add('error', column, "required (empty or '-')", row_num, '')
+            for column, (severity, rule, check) in rules:
+                value = clean_value(row[column])
+                if value and not check(value):
+                    report.add(severity, column, rule, row_num, value)
+            date = clean_value(row.get('tanggal_entry'))
+            if date and date_parser.parse(date) is None:
+                report.add('error', 'tanggal_entry', f"not a date ({date_parser.format_name} or ISO)", row_num, date)
+            for column, seen in first_seen.items():
+                value = clean_value(row.get(column))
+                if value and seen.setdefault(value, row_num) != row_num:
+                    report.add('error', column, 'duplicate within the file', row_num, f"{value}, also row {seen[value]}")
+    return report
+
+def run_lint(csv_file: str, strict: bool = False) -> int:
+    """--lint: check csv_file without Supabase or network; returns the exit code"""
+    started = time.perf_counter()
+    report = lint_csv(csv_file)
+    errors, warnings = report.count('error'), report.count('warning')
+    print(f"🔎 Lint {csv_file}: {report.rows} rows, {errors} errors, {warnings} warnings "
+          f"({time.perf_counter() - started:.2f}s)")
+    report.print()
+    return 1 if errors or (strict and warnings) else 0
 
 def main():
     """Main function"""
-    if len(sys.argv) < 2:
-        print("Usage: python import_perangkat_bulk.py <csv_file> [--dry-run] [--skip-validation]")
-        print("\nOptions:")
-        print("  --dry-run          : Validate and parse but don't insert data")
-        print("  --skip-validation  : Skip UUID validation (not recommended)")
-        sys.exit(1)
+    global LOG_LEVEL
+    parser = argparse.ArgumentParser(description='Bulk import perangkat data from a CSV export')
+    parser.add_argument('csv_files', nargs='+', metavar='csv_file',
+                        help="CSV files to import (semicolon, tab or comma separated), directories of them, "
+                             "glob patterns, or '-' for stdin; several files are imported as one job")
+    parser.add_argument('--dry-run', action='store_true', help="Validate and parse but don't insert data")
+    parser.add_argument('--lint', action='store_true',
+                        help='Only check the file offline (no Supabase, no network); exit code 1 on errors')
+    parser.add_argument('--strict', action='store_true', help='With --lint: warnings fail as well')
+    parser.add_argument('--skip-validation', action='store_true', help='Skip UUID validation (not recommended)')
+    parser.add_argument('--stream', action='store_true',
+                        help='Single pass over the file, validating references per batch')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f'Batches sent in parallel (default: {DEFAULT_WORKERS})')
+    parser.add_argument('--processes', type=int,
+                        help='Processes parsing CSV files in parallel when importing several files '
+                             '(default: number of CPU cores)')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                        help=f'Initial rows per batch, adapted between {MIN_BATCH_SIZE} and {MAX_BATCH_SIZE} '
+                             f'(default: {BATCH_SIZE})')
+    parser.add_argument('--rejects', metavar='FILE',
+                        help='Where to write rows that could not be imported (default: <csv_file>.rejects.csv)')
+    parser.add_argument('--resume', action='store_true',
+                        help='Skip batches already committed by an interrupted run (see --journal)')
+    parser.add_argument('--journal', metavar='FILE',
+                        help='Journal of committed batches (default: <csv_file>.journal.jsonl)')
+    parser.add_argument('--upsert', action='store_true',
+                        help='Update rows whose id_perangkat already exists instead of rejecting them')
+    parser.add_argument('--sync', action='store_true',
+                        help='Compare with the database and send only new rows and changed columns '
+                             '(with --dry-run: report what would change)')
+    parser.add_argument('--cache-file', default=REFERENCE_CACHE_FILE,
+                        help=f'On-disk cache of master data used for validation (default: {REFERENCE_CACHE_FILE})')
+    parser.add_argument('--cache-ttl', type=float, default=REFERENCE_CACHE_TTL,
+                        help=f'Seconds before cached master data is pulled again (default: {REFERENCE_CACHE_TTL})')
+    parser.add_argument('--refresh-cache', action='store_true', help='Ignore the master data cache and pull it again')
+    parser.add_argument('--no-preflight', action='store_true',
+                        help='Skip the id_perangkat / serial_number conflict check before importing')
+    parser.add_argument('--engine', choices=['rest', 'copy', 'async'], default='rest',
+                        help='rest: batched inserts through the Supabase API (default); '
+                             'copy: COPY into a staging table over a direct Postgres connection; '
+                             'async: concurrent requests to PostgREST over one keep-alive connection pool')
+    parser.add_argument('--dsn', default=DATABASE_URL,
+                        help='Postgres connection string for --engine copy (default: $DATABASE_URL)')
+    parser.add_argument('--report', metavar='FILE',
+                        help='Write a JSON report with per-stage timings, request counts and totals')
+    parser.add_argument('--prom-textfile', metavar='FILE',
+                        help='Write the run metrics as a Prometheus textfile (node_exporter textfile collector)')
+    parser.add_argument('--log-level', choices=list(LOG_LEVELS), default=LOG_LEVEL,
+                        help="debug: a line per batch and failed row; info: throttled progress (default)")
+    parser.add_argument('--quiet', action='store_true', help='Same as --log-level warning')
+    args = parser.parse_args()
     
-    csv_file = sys.argv[1]
-    dry_run = '--dry-run' in sys.argv
-    skip_validation = '--skip-validation' in sys.argv
+    LOG_LEVEL = 'warning' if args.quiet else args.log_level
     
-    if not os.path.exists(csv_file):
-        print(f"❌ ERROR: File not found: {csv_file}")
+    args.csv_files = expand_inputs(args.csv_files)
+    for csv_file in args.csv_files:
+        if not os.path.exists(csv_file):
+            print(f"❌ ERROR: File not found: {csv_file}")
+            sys.exit(1)
+    if not args.csv_files:
+        print("❌ ERROR: No CSV files found")
         sys.exit(1)
     
+    if args.lint:
+        sys.exit(max(run_lint(csv_file, strict=args.strict) for csv_file in args.csv_files))
+    
+    totals = {}
+    try:
+        totals = run_import(args)
+    finally:
+        METRICS.print_summary()
+        if args.report:
+            METRICS.write_json(args.report, totals)
+            print(f"📝 Run report written to {args.report}")
+        if args.prom_textfile:
+            METRICS.write_prometheus(args.prom_textfile, totals)
+    
+    print("\n✅ Import process completed!")
+
+def run_import(args: argparse.Namespace) -> Dict:
+    """Run the import selected on the command line; returns the run totals"""
+    if len(args.csv_files) > 1:
+        return run_multi_file_import(args)
+    csv_file = args.csv_files[0]
+    dry_run = args.dry_run
+    skip_validation = args.skip_validation
+    stream = args.stream
+    
     print("="*60)
     print("🚀 BULK IMPORT SCRIPT FOR PERANGKAT DATA")
     print("="*60)
-    print(f"CSV File: {csv_file}")
+    print(f"CSV File: {display_name(csv_file)}")
     print(f"Dry Run: {dry_run}")
+    print(f"Stream: {stream}")
+    print(f"Engine: {args.engine}")
+    if args.engine != 'copy':
+        print(f"Workers: {args.workers}")
+    if args.resume or args.upsert or args.sync:
+        print(f"Resume: {args.resume} | Upsert: {args.upsert} | Sync: {args.sync}")
     print("="*60 + "\n")
     
-    supabase = init_supabase()
+    if args.engine == 'copy':
+        if args.sync:
+            print("❌ ERROR: --sync works with --engine rest only (use --upsert with --engine copy)")
+            sys.exit(1)
+        # References and duplicates are checked set-based in the staging table
+        return import_perangkat_via_copy(csv_file, args.dsn, dry_run=dry_run, upsert=args.upsert,
+                                         rejects_file=args.rejects)
+    if args.engine == 'async' and args.sync:
+        print("❌ ERROR: --sync works with --engine rest only (use --upsert with --engine async)")
+        sys.exit(1)
     
-    # Validate UUIDs
-    if not skip_validation:
-        validation = validate_uuids(supabase, csv_file)
-        if not validation.get('valid', False):
-            reason = validation.get('reason', '')
-            if 'RLS' in reason:
-                print("\n⚠️  Validation failed due to RLS policy restrictions.")
-                print("   If you're certain the UUIDs exist in the database,")
-                print("   you can use --skip-validation to proceed.")
-                print("   The UUIDs will be validated during the actual insert.")
-                response = input("\n   Continue with --skip-validation? (y/n): ")
-                if response.lower() == 'y':
-                    skip_validation = True
-                    print("   ✅ Proceeding with validation skipped\n")
+    supabase = init_supabase()
+    METRICS.instrument(supabase)
+    # One keep-alive connection pool for validation and upload (see AsyncPostgrest)
+    client = AsyncPostgrest(SUPABASE_URL, SUPABASE_KEY, connections=args.workers) if args.engine == 'async' else None
+    try:
+        reference = ReferenceCache(supabase, path=args.cache_file, ttl=args.cache_ttl, refresh=args.refresh_cache,
+                                   client=client)
+        
+        # Validate UUIDs (streaming mode validates per batch during the import instead)
+        if stream and not skip_validation:
+            print("🔍 Streaming mode: references are validated per batch during import\n")
+        elif not skip_validation:
+            with METRICS.stage('validate'):
+                validation = validate_uuids(supabase, csv_file, reference)
+            if not validation.get('valid', False):
+                reason = validation.get('reason', '')
+                if 'RLS' in reason:
+                    print("\n⚠️  Validation failed due to RLS policy restrictions.")
+                    print("   If you're certain the UUIDs exist in the database,")
+                    print("   you can use --skip-validation to proceed.")
+                    print("   The UUIDs will be validated during the actual insert.")
+                    response = input("\n   Continue with --skip-validation? (y/n): ")
+                    if response.lower() == 'y':
+                        skip_validation = True
+                        print("   ✅ Proceeding with validation skipped\n")
+                    else:
+                        print("\n❌ Validation failed. Exiting.")
+                        sys.exit(1)
                 else:
-                    print("\n❌ Validation failed. Exiting.")
+                    print("\n❌ Validation failed. Please fix the errors above.")
                     sys.exit(1)
-            else:
-                print("\n❌ Validation failed. Please fix the errors above.")
-                sys.exit(1)
-    else:
-        print("⚠️  Skipping UUID validation (--skip-validation flag set)\n")
+        else:
+            print("⚠️  Skipping UUID validation (--skip-validation flag set)\n")
+        
+        # Rows that would hit a UNIQUE constraint are rejected up front instead of failing batches
+        # (on resume also rows committed after the journal's last entry, which are counted as done)
+        conflicts = None
+        if not args.no_preflight and (args.resume or not stream):
+            with METRICS.stage('preflight'):
+                # Existing id_perangkat are expected when syncing; serials owned by another device are not
+                conflicts = preflight_conflicts(supabase, csv_file, upsert=args.upsert or args.sync,
+                                                resume=args.resume)
+        
+        # Import data
+        return import_perangkat_from_csv(csv_file, supabase, dry_run=dry_run,
+                                         inline_validation=stream and not skip_validation,
+                                         workers=args.workers, batch_size=args.batch_size, rejects_file=args.rejects,
+                                         resume=args.resume, upsert=args.upsert, journal_file=args.journal,
+                                         reference=reference, conflicts=conflicts, sync=args.sync,
+                                         client=client)
+    finally:
+        if client:
+            client.close()
+
+def run_multi_file_import(args: argparse.Namespace) -> Dict:
+    """Import several CSV files as one job (see import_perangkat_from_files())"""
+    csv_files = args.csv_files
     
-    # Import data
-    import_perangkat_from_csv(csv_file, supabase, dry_run=dry_run)
+    print("="*60)
+    print("🚀 BULK IMPORT SCRIPT FOR PERANGKAT DATA")
+    print("="*60)
+    print(f"CSV Files: {len(csv_files)}")
+    for csv_file in csv_files:
+        print(f"   - {display_name(csv_file)}")
+    print(f"Dry Run: {args.dry_run}")
+    print(f"Workers: {args.workers}")
+    if args.upsert or args.sync:
+        print(f"Upsert: {args.upsert} | Sync: {args.sync}")
+    print("="*60 + "\n")
     
-    print("\n✅ Import process completed!")
+    # Rejects go next to each file (<csv>.rejects.csv); journals and COPY are per file
+    for option, given in (('--engine copy', args.engine == 'copy'), ('--resume', args.resume),
+                          ('--journal', args.journal), ('--rejects', args.rejects)):
+        if given:
+            print(f"❌ ERROR: {option} works with a single CSV file only")
+            sys.exit(1)
+    if args.engine == 'async' and args.sync:
+        print("❌ ERROR: --sync works with --engine rest only (use --upsert with --engine async)")
+        sys.exit(1)
+    
+    supabase = init_supabase()
+    METRICS.instrument(supabase)
+    # One keep-alive connection pool for validation and upload (see AsyncPostgrest)
+    client = AsyncPostgrest(SUPABASE_URL, SUPABASE_KEY, connections=args.workers) if args.engine == 'async' else None
+    try:
+        reference = ReferenceCache(supabase, path=args.cache_file, ttl=args.cache_ttl, refresh=args.refresh_cache,
+                                   client=client)
+        if args.skip_validation:
+            print("⚠️  Skipping UUID validation (--skip-validation flag set)\n")
+        else:
+            print("🔍 References are validated per file against one shared master data cache\n")
+        
+        return import_perangkat_from_files(csv_files, supabase, dry_run=args.dry_run,
+                                           validate=not args.skip_validation, preflight=not args.no_preflight,
+                                           workers=args.workers, batch_size=args.batch_size,
+                                           processes=args.processes, upsert=args.upsert, sync=args.sync,
+                                           reference=reference, client=client)
+    finally:
+        if client:
+            client.close()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Bulk Mutasi Script for Perangkat
+Moves many perangkat to new locations from a CSV (id_perangkat or serial_number ->
+lokasi_baru_kode) with one set-based mutasi_perangkat_bulk() call per chunk
+(see ADD_MUTASI_PERANGKAT_BULK.sql)
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import os
+import sys
+import time
+from collections import Counter
+from typing import TYPE_CHECKING, Dict, List, NamedTuple, Optional
+
+from import_perangkat_bulk import (METRICS, REFERENCE_CACHE_FILE, REFERENCE_CACHE_TTL, ReferenceCache, clean_value,
+                                   error_code_of, error_message_of, execute_with_retry, init_supabase, iter_batches,
+                                   log, open_csv_reader, select_in_chunks)
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+CHUNK_SIZE = 500  # Moves per mutasi_perangkat_bulk() call
+MAX_CHUNK_SIZE = 5000  # Keeps one call well inside the statement timeout
+PERMISSION_DENIED = '42501'
+RESULT_COLUMNS = ['row', 'id_perangkat', 'serial_number', 'lokasi_baru_kode', 'status', 'message',
+                  'nama_perangkat_lama', 'nama_perangkat_baru', 'lokasi_lama_kode']
+# Statuses that count as done (nothing left to fix in the CSV)
+DONE_STATUSES = {'moved', 'same_lokasi'}
+
+class MutasiItem(NamedTuple):
+    """One move from the CSV"""
+    row_num: int
+    id_perangkat: Optional[str]
+    serial_number: Optional[str]
+    lokasi_baru_kode: Optional[str]
+    keterangan: Optional[str]
+    
+    def payload(self) -> Dict:
+        item = {'lokasi_baru_kode': self.lokasi_baru_kode}
+        if self.id_perangkat:
+            item['id_perangkat'] = self.id_perangkat
+        else:
+            item['serial_number'] = self.serial_number
+        if self.keterangan:
+            item['keterangan'] = self.keterangan
+        return item
+
+class ResultsWriter:
+    """Per-row outcomes of a run, written as they arrive (semicolon CSV, like the rejects files)"""
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.counts = Counter()
+        self.samples = []  # First 10 rows that were not moved, for the summary
+        self._file = open(path, 'w', encoding='utf-8', newline='')
+        self._writer = csv.DictWriter(self._file, fieldnames=RESULT_COLUMNS, delimiter=';')
+        self._writer.writeheader()
+    
+    def add(self, item: MutasiItem, status: str, message: str, outcome: Optional[Dict] = None):
+        outcome = outcome or {}
+        self.counts[status] += 1
+        if status not in DONE_STATUSES and len(self.samples) < 10:
+            self.samples.append(f"Row {item.row_num}: [{status}] {item.id_perangkat or item.serial_number or '-'}: {message}")
+        self._writer.writerow({
+            'row': item.row_num,
+            'id_perangkat': outcome.get('id_perangkat') or item.id_perangkat or '',
+            'serial_number': item.serial_number or '',
+            'lokasi_baru_kode': item.lokasi_baru_kode or '',
+            'status': status,
+            'message': message,
+            'nama_perangkat_lama': outcome.get('nama_perangkat_lama') or '',
+            'nama_perangkat_baru': outcome.get('nama_perangkat_baru') or '',
+            'lokasi_lama_kode': outcome.get('lokasi_lama_kode') or '',
+        })
+    
+    def close(self):
+        self._file.close()
+
+def read_mutasi_csv(csv_file: str, results: ResultsWriter) -> List[MutasiItem]:
+    """Read the moves; rows that cannot be sent go straight to results
+    
+    A row needs lokasi_baru_kode and id_perangkat or serial_number (id_perangkat wins when
+    both are given). When the same id_perangkat / serial_number appears again, the first
+    row is kept; a perangkat named by id_perangkat in one row and by serial_number in
+    another is caught by drop_duplicate_perangkat().
+    """
+    items = []
+    first_seen = {}  # id_perangkat / serial_number -> row of its first move
+    with open(csv_file, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = open_csv_reader(f, verbose=True)
+        columns = set(reader.fieldnames or [])
+        if 'lokasi_baru_kode' not in columns or not columns & {'id_perangkat', 'serial_number'}:
+            print("❌ ERROR: The CSV needs a lokasi_baru_kode column and an id_perangkat or serial_number column")
+            sys.exit(1)
+        for row_num, row in enumerate(reader, start=2):
+            item = MutasiItem(row_num, clean_value(row.get('id_perangkat')), clean_value(row.get('serial_number')),
+                              clean_value(row.get('lokasi_baru_kode')), clean_value(row.get('keterangan')))
+            key = item.id_perangkat or item.serial_number
+            if not key:
+                results.add(item, 'invalid', 'id_perangkat or serial_number is required')
+            elif not item.lokasi_baru_kode:
+                results.add(item, 'invalid', 'lokasi_baru_kode is required')
+            elif key in first_seen:
+                results.add(item, 'duplicate', f"{key} is already moved by row {first_seen[key]}")
+            else:
+                first_seen[key] = row_num
+                items.append(item)
+    return items
+
+def drop_duplicate_perangkat(supabase: Client, items: List[MutasiItem],
+                             results: ResultsWriter) -> List[MutasiItem]:
+    """Keep the first move of each perangkat, whichever key the rows name it by
+    
+    The keys are resolved to perangkat.id with chunked lookups, as mutasi_perangkat_bulk()
+    only sees the duplicates within one chunk. Rows whose key is not found are kept; the
+    server reports them as not_found.
+    """
+    ids = {r['id_perangkat']: r['id'] for r in select_in_chunks(
+        supabase, 'perangkat', 'id_perangkat', [i.id_perangkat for i in items if i.id_perangkat],
+        select='id, id_perangkat')}
+    serials = {r['serial_number']: r['id'] for r in select_in_chunks(
+        supabase, 'perangkat', 'serial_number', [i.serial_number for i in items if not i.id_perangkat],
+        select='id, serial_number')}
+    first_move = {}  # perangkat.id -> row of its first move
+    kept = []
+    for item in items:
+        perangkat_id = ids.get(item.id_perangkat) if item.id_perangkat else serials.get(item.serial_number)
+        first = first_move.setdefault(perangkat_id, item.row_num) if perangkat_id else item.row_num
+        if first != item.row_num:
+            results.add(item, 'duplicate', f"{item.id_perangkat or item.serial_number} is the same perangkat "
+                                           f"as row {first}, which already moves it")
+        else:
+            kept.append(item)
+    return kept
+
+def reject_unknown_lokasi(items: List[MutasiItem], reference: ReferenceCache,
+                          results: ResultsWriter) -> List[MutasiItem]:
+    """Check every lokasi_baru_kode against the cached ms_lokasi, in memory"""
+    missing = reference.missing('ms_lokasi', 'kode', {item.lokasi_baru_kode for item in items})
+    if not missing:
+        return items
+    kept = []
+    for item in items:
+        if item.lokasi_baru_kode in missing:
+            results.add(item, 'lokasi_not_found', f"Lokasi dengan kode {item.lokasi_baru_kode} tidak ditemukan")
+        else:
+            kept.append(item)
+    return kept
+
+def mutasi_chunk(supabase: Client, chunk: List[MutasiItem], keterangan: Optional[str],
+                 created_by: Optional[str], dry_run: bool) -> Dict[int, Dict]:
+    """Move one chunk with a single mutasi_perangkat_bulk() call; returns the outcomes by item_index
+    
+    item_index is the 1-based position of the item in the chunk.
+    A retried call that had already committed is harmless: its rows come back as same_lokasi.
+    """
+    params = {'p_items': [item.payload() for item in chunk], 'p_keterangan': keterangan,
+              'p_created_by': created_by, 'p_dry_run': dry_run}
+    result = execute_with_retry(lambda: supabase.rpc('mutasi_perangkat_bulk', params).execute())
+    return {r['item_index']: r for r in result.data or []}
+
+def mutasi_perangkat_bulk(supabase: Client, items: List[MutasiItem], results: ResultsWriter,
+                          chunk_size: int = CHUNK_SIZE, keterangan: Optional[str] = None,
+                          created_by: Optional[str] = None, dry_run: bool = False) -> Dict:
+    """Send the moves in chunks; returns the number of chunks and moves sent
+    
+    Each chunk costs one round trip and three statements on the server (permission check,
+    UPDATE, history INSERT), whatever its size. A failed chunk marks its rows as error and
+    the run continues; a permission error stops it, as every later chunk would fail too.
+    A row the server returned no outcome for is marked as error as well.
+    """
+    stats = {'chunks': 0, 'sent': 0}
+    started = time.perf_counter()
+    last_progress = started
+    for chunk in iter_batches(items, chunk_size):
+        with METRICS.stage('mutasi'):
+            try:
+                outcomes = mutasi_chunk(supabase, chunk, keterangan, created_by, dry_run)
+            except Exception as e:
+                if error_code_of(e) == PERMISSION_DENIED:
+                    raise
+                log('error', f"   ❌ Chunk {stats['chunks'] + 1} failed: {error_message_of(e)}")
+                failed = {'status': 'error', 'message': f"[{error_code_of(e)}] {error_message_of(e)}"}
+                outcomes = {i: failed for i in range(1, len(chunk) + 1)}
+            METRICS.add_rows('mutasi', len(chunk))
+        for i, item in enumerate(chunk, start=1):
+            outcome = outcomes.get(i)
+            if outcome:
+                results.add(item, outcome['status'], outcome['message'], outcome)
+            else:
+                results.add(item, 'error', 'No outcome returned by mutasi_perangkat_bulk() for this row')
+        stats['chunks'] += 1
+        stats['sent'] += len(chunk)
+        if time.perf_counter() - last_progress >= 5:
+            last_progress = time.perf_counter()
+            rate = stats['sent'] / (last_progress - started)
+            log('info', f"   ⏱️  {stats['sent']}/{len(items)} moves sent | {rate:.0f} rows/s")
+    stats['seconds'] = time.perf_counter() - started
+    return stats
+
+def print_mutasi_results(results: ResultsWriter, stats: Dict, results_file: str, dry_run: bool = False):
+    """Print the outcome counts of a run"""
+    counts = results.counts
+    moved = 'would be moved' if dry_run else 'moved'
+    rate = stats['sent'] / stats['seconds'] if stats['seconds'] else 0
+    print("\n" + "="*60)
+    print("📊 MUTASI SUMMARY")
+    print("="*60)
+    print(f"Perangkat {moved}: {counts['moved']}")
+    for status in sorted(counts):
+        if status != 'moved':
+            print(f"{status + ':':<18} {counts[status]}")
+    print(f"Server calls:      {stats['chunks']} ({rate:.0f} rows/s)")
+    print("="*60)
+    for sample in results.samples:
+        print(f"   {sample}")
+    print(f"📝 Outcome of every row written to {results_file}")
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Move many perangkat to new locations from a CSV')
+    parser.add_argument('csv_file', help='CSV with lokasi_baru_kode and id_perangkat or serial_number '
+                                         '(optional keterangan per row); semicolon, tab or comma separated')
+    parser.add_argument('--keterangan', help='Keterangan for rows without their own')
+    parser.add_argument('--petugas-id', metavar='UUID',
+                        help='Profile recorded as created_by when running with the service role key '
+                             '(must be an Administrator or Koordinator IT Support)')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help=f'Moves per server call (default: {CHUNK_SIZE}, max {MAX_CHUNK_SIZE})')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Check every row on the server without moving anything')
+    parser.add_argument('--results', metavar='FILE',
+                        help='Where to write the outcome of every row (default: <csv_file>.mutasi.csv)')
+    parser.add_argument('--cache-file', default=REFERENCE_CACHE_FILE,
+                        help=f'On-disk cache of master data (default: {REFERENCE_CACHE_FILE})')
+    parser.add_argument('--cache-ttl', type=float, default=REFERENCE_CACHE_TTL,
+                        help=f'Seconds before cached master data is pulled again (default: {REFERENCE_CACHE_TTL})')
+    parser.add_argument('--refresh-cache', action='store_true', help='Ignore the master data cache and pull it again')
+    parser.add_argument('--report', metavar='FILE', help='Write a JSON report with timings and request counts')
+    args = parser.parse_args()
+    
+    if not os.path.exists(args.csv_file):
+        print(f"❌ ERROR: File not found: {args.csv_file}")
+        sys.exit(1)
+    chunk_size = min(max(args.chunk_size, 1), MAX_CHUNK_SIZE)
+    results_file = args.results or os.path.splitext(args.csv_file)[0] + '.mutasi.csv'
+    
+    print("="*60)
+    print("🚚 BULK MUTASI SCRIPT FOR PERANGKAT")
+    print("="*60)
+    print(f"CSV File: {args.csv_file}")
+    print(f"Dry Run: {args.dry_run}")
+    print(f"Chunk Size: {chunk_size}")
+    print("="*60 + "\n")
+    
+    supabase = init_supabase()
+    METRICS.instrument(supabase)
+    reference = ReferenceCache(supabase, path=args.cache_file, ttl=args.cache_ttl, refresh=args.refresh_cache)
+    results = ResultsWriter(results_file)
+    stats = {'chunks': 0, 'sent': 0, 'seconds': 0.0}
+    try:
+        with METRICS.stage('validate'):
+            items = read_mutasi_csv(args.csv_file, results)
+            items = reject_unknown_lokasi(items, reference, results)
+            items = drop_duplicate_perangkat(supabase, items, results)
+            METRICS.add_rows('validate', sum(results.counts.values()) + len(items))
+        print(f"✅ {len(items)} moves to send ({sum(results.counts.values())} rows rejected locally)\n")
+    
+        action = 'Checking' if args.dry_run else 'Moving'
+        print(f"📤 {action} {len(items)} perangkat in chunks of {chunk_size}...")
+        stats = mutasi_perangkat_bulk(supabase, items, results, chunk_size=chunk_size, keterangan=args.keterangan,
+                                      created_by=args.petugas_id, dry_run=args.dry_run)
+        print_mutasi_results(results, stats, results_file, args.dry_run)
+    except Exception as e:
+        if error_code_of(e) != PERMISSION_DENIED:
+            raise
+        print(f"\n❌ ERROR: {error_message_of(e)}")
+        print("💡 With the service role key, pass --petugas-id of an Administrator or Koordinator IT Support")
+        sys.exit(1)
+    finally:
+        results.close()
+        METRICS.print_summary()
+        if args.report:
+            METRICS.write_json(args.report, dict(results.counts, **stats))
+            print(f"📝 Run report written to {args.report}")
+    
+    if args.dry_run:
+        print("\n🔍 DRY RUN - nothing was moved")
+    print("\n✅ Mutasi process completed!")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+Stock Opname Reconciliation for Perangkat
+Compares a scan file (serial_number or id_perangkat + scanned lokasi_kode) with perangkat
+and classifies every device as found, missing, unexpected or found in the wrong location
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import time
+from collections import Counter
+from typing import TYPE_CHECKING, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from import_perangkat_bulk import (FETCH_PAGE_SIZE, LOOKUP_CHUNK_SIZE, METRICS, REFERENCE_CACHE_FILE,
+                                   REFERENCE_CACHE_TTL, ReferenceCache, clean_value, error_code_of, execute_with_retry,
+                                   init_supabase, is_serial_placeholder, log, open_csv_reader, select_in_chunks,
+                                   write_atomic)
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+SELECT = 'id_perangkat, serial_number, nama_perangkat, lokasi_kode, status_perangkat'
+REPORT_COLUMNS = ['status', 'id_perangkat', 'serial_number', 'nama_perangkat', 'status_perangkat',
+                  'lokasi_kode', 'lokasi_scan', 'scan_row', 'scan_count']
+STATUSES = ['found', 'wrong_location', 'missing', 'unexpected']
+SERIAL_LOOKUP_FUNCTION = 'find_perangkat_by_serial'  # ADD_PERANGKAT_SERIAL_LOOKUP.sql
+FUNCTION_NOT_FOUND = 'PGRST202'
+
+class Scan(NamedTuple):
+    """First scan of a device; later scans of the same device only add to count"""
+    row_num: int
+    key: str  # id_perangkat, or serial_key() of the serial number
+    value: str  # As scanned, for lookups in the database
+    by_serial: bool
+    lokasi_scan: Optional[str]
+    count: int = 1
+
+def serial_key(serial: str) -> str:
+    """Serials compare without surrounding spaces; case is kept, as serial_number is unique
+    case-sensitively (a match ignoring case is only a fallback, see DeviceIndex.get())"""
+    return serial.strip()
+
+def read_scans(scan_file: str, default_lokasi: Optional[str] = None) -> Tuple[Dict[str, Scan], int, int]:
+    """Stream the scan file into {key: Scan}; returns the scans, rows read and rows without a key
+    
+    Each row is identified by id_perangkat or, when that is empty or '-', by serial_number.
+    The scanned location comes from lokasi_kode (or lokasi_scan), else from default_lokasi.
+    """
+    scans = {}
+    rows = skipped = 0
+    with open(scan_file, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = open_csv_reader(f, verbose=True)
+        columns = set(reader.fieldnames or [])
+        if not columns & {'id_perangkat', 'serial_number'}:
+            print("❌ ERROR: The scan file needs an id_perangkat or serial_number column")
+            sys.exit(1)
+        lokasi_column = 'lokasi_kode' if 'lokasi_kode' in columns else 'lokasi_scan'
+        for row_num, row in enumerate(reader, start=2):
+            rows += 1
+            id_perangkat = clean_value(row.get('id_perangkat'))
+            serial = clean_value(row.get('serial_number'))
+            if id_perangkat:
+                key, value, by_serial = id_perangkat, id_perangkat, False
+            elif not is_serial_placeholder(serial):
+                key, value, by_serial = serial_key(serial), serial, True
+            else:
+                skipped += 1
+                continue
+            scan = scans.get(key)
+            if scan:
+                scans[key] = scan._replace(count=scan.count + 1)
+            else:
+                scans[key] = Scan(row_num, key, value, by_serial,
+                                  clean_value(row.get(lokasi_column)) or default_lokasi)
+    return scans, rows, skipped
+
+def iter_perangkat(supabase: Client, lokasi: Optional[List[str]],
+                   page_size: int = FETCH_PAGE_SIZE) -> Iterator[List[Dict]]:
+    """Page through the perangkat of the counted locations, keyset-ordered by id_perangkat
+    
+    The lokasi_kode filter is served by idx_perangkat_lokasi_kode; lokasi=None fetches all.
+    """
+    if lokasi is not None and not lokasi:
+        return
+    last_key = None
+    while True:
+        def request():
+            query = supabase.table('perangkat').select(SELECT)
+            if lokasi is not None:
+                query = query.in_('lokasi_kode', lokasi)
+            if last_key is not None:
+                query = query.gt('id_perangkat', last_key)
+            return query.order('id_perangkat').limit(page_size).execute()
+    
+        page = execute_with_retry(request).data
+        if not page:
+            return
+        yield page
+        last_key = page[-1]['id_perangkat']
+
+class DeviceIndex:
+    """Hash index of perangkat by id_perangkat, by serial_number and by lowercased serial_number"""
+    
+    def __init__(self):
+        self.by_id = {}
+        self.by_serial = {}
+        self.by_lower_serial = {}  # lower(serial) -> {id_perangkat: record}
+    
+    def add(self, record: Dict):
+        self.by_id[record['id_perangkat']] = record
+        if not is_serial_placeholder(record.get('serial_number')):
+            key = serial_key(record['serial_number'])
+            self.by_serial[key] = record
+            self.by_lower_serial.setdefault(key.lower(), {})[record['id_perangkat']] = record
+    
+    def get(self, scan: Scan, exact: bool = False) -> Optional[Dict]:
+        """The scanned device; a serial without an exact match matches the one device whose
+        serial differs only in case (none if several do), unless exact"""
+        if not scan.by_serial:
+            return self.by_id.get(scan.key)
+        record = self.by_serial.get(scan.key)
+        if record is None and not exact:
+            candidates = self.by_lower_serial.get(scan.key.lower(), {})
+            if len(candidates) == 1:
+                record = next(iter(candidates.values()))
+        return record
+    
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+def ilike_any(column: str, values: List[str]) -> str:
+    """PostgREST or_() filter matching column case-insensitively against any of values
+    
+    LIKE wildcards in the values are escaped; PostgREST still reads * as %, so a serial
+    containing * may fetch extra rows, which DeviceIndex.get() does not match.
+    """
+    patterns = (re.sub(r'([\\%_])', r'\\\1', v) for v in values)
+    return ','.join(f'{column}.ilike."' + p.replace('\\', '\\\\').replace('"', '\\"') + '"' for p in patterns)
+
+def select_serials_ignoring_case(supabase: Client, serials: List[str]) -> List[Dict]:
+    """perangkat whose serial_number equals one of serials ignoring case (chunked lookups)
+    
+    Read with find_perangkat_by_serial(), served by the lower(serial_number) index of
+    ADD_PERANGKAT_SERIAL_LOOKUP.sql. Without that function it falls back to ILIKE filters,
+    a sequential scan of perangkat per chunk.
+    """
+    records = []
+    indexed = True
+    for i in range(0, len(serials), LOOKUP_CHUNK_SIZE):
+        chunk = serials[i:i+LOOKUP_CHUNK_SIZE]
+        if indexed:
+            try:
+                records.extend(execute_with_retry(
+                    lambda: supabase.rpc(SERIAL_LOOKUP_FUNCTION, {'p_serials': chunk}).execute()).data)
+                continue
+            except Exception as e:
+                if error_code_of(e) != FUNCTION_NOT_FOUND:
+                    raise
+                indexed = False
+                print(f"⚠️  {SERIAL_LOOKUP_FUNCTION}() not found; run ADD_PERANGKAT_SERIAL_LOOKUP.sql in the Supabase "
+                      f"SQL editor. Serials differing in case are looked up with ILIKE (one table scan per chunk)")
+        result = execute_with_retry(
+            lambda: supabase.table('perangkat').select(SELECT).or_(ilike_any('serial_number', chunk)).execute())
+        records.extend(result.data)
+    return records
+
+def lookup_elsewhere(supabase: Client, scans: List[Scan], index: DeviceIndex):
+    """Fetch scanned devices that are registered outside the counted locations (chunked lookups)
+    
+    Serials are looked up exactly (the unique index on serial_number); only those still
+    without an exact match are looked up ignoring case, as DeviceIndex.get() falls back to.
+    """
+    ids = [s.key for s in scans if not s.by_serial]
+    serials = [s.key for s in scans if s.by_serial]
+    for record in select_in_chunks(supabase, 'perangkat', 'id_perangkat', ids, select=SELECT):
+        index.add(record)
+    for record in select_in_chunks(supabase, 'perangkat', 'serial_number', serials, select=SELECT):
+        index.add(record)
+    inexact = [s.key for s in scans if s.by_serial and index.get(s, exact=True) is None]
+    if inexact:
+        for record in select_serials_ignoring_case(supabase, inexact):
+            index.add(record)
+
+def report_row(status: str, record: Optional[Dict], scan: Optional[Scan]) -> Dict:
+    record = record or {}
+    return {
+        'status': status,
+        'id_perangkat': record.get('id_perangkat') or (scan.value if scan and not scan.by_serial else ''),
+        'serial_number': record.get('serial_number') or (scan.value if scan and scan.by_serial else ''),
+        'nama_perangkat': record.get('nama_perangkat') or '',
+        'status_perangkat': record.get('status_perangkat') or '',
+        'lokasi_kode': record.get('lokasi_kode') or '',
+        'lokasi_scan': (scan.lokasi_scan or '') if scan else '',
+        'scan_row': scan.row_num if scan else '',
+        'scan_count': scan.count if scan else 0,
+    }
+
+def reconcile(supabase: Client, scans: Dict[str, Scan], lokasi: Optional[List[str]]) -> Tuple[List[Dict], Dict]:
+    """Classify every scanned device and every unscanned device of the counted locations
+    
+    found: scanned where it is registered; wrong_location: scanned, but registered elsewhere
+    (or scanned without a location); unexpected: not in perangkat at all; missing: registered
+    in a counted location but not scanned. perangkat is read with one paginated fetch of the
+    counted locations plus a chunked lookup of the scans that did not match it, so the number
+    of queries depends on the size of the locations, not on the number of scans.
+    Returns the report rows (scans in file order, then missing by location) and counts.
+    """
+    index = DeviceIndex()
+    with METRICS.stage('fetch'):
+        for page in iter_perangkat(supabase, lokasi):
+            for record in page:
+                index.add(record)
+            METRICS.add_rows('fetch', len(page))
+    counted = set(index.by_id)  # Devices expected in the counted locations
+    log('info', f"📦 {len(counted)} perangkat registered in the counted locations")
+    
+    # A serial matched only ignoring case may still have an exact match elsewhere
+    unmatched = [scan for scan in scans.values() if index.get(scan, exact=True) is None]
+    if unmatched:
+        with METRICS.stage('lookup'):
+            lookup_elsewhere(supabase, unmatched, index)
+            METRICS.add_rows('lookup', len(unmatched))
+    
+    with METRICS.stage('reconcile'):
+        rows = []
+        scanned = {}  # id_perangkat -> report row, so a device scanned by id and by serial is reported once
+        for scan in sorted(scans.values(), key=lambda s: s.row_num):
+            record = index.get(scan)
+            if record is None:
+                rows.append(report_row('unexpected', None, scan))
+                continue
+            row = scanned.get(record['id_perangkat'])
+            if row:
+                row['scan_count'] += scan.count
+                continue
+            status = 'found' if scan.lokasi_scan == record['lokasi_kode'] else 'wrong_location'
+            scanned[record['id_perangkat']] = row = report_row(status, record, scan)
+            rows.append(row)
+        missing = sorted((index.by_id[i] for i in counted - set(scanned)),
+                         key=lambda r: (r['lokasi_kode'] or '', r['id_perangkat']))
+        rows.extend(report_row('missing', record, None) for record in missing)
+        METRICS.add_rows('reconcile', len(rows))
+    
+    counts = Counter(r['status'] for r in rows)
+    per_lokasi = {}
+    for r in rows:
+        # Devices count where they were scanned, missing ones where they are registered
+        lokasi_kode = r['lokasi_scan'] if r['status'] != 'missing' else r['lokasi_kode']
+        entry = per_lokasi.setdefault(lokasi_kode or '-', dict.fromkeys(STATUSES, 0))
+        entry[r['status']] += 1
+    return rows, {'counts': {s: counts[s] for s in STATUSES}, 'per_lokasi': per_lokasi}
+
+def write_report_csv(path: str, rows: List[Dict]):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=REPORT_COLUMNS, delimiter=';')
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp_path, path)
+
+def print_summary(summary: Dict, scans: int, seconds: float):
+    counts = summary['counts']
+    print("\n" + "="*60)
+    print("📊 STOK OPNAME SUMMARY")
+    print("="*60)
+    print(f"Found:           {counts['found']}")
+    print(f"Wrong location:  {counts['wrong_location']}")
+    print(f"Missing:         {counts['missing']}")
+    print(f"Unexpected:      {counts['unexpected']}")
+    print(f"Reconciled {scans} scanned devices in {seconds:.2f}s")
+    print("="*60)
+    print(f"\n{'Lokasi':<16} " + ' '.join(f"{s:>14}" for s in STATUSES))
+    for lokasi_kode in sorted(summary['per_lokasi']):
+        entry = summary['per_lokasi'][lokasi_kode]
+        print(f"{lokasi_kode:<16} " + ' '.join(f"{entry[s]:>14}" for s in STATUSES))
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Reconcile a stock opname scan file against perangkat')
+    parser.add_argument('scan_file', help='CSV with id_perangkat or serial_number and the scanned lokasi_kode '
+                                          '(semicolon, tab or comma separated)')
+    parser.add_argument('--lokasi', metavar='KODE[,KODE...]',
+                        help='Locations being counted (default: every lokasi_kode in the scan file); '
+                             'their unscanned perangkat are reported as missing')
+    parser.add_argument('--all', action='store_true', help='Count every location (full stock opname)')
+    parser.add_argument('--default-lokasi', metavar='KODE',
+                        help='Scanned location for rows without one (e.g. a file scanned in one room)')
+    parser.add_argument('--output', metavar='FILE', help='CSV report (default: <scan_file>.opname.csv)')
+    parser.add_argument('--json', metavar='FILE', help='Also write the summary and every device as JSON')
+    parser.add_argument('--cache-file', default=REFERENCE_CACHE_FILE,
+                        help=f'On-disk cache of master data (default: {REFERENCE_CACHE_FILE})')
+    parser.add_argument('--cache-ttl', type=float, default=REFERENCE_CACHE_TTL,
+                        help=f'Seconds before cached master data is pulled again (default: {REFERENCE_CACHE_TTL})')
+    parser.add_argument('--report', metavar='FILE', help='Write a JSON report with timings and request counts')
+    args = parser.parse_args()
+    
+    if not os.path.exists(args.scan_file):
+        print(f"❌ ERROR: File not found: {args.scan_file}")
+        sys.exit(1)
+    output = args.output or os.path.splitext(args.scan_file)[0] + '.opname.csv'
+    
+    print("="*60)
+    print("📋 STOK OPNAME RECONCILIATION FOR PERANGKAT")
+    print("="*60)
+    print(f"Scan File: {args.scan_file}")
+    print("="*60 + "\n")
+    
+    started = time.perf_counter()
+    with METRICS.stage('parse'):
+        scans, rows, skipped = read_scans(args.scan_file, args.default_lokasi)
+        METRICS.add_rows('parse', rows)
+    print(f"✅ {rows} scan rows, {len(scans)} distinct id_perangkat / serial_number values")
+    if skipped:
+        print(f"⚠️  {skipped} rows without id_perangkat or serial_number ignored")
+    
+    scanned_lokasi = sorted({s.lokasi_scan for s in scans.values() if s.lokasi_scan})
+    if args.all:
+        lokasi = None
+    elif args.lokasi:
+        lokasi = sorted({k.strip() for k in args.lokasi.split(',') if k.strip()})
+    else:
+        lokasi = scanned_lokasi
+    print(f"📍 Counting {'all locations' if lokasi is None else ', '.join(lokasi) or 'no locations'}")
+    
+    supabase = init_supabase()
+    METRICS.instrument(supabase)
+    reference = ReferenceCache(supabase, path=args.cache_file, ttl=args.cache_ttl)
+    with METRICS.stage('validate'):
+        unknown = reference.missing('ms_lokasi', 'kode', set(scanned_lokasi) | set(lokasi or []))
+    if unknown:
+        print(f"⚠️  Unknown lokasi_kode (not in ms_lokasi): {', '.join(sorted(unknown))}")
+    
+    report_rows, summary = reconcile(supabase, scans, lokasi)
+    seconds = time.perf_counter() - started
+    
+    write_report_csv(output, report_rows)
+    if args.json:
+        write_atomic(args.json, json.dumps({'scan_file': args.scan_file, 'lokasi': lokasi, **summary,
+                                            'devices': report_rows}, indent=2))
+    print_summary(summary, len(report_rows) - summary['counts']['missing'], seconds)
+    print(f"\n📝 Report written to {output}" + (f" and {args.json}" if args.json else ''))
+    
+    METRICS.print_summary()
+    if args.report:
+        METRICS.write_json(args.report, summary['counts'])
+        print(f"📝 Run report written to {args.report}")
+    print("\n✅ Reconciliation completed!")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+"""Tests for the filter parsing of the fake PostgREST in benchmark_import_perangkat.py"""
+
+from benchmark_import_perangkat import like_regex, matches, parse_in_list, parse_or_list
+from stok_opname_reconcile import ilike_any
+
+SERIALS = ['SN1', 'a,b', 'x"y', 'p%q', 'r_s', 'back\\slash', 'with.dot']
+
+def test_parse_in_list_keeps_quoted_commas():
+    assert parse_in_list('(a,"b,c",d)') == ['a', 'b,c', 'd']
+
+def test_parse_or_list_splits_outside_quotes():
+    assert parse_or_list('(a.eq.1,b.ilike."x,y",c.is.null)') == [('a', 'eq.1'), ('b', 'ilike."x,y"'), ('c', 'is.null')]
+
+def test_like_regex_wildcards_and_escapes():
+    assert like_regex('ab%').match('ABCD')
+    assert like_regex('a*d').match('abcd')
+    assert like_regex('a_c').match('abc') and not like_regex('a_c').match('abbc')
+    assert like_regex('"a\\\\_c"').match('a_c') and not like_regex('"a\\\\_c"').match('abc')
+
+def test_ilike_any_round_trip_matches_only_its_own_values():
+    conditions = parse_or_list(f'({ilike_any("serial_number", SERIALS)})')
+    assert [column for column, _ in conditions] == ['serial_number'] * len(SERIALS)
+    for serial, (_, condition) in zip(SERIALS, conditions):
+        assert matches(serial, condition)
+        assert matches(serial.upper(), condition)
+        assert not matches(serial + 'x', condition)
+    # Escaped wildcards match only themselves
+    assert not any(matches('pXq', c) for _, c in conditions)
+    assert not any(matches('rXs', c) for _, c in conditions)
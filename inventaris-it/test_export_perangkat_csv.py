@@ -0,0 +1,40 @@
+"""Tests for export_perangkat_csv.py"""
+
+import csv
+
+from export_perangkat_csv import export_perangkat_csv, format_date
+from import_perangkat_bulk import DateParser, import_perangkat_from_csv, normalize_sync_value
+
+def test_format_date_keeps_seconds_and_microseconds():
+    assert format_date('2025-12-01T07:00:05+00:00') == '01/12/2025 07:00:05'
+    assert format_date('2025-12-01T14:00:05.5+07:00') == '01/12/2025 07:00:05.500000'
+    assert format_date(None) == '-'
+
+def test_format_date_reads_back_unchanged():
+    parser = DateParser()
+    for value in ('2025-12-01T07:00:05+00:00', '2025-12-13T23:59:59.000001+00:00', '2026-01-31T00:00:00Z'):
+        assert normalize_sync_value('tanggal_entry', parser.parse(format_date(value))) == \
+            normalize_sync_value('tanggal_entry', value)
+
+def test_export_then_sync_reports_no_changes(supabase, master_csv, tmp_path):
+    source = str(tmp_path / 'source.csv')
+    with open(master_csv[0], newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f, delimiter=';')
+        rows = list(reader)
+    for i, row in enumerate(rows):
+        # Timestamps with seconds and fractions, which an export used to truncate to minutes
+        row['tanggal_entry'] = f"2025-12-{i % 28 + 1:02d} 07:{i % 60:02d}:{i * 7 % 60:02d}" + ('.%06d' % i if i % 2 else '')
+    with open(source, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, reader.fieldnames, delimiter=';', lineterminator='\n')
+        writer.writeheader()
+        writer.writerows(rows)
+    
+    imported = import_perangkat_from_csv(source, supabase, rejects_file=str(tmp_path / 'source.rejects.csv'),
+                                         journal_file=str(tmp_path / 'source.journal.jsonl'))
+    assert imported['inserted'] == len(rows)
+    
+    exported = str(tmp_path / 'export.csv')
+    assert export_perangkat_csv(supabase, exported)['rows'] == len(rows)
+    
+    synced = import_perangkat_from_csv(exported, supabase, dry_run=True, sync=True)
+    assert (synced['inserted'], synced['updated'], synced['unchanged']) == (0, 0, len(rows))
@@ -0,0 +1,118 @@
+"""Tests for import_perangkat_bulk.py"""
+
+import csv
+
+import import_perangkat_bulk
+from import_perangkat_bulk import (CSV_COLUMNS, CsvLayout, import_perangkat_from_csv, import_perangkat_from_files,
+                                   lint_csv)
+
+def copy_csv(source, target, edit=None, limit=None):
+    """Copy (the first limit rows of) the CSV at source to target, passing each row (a dict)
+    and its index to edit()"""
+    with open(source, newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f, delimiter=';')
+        rows = list(reader)[:limit]
+    for i, row in enumerate(rows):
+        if edit:
+            edit(i, row)
+    with open(target, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, reader.fieldnames, delimiter=';', lineterminator='\n')
+        writer.writeheader()
+        writer.writerows(rows)
+    return rows
+
+def read_rejects(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f, delimiter=';'))
+
+def test_failed_id_reservation_rejects_only_rows_without_id(supabase, master_csv, tmp_path, monkeypatch):
+    source = str(tmp_path / 'noid.csv')
+    rejects = str(tmp_path / 'noid.rejects.csv')
+    
+    def drop_some_ids(i, row):
+        if i % 4 == 0:
+            row['id_perangkat'] = ''
+    rows = copy_csv(master_csv[0], source, drop_some_ids)
+    without_id = sum(1 for row in rows if not row['id_perangkat'])
+    
+    # As if ADD_RESERVE_ID_PERANGKAT_BLOCK.sql had not been run: the RPC answers 404 (PGRST202)
+    rpc = supabase.rpc
+    monkeypatch.setattr(supabase, 'rpc', lambda name, params: rpc('missing_function', params))
+    imported = import_perangkat_from_csv(source, supabase, rejects_file=rejects,
+                                         journal_file=str(tmp_path / 'noid.journal.jsonl'))
+    
+    assert imported['inserted'] == len(rows) - without_id
+    rejected = read_rejects(rejects)
+    assert len(rejected) == without_id
+    assert {r['error_code'] for r in rejected} == {'PGRST202'}
+    assert all(not r['id_perangkat'] for r in rejected)
+
+def test_row_rejected_in_one_file_does_not_reject_its_duplicate_in_the_next(supabase, master_csv, tmp_path):
+    first, second = str(tmp_path / 'a.csv'), str(tmp_path / 'b.csv')
+    
+    def unknown_location(i, row):
+        if i < 5:
+            row['lokasi_kode'] = 'NOWHERE'
+    rows = copy_csv(master_csv[0], first, unknown_location)
+    # The second file repeats the five rejected rows, with a valid location
+    copy_csv(master_csv[0], second, limit=5)
+    
+    imported = import_perangkat_from_files([first, second], supabase, processes=1)
+    
+    assert imported['inserted'] == len(rows)
+    assert [r['error_code'] for r in read_rejects(str(tmp_path / 'a.rejects.csv'))] == ['MISSING_REFERENCE'] * 5
+    assert not (tmp_path / 'b.rejects.csv').exists()
+
+def lint_findings(path):
+    """{(severity, column): [row numbers]} of lint_csv(path)"""
+    return {(severity, column): [row for row, _ in samples]
+            for (severity, column, _), (_, samples) in lint_csv(path).findings.items()}
+
+def test_lint_reports_an_invalid_date(master_csv, tmp_path):
+    path = str(tmp_path / 'lint.csv')
+    
+    def bad_date(i, row):
+        if i == 2:
+            row['tanggal_entry'] = '31/31/2025'
+    copy_csv(master_csv[0], path, bad_date, limit=10)
+    assert lint_findings(path) == {('error', 'tanggal_entry'): [4]}
+
+def test_lint_applies_the_form_rules(master_csv, tmp_path):
+    path = str(tmp_path / 'lint.csv')
+    
+    def break_values(i, row):
+        if i == 0:
+            row.update({'mac_ethernet': 'b8-85-84-c0-8b', 'ip_wireless': '10.0.0.256', 'Kapasitas SSD': 'besar'})
+        elif i == 1:
+            row.update({'petugas_id': 'not-a-uuid', 'lokasi_kode': '-'})
+        elif i == 2:
+            row['serial_number'] = 'SN-TWICE'
+        elif i == 3:
+            row['serial_number'] = 'SN-TWICE'
+    copy_csv(master_csv[0], path, break_values, limit=10)
+    assert lint_findings(path) == {
+        ('warning', 'mac_ethernet'): [2],
+        ('warning', 'ip_wireless'): [2],
+        ('warning', 'Kapasitas SSD'): [2],
+        ('error', 'petugas_id'): [3],
+        ('error', 'lokasi_kode'): [3],
+        ('error', 'serial_number'): [5],
+    }
+
+def test_csv_layout_leaves_rows_as_read_and_shares_cells(monkeypatch):
+    layout = CsvLayout(['serial_number', 'lokasi_kode', 'merk'])
+    first = ['SN1', ''.join(['I', 'GD']), 'Dell']
+    second = ['SN2', ''.join(['I', 'GD'])]  # Short row
+    values = dict(zip(CSV_COLUMNS, layout.values(layout.cells(first))))
+    short = dict(zip(CSV_COLUMNS, layout.values(layout.cells(second))))
+    
+    assert first == ['SN1', 'IGD', 'Dell'] and second == ['SN2', 'IGD']
+    assert (values['serial_number'], values['lokasi_kode'], values['merk'], values['petugas_id']) == \
+        ('SN1', 'IGD', 'Dell', None)
+    assert short['merk'] is None
+    assert short['lokasi_kode'] is values['lokasi_kode'] and second[1] is not first[1]
+    
+    # Once the layout holds SHARED_STRINGS_SIZE values, new ones are no longer kept
+    monkeypatch.setattr(import_perangkat_bulk, 'SHARED_STRINGS_SIZE', len(layout.strings))
+    layout.cells(['SN3', 'ICU', 'HP'])
+    assert 'ICU' not in layout.strings
@@ -0,0 +1,27 @@
+"""Tests for mutasi_perangkat_bulk.py"""
+
+import csv
+
+from mutasi_perangkat_bulk import MutasiItem, ResultsWriter, drop_duplicate_perangkat
+
+def test_perangkat_named_by_id_and_by_serial_is_moved_once(supabase, tmp_path):
+    supabase.table('perangkat').insert([
+        {'id_perangkat': '001.2025.12.0001', 'serial_number': 'SN1', 'lokasi_kode': 'IGD'},
+        {'id_perangkat': '001.2025.12.0002', 'serial_number': 'SN2', 'lokasi_kode': 'IGD'},
+    ]).execute()
+    items = [
+        MutasiItem(2, '001.2025.12.0001', None, 'ICU', None),
+        MutasiItem(3, None, 'SN2', 'ICU', None),
+        MutasiItem(4, None, 'SN1', 'IT', None),  # The perangkat of row 2
+        MutasiItem(5, '001.2025.12.0002', 'SN2', 'IT', None),  # The perangkat of row 3
+        MutasiItem(6, None, 'UNKNOWN', 'IT', None),  # Left for the server to report as not_found
+    ]
+    results = ResultsWriter(str(tmp_path / 'mutasi.csv'))
+    kept = drop_duplicate_perangkat(supabase, items, results)
+    results.close()
+    
+    assert [item.row_num for item in kept] == [2, 3, 6]
+    with open(tmp_path / 'mutasi.csv', newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f, delimiter=';'))
+    assert [(r['row'], r['status']) for r in rows] == [('4', 'duplicate'), ('5', 'duplicate')]
+    assert 'row 2' in rows[0]['message'] and 'row 3' in rows[1]['message']
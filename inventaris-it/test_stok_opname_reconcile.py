@@ -0,0 +1,44 @@
+"""Tests for stok_opname_reconcile.py"""
+
+from stok_opname_reconcile import read_scans, reconcile
+
+DEVICES = [
+    {'id_perangkat': '001.2025.12.0001', 'serial_number': 'ABC1', 'lokasi_kode': 'IGD'},
+    {'id_perangkat': '001.2025.12.0002', 'serial_number': 'abc1', 'lokasi_kode': 'IGD'},
+    {'id_perangkat': '001.2025.12.0003', 'serial_number': 'XYZ9', 'lokasi_kode': 'ICU'},
+    {'id_perangkat': '001.2025.12.0004', 'serial_number': 'KLM5', 'lokasi_kode': 'IGD'},
+]
+
+def reconcile_scans(supabase, tmp_path, lines, lokasi=('IGD',)):
+    supabase.table('perangkat').insert([dict(d, nama_perangkat=d['id_perangkat']) for d in DEVICES]).execute()
+    scan_file = tmp_path / 'scan.csv'
+    scan_file.write_text('id_perangkat;serial_number;lokasi_kode\n' + '\n'.join(lines) + '\n', encoding='utf-8')
+    scans, _, _ = read_scans(str(scan_file))
+    rows, summary = reconcile(supabase, scans, list(lokasi))
+    return {(r['status'], r['id_perangkat']): r for r in rows}, summary['counts']
+
+def test_serials_differing_only_in_case_are_different_devices(supabase, tmp_path):
+    rows, counts = reconcile_scans(supabase, tmp_path, [';ABC1;IGD', ';KLM5;IGD'])
+    assert set(rows) == {('found', '001.2025.12.0001'), ('found', '001.2025.12.0004'),
+                         ('missing', '001.2025.12.0002')}
+
+def test_serial_elsewhere_matches_ignoring_case(supabase, tmp_path):
+    rows, counts = reconcile_scans(supabase, tmp_path, [';xyz9;IGD', ';Abc1;IGD', ';NOPE;IGD'])
+    assert ('wrong_location', '001.2025.12.0003') in rows
+    # Abc1 matches two serials ignoring case, so neither is taken
+    assert counts == {'found': 0, 'wrong_location': 1, 'missing': 3, 'unexpected': 2}
+
+def test_case_fallback_without_lookup_function(supabase, tmp_path, monkeypatch, capsys):
+    # As if ADD_PERANGKAT_SERIAL_LOOKUP.sql had not been run: ILIKE filters instead
+    rpc = supabase.rpc
+    monkeypatch.setattr(supabase, 'rpc', lambda name, params: rpc('missing_function', params))
+    rows, counts = reconcile_scans(supabase, tmp_path, [';xyz9;IGD', ';a_c1;IGD'])
+    assert 'ADD_PERANGKAT_SERIAL_LOOKUP.sql' in capsys.readouterr().out
+    assert ('wrong_location', '001.2025.12.0003') in rows
+    # _ is escaped, not a LIKE wildcard
+    assert ('unexpected', '') in rows
+
+def test_device_scanned_by_id_and_by_serial_is_reported_once(supabase, tmp_path):
+    rows, counts = reconcile_scans(supabase, tmp_path, ['001.2025.12.0004;;IGD', ';KLM5;IGD', ';KLM5;IGD'])
+    assert rows[('found', '001.2025.12.0004')]['scan_count'] == 3
+    assert counts['found'] == 1